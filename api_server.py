@@ -1,10 +1,13 @@
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+from modules import startup  # En premier : mesure la durée d'import de l'API (voir /api/startup/stats)
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from google import genai
-from google.genai import types
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement du fichier .env
@@ -14,48 +17,176 @@ load_dotenv()
 # Assurez-vous que ces fichiers existent dans votre dossier 'modules/' 
 # et contiennent les fonctions suivantes.
 try:
-    from modules.chatbot import process_chatbot_query 
+    from modules.chatbot import process_chatbot_query, send_message_async, stream_chatbot_query_async
     # J'utilise data_analyst.py et content.py basés sur les conventions
-    from modules.data_analyst import analyze_data_pandas, format_analysis_with_gemini
-    from modules.content import generate_content
+    from modules.uploads import (MULTIPART_OVERHEAD_BYTES, UploadSpool, UploadTooLarge, spool_multipart,
+                                 upload_read_options)
+    from modules.workers import AnalysisPool, JobQueueFull, JobTimeout
+    from modules.jobs import Job, JobStore, JobStoreFull, content_key
+    from modules.content import generate_content, generate_content_async, generate_content_stream_async
+    from modules.concurrency import ConcurrencyLimiter, env_int
+    from modules.sessions import ChatSessionStore
+    from modules.conversations import ConversationStore
+    from modules.cache import ResponseCache
+    from modules import llm, metrics
+    from modules.prompts import FREY_SYSTEM_PROMPT, prompt_token_report, token_usage
+    from modules.tokens import TokenCounter
+    from modules.resilience import CircuitOpen
+    from modules.model_router import DEFAULT_MODEL, ModelCatalog, ModelRouter
+    from modules.admission import AdmissionController, AdmissionMiddleware, AdmissionRejected, retry_after_seconds
 except ImportError as e:
     print(f"ATTENTION: Une erreur d'importation de module s'est produite: {e}")
     print("Vérifiez les noms des fichiers et des fonctions dans le dossier 'modules/'.")
 
 # --- 🧠 PROMPT SYSTÉMIQUE FREY ---
-# --- 🧠 PROMPT SYSTÉMIQUE FREY ---
-FREY_SYSTEM_PROMPT = """
-Tu es FREY, une Intelligence Artificielle multifonctionnelle.
-Ton style est professionnel, bienveillant, pédagogique et inspirant.
-Ton objectif est de simplifier la vie de l’utilisateur, de répondre rapidement et de produire du contenu de qualité.
-Tu es clair, fluide, amical, mais précis.
-
-RÈGLES DE RÉPONSE OBLIGATOIRES :
-1. Structure : Fournis toujours une réponse claire et détaillée en utilisant des titres, sous-titres, et emojis pertinents. **Utilise fréquemment des sauts de ligne pour créer des micro-paragraphes et rendre le texte très aéré et scannable.**
-2. Synthèse : Termine TOUJOURS ta réponse par deux sections en gras :
-    - **Résumé :** [Synthèse de ta réponse en une seule phrase.]
-    - **Suggestion :** [Une action concrète ou une piste de réflexion basée sur la réponse/l'analyse.]
-3. Ambiguïté : Si la question est floue, reformule-la avant de répondre.
-4. Contenu : Ne réponds JAMAIS "je ne sais pas". Propose toujours une explication logique ou une piste.
-"""
+# FREY_SYSTEM_PROMPT est défini une seule fois dans modules/prompts.py (partagé avec app.py)
 
 # --- 🔑 SÉCURITÉ ET INITIALISATION GEMINI --- 
-try:
-    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY") 
-    
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY") 
+
+if not GEMINI_API_KEY:
+    print("FATAL: GEMINI_API_KEY non définie. Assurez-vous de la définir dans votre fichier .env ou comme variable d'environnement.")
+
+
+def _create_gemini_client():
+    """Client Gemini (import de google.genai compris) ; None sans clé API ou si l'initialisation échoue."""
     if not GEMINI_API_KEY:
-        print("FATAL: GEMINI_API_KEY non définie. Assurez-vous de la définir dans votre fichier .env ou comme variable d'environnement.")
-        gemini_client = None 
-    else:
-        gemini_client = genai.Client(api_key=GEMINI_API_KEY)
-        
-except Exception as e:
-    print(f"Erreur d'initialisation de l'API Gemini : {e}")
-    gemini_client = None
+        return None
+    try:
+        from google import genai
+        return genai.Client(api_key=GEMINI_API_KEY)
+    except Exception as e:
+        print(f"Erreur d'initialisation de l'API Gemini : {e}")
+        return None
+
+
+# --- ⏱️ DÉMARRAGE RAPIDE ---
+# Les composants coûteux sont construits au premier besoin ; FREY_STARTUP=eager (défaut) les construit
+# au démarrage du serveur, lazy à la première requête, prewarm en arrière-plan (voir modules/startup.py).
+gemini = startup.deferred("gemini_client", _create_gemini_client)
+analyst = startup.deferred_import("modules.data_analyst")  # pandas et numpy
+
+
+# --- 🚦 LIMITES DE CONCURRENCE DES APPELS GEMINI ---
+# Les appels passent par le client asynchrone (client.aio) : un seul worker garde
+# plusieurs dizaines d'appels en vol. FREY_MAX_CONCURRENT_CALLS borne le total,
+# FREY_MAX_CONCURRENT_CHAT / _ANALYZE / _GENERATE bornent chaque endpoint.
+gemini_limiter = ConcurrencyLimiter.from_env()
+
+
+# --- 💾 SESSIONS DE CHAT CÔTÉ SERVEUR ---
+CHAT_MODEL = "gemini-2.5-flash"
+
+def _create_chat(history: list):
+    """
+    Crée une session de chat asynchrone avec le prompt FREY, éventuellement pré-remplie.
+    Le modèle est choisi par le routeur à la création : une session reste liée à son modèle.
+    """
+    from google.genai import types
+
+    router = model_router.get() if model_router.loaded else None
+    model = router.choose("chat", sum(len(str(item)) for item in history or [])).model if router is not None else CHAT_MODEL
+    return gemini.get().aio.chats.create(
+        model=model,
+        config=types.GenerateContentConfig(system_instruction=FREY_SYSTEM_PROMPT),
+        history=history
+    )
+
+def _chat_model(chat) -> str:
+    """Modèle auquel une session de chat est liée (choisi par le routeur à sa création)."""
+    return getattr(chat, "_model", None) or CHAT_MODEL
+
+# Conversations durables (SQLite en mode WAL, partagé par les workers) : FREY_CONVERSATION_DB,
+# voir modules/conversations.py. Une session inconnue de ce worker reprend sa fenêtre récente.
+conversations = ConversationStore.from_env()
+
+chat_sessions = ChatSessionStore(
+    create_chat=_create_chat,
+    max_sessions=env_int("FREY_CHAT_MAX_SESSIONS", 1000),
+    ttl_seconds=env_int("FREY_CHAT_SESSION_TTL", 1800),
+    max_chars=env_int("FREY_CHAT_MAX_CHARS", 20_000_000),
+    conversations=conversations,
+)
+
+
+# --- 🗃️ CACHE DES RÉPONSES (/api/generate, /api/analyze) ---
+# Configuration : FREY_CACHE, FREY_CACHE_TTL, FREY_CACHE_PATH (niveau SQLite), voir modules/cache.py
+response_cache = ResponseCache.from_env()
+
+
+# --- 🔎 CACHE DES PROMPTS QUASI IDENTIQUES (/api/generate, premier tour de /api/chat) ---
+# Désactivé par défaut : FREY_SIMILARITY_CACHE=1, seuil FREY_SIMILARITY_THRESHOLD (voir modules/similarity.py).
+# Composant différé : nltk et numpy ne sont importés que si le cache est activé.
+def _create_similarity_cache():
+    if os.environ.get("FREY_SIMILARITY_CACHE", "0") != "1":
+        return None
+    from modules.similarity import SimilarityCache
+    return SimilarityCache.from_env().warm()
+
+similarity = startup.deferred("similarity_cache", _create_similarity_cache)
+
+
+# --- 🧭 CATALOGUE DES MODÈLES ET ROUTAGE ---
+# client.models.list() est lu une fois, gardé FREY_MODEL_CATALOG_TTL secondes puis relu en arrière-plan.
+# Le routeur choisit le modèle de chaque appel : taille du prompt, endpoint, SLO de latence (FREY_ROUTER_SLO)
+# et p95 observé par modèle (voir modules/model_router.py). FREY_ROUTER=0 : toujours gemini-2.5-flash.
+def _create_model_catalog():
+    catalog = ModelCatalog.from_env(gemini.get)
+    catalog.refresh()
+    return catalog
+
+def _create_model_router():
+    if os.environ.get("FREY_ROUTER", "1") == "0":
+        return None
+    return ModelRouter.from_env(model_catalog.get(), caller=llm.caller)
+
+model_catalog = startup.deferred("model_catalog", _create_model_catalog)
+model_router = startup.deferred("model_router", _create_model_router)
+
+
+async def _route(endpoint: str, prompt_chars: int) -> str:
+    """Modèle choisi par le routeur pour cet appel (modèle par défaut si le routage est désactivé)."""
+    router = await model_router.aget()
+    return router.choose(endpoint, prompt_chars).model if router is not None else DEFAULT_MODEL
+
+
+# --- ⚙️ POOL DE PROCESSUS POUR LES ANALYSES PANDAS ---
+# Le profilage est gourmand en CPU : il tourne dans des processus séparés pour ne pas
+# bloquer les appels de chat et de génération. Configuration : FREY_ANALYSIS_WORKERS
+# (0 = thread local), FREY_ANALYSIS_TIMEOUT (secondes), FREY_ANALYSIS_MAX_QUEUED.
+analysis_pool = AnalysisPool.from_env()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    if conversations is not None:
+        conversations.start()
+    yield
+    analysis_jobs.shutdown()
+    analysis_pool.shutdown()
+    if conversations is not None:
+        conversations.close()
 
 
 # --- Configuration FastAPI et CORS ---
-app = FastAPI(title="FREY IA API")
+app = FastAPI(title="FREY IA API", lifespan=lifespan)
+
+# --- 🛂 CONTRÔLE D'ADMISSION ---
+# Limite de débit par client (FREY_RATE_LIMIT_RPS, FREY_RATE_LIMIT_BURST), places de traitement
+# (FREY_ADMISSION_CAPACITY) et files par priorité chat > generate > analyze, avec rejet rapide
+# (429/503 + Retry-After). FREY_ADMISSION=0 pour désactiver.
+# Ajouté avant le CORS : les réponses 429/503 portent ainsi les en-têtes CORS.
+admission = AdmissionController.from_env() if os.environ.get("FREY_ADMISSION", "1") != "0" else None
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, controller=admission, client_header=os.environ.get("FREY_CLIENT_ID_HEADER"))
+
+# --- 📈 MÉTRIQUES ---
+# Durées par étape, tokens, tailles des requêtes/réponses : GET /metrics (format Prometheus).
+# FREY_METRICS=0 pour désactiver, FREY_SERVER_TIMING=1 pour l'en-tête Server-Timing.
+# Ajouté après l'admission : les requêtes en file ou rejetées sont aussi mesurées.
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 # Configuration des origines autorisées pour le CORS (essentiel pour React)
 origins = [
@@ -78,89 +209,348 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     user_prompt: str
     history: Optional[list[Any]] = None
+    session_id: Optional[str] = None
 
 class AnalyzeRequest(BaseModel):
     data_input: str
+    no_cache: bool = False  # True : ignore le cache et force un nouvel appel Gemini
 
 class ContentRequest(BaseModel):
     subject: str
     ton: str
+    no_cache: bool = False
+
+class BatchContentRequest(BaseModel):
+    items: list[ContentRequest]
+    stream: bool = False  # True : résultats en SSE, dans l'ordre d'achèvement
 
 # --- 🚀 Endpoint 1 : Chatbot (/api/chat) ---
 @app.post("/api/chat")
 async def chat_endpoint(request: ChatRequest):
     
+    gemini_client = await gemini.aget()
     if not gemini_client:
         raise HTTPException(status_code=503, detail="Service Gemini non disponible : Clé API manquante ou invalide.")
     
     try:
-        # NOTE: La gestion de la mémoire est simplifiée ici. Elle doit être implémentée 
-        # dans modules/chatbot.py ou en utilisant directement l'historique dans cet endpoint.
-        
-        # Création d'une nouvelle session de chat pour chaque requête
-        chat_session = gemini_client.chats.create(
-            model="gemini-2.5-flash",
-            config=types.GenerateContentConfig()
-        )
-        # Envoi du message à la session de chat
-        response = chat_session.send_message(request.user_prompt)
+        await model_router.aget()  # Choisit le modèle d'une nouvelle session (voir _create_chat)
+        # Réutilise la session vivante (ou la reconstruit depuis request.history si le serveur l'a perdue)
+        session_id, session = await chat_sessions.aget_or_create(request.session_id, request.history)
+        similar = await similarity.aget()
+
+        async with session.lock:
+            # Seul le premier tour est indépendant du contexte : une ouverture quasi identique
+            # à une conversation précédente est servie sans appel, puis inscrite dans l'historique
+            first_turn = similar is not None and not session.chat.get_history()
+            scope = similar.scope("chat", _chat_model(session.chat), FREY_SYSTEM_PROMPT) if first_turn else None
+            match = similar.get(request.user_prompt, scope) if first_turn else None
+            if match is not None:
+                chat_sessions.record_turn(session_id, request.user_prompt, match[0])
+                return {"success": True, "response": match[0], "session_id": session_id}
+
+            # Envoi du message à la session de chat (sans bloquer la boucle d'événements)
+            async with gemini_limiter.limit("chat"):
+                response = await send_message_async(session.chat, request.user_prompt)
+        token_usage.record("chat", response.usage_metadata)
+        chat_sessions.update(session_id, turn=(request.user_prompt, response.text.strip()))
+        if first_turn and response.text:
+            similar.set(request.user_prompt, scope, response.text.strip())
         
-        return {"success": True, "response": response.text.strip()}
+        return {"success": True, "response": response.text.strip(), "session_id": session_id}
+
+    except CircuitOpen as e:
+        # Amont dégradé : échec immédiat plutôt qu'une file d'appels vouée à l'échec
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
         
     except Exception as e:
         print(f"Erreur lors de l'appel Gemini (/api/chat): {e}")
         raise HTTPException(status_code=500, detail=f"Erreur interne lors de l'appel Gemini : {str(e)}")
 
 
+@app.delete("/api/chat/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Oublie une session de chat côté serveur (ex. bouton « nouvelle conversation »)."""
+    return {"success": await chat_sessions.aforget(session_id)}
+
+
 # --- 📊 Endpoint 2 : Analyseur de Données (/api/analyze) ---
 @app.post("/api/analyze")
 async def analyze_endpoint(request: AnalyzeRequest):
     
+    gemini_client = await gemini.aget()
     if not gemini_client:
          raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
     
     try:
         # 1. Analyse des données (retourne le rapport brut)
         # Note: on passe False pour is_file car l'API reçoit des chaînes de caractères du Front-End React
-        analysis_report = analyze_data_pandas(request.data_input, is_file=False) 
-        
-        # Gérer l'échec de lecture des données avant d'appeler Gemini
-        if analysis_report.startswith("Échec de la lecture des données"):
-             raise ValueError(analysis_report)
+        # L'analyse Pandas est exécutée dans le pool de processus pour libérer la boucle d'événements
+        analysis_report = await _run_analysis(request.data_input, is_file=False)
         
         # 2. Formatage du rapport par Gemini
-        formatted_report = format_analysis_with_gemini(
-            client=gemini_client,
-            raw_analysis=analysis_report,
-            system_prompt=FREY_SYSTEM_PROMPT  # <-- AJOUTER LE PROMPT SYSTÈME GLOBAL
-        )
-        
-        return {"success": True, "report": formatted_report.strip()}
+        return await _format_report(analysis_report, no_cache=request.no_cache)
         
     except Exception as e:
-        print(f"Erreur lors de l'analyse de données (/api/analyze): {e}")
-        # Renvoie une erreur HTTP 500 ou 400 (pour l'échec de lecture des données)
-        if str(e).startswith("Échec de la lecture des données"):
-             raise HTTPException(status_code=400, detail=str(e))
-        else:
-             raise HTTPException(status_code=500, detail=f"Erreur lors du traitement des données : {str(e)}")
+        raise _analysis_error("/api/analyze", e)
+
+
+async def _format_report(analysis_report: str, no_cache: bool = False, raise_errors: bool = False) -> dict:
+    """
+    Étape commune aux endpoints d'analyse : rédaction du rapport brut par Gemini.
+    raise_errors=True : un échec de l'appel Gemini lève une exception au lieu de produire un rapport d'erreur.
+    """
+
+    # Gérer l'échec de lecture des données avant d'appeler Gemini
+    if analysis_report.startswith("Échec de la lecture des données"):
+         raise ValueError(analysis_report)
+
+    data_analyst = await analyst.aget()
+    model = await _route("analyze", len(analysis_report))
+    async with gemini_limiter.limit("analyze"):
+        formatted_report = await data_analyst.format_analysis_with_gemini_async(
+            client=gemini.get(),
+            raw_analysis=analysis_report,
+            system_prompt=FREY_SYSTEM_PROMPT,  # <-- AJOUTER LE PROMPT SYSTÈME GLOBAL
+            cache=response_cache,
+            bypass_cache=no_cache,
+            model=model,
+            raise_errors=raise_errors
+        )
+
+    return {"success": True, "report": formatted_report.strip()}
+
+
+async def _run_analysis(data_source, **kwargs) -> str:
+    """Analyse dans le pool ; les durées des étapes mesurées dans le processus de travail sont enregistrées ici."""
+    data_analyst = await analyst.aget()
+    with metrics.stage("analysis_job"):
+        analysis_report, stages, memory = await analysis_pool.run(data_analyst.analyze_data_timed, data_source, **kwargs)
+    metrics.merge_stages(stages)
+    if memory is not None:
+        metrics.record_frame_memory(*memory)
+    return analysis_report
+
+def _analysis_error(route: str, e: Exception) -> HTTPException:
+    print(f"Erreur lors de l'analyse de données ({route}): {e}")
+    if isinstance(e, JobQueueFull):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    if isinstance(e, JobTimeout):
+        return HTTPException(status_code=504, detail=str(e))
+    # Renvoie une erreur HTTP 500 ou 400 (pour l'échec de lecture des données)
+    if str(e).startswith("Échec de la lecture des données"):
+         return HTTPException(status_code=400, detail=str(e))
+    return HTTPException(status_code=500, detail=f"Erreur lors du traitement des données : {str(e)}")
+
+
+# --- 📤 Endpoint 2 bis : Analyse d'un fichier téléversé (/api/analyze/upload) ---
+# Le fichier (CSV, TSV, éventuellement gzip) est envoyé tel quel dans le corps de la requête,
+# ou en multipart/form-data (champ "file"). Il n'est jamais décodé en chaîne Python : il est
+# gardé en mémoire jusqu'à FREY_UPLOAD_MEMORY_BYTES puis écrit sur disque et lu par pandas via memory_map.
+UPLOAD_MAX_BYTES = env_int("FREY_UPLOAD_MAX_BYTES", 1024 * 1024 * 1024)
+UPLOAD_MEMORY_BYTES = env_int("FREY_UPLOAD_MEMORY_BYTES", 8 * 1024 * 1024)
+UPLOAD_DIR = os.environ.get("FREY_UPLOAD_DIR") or None
+
+
+def _upload_too_large(request: Request) -> bool:
+    """Rejet immédiat sur Content-Length (fichier, plus l'enveloppe multipart éventuelle)."""
+    content_length = request.headers.get("content-length")
+    limit = UPLOAD_MAX_BYTES
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        limit += MULTIPART_OVERHEAD_BYTES
+    return bool(content_length and content_length.isdigit() and int(content_length) > limit)
+
+
+async def _spool_upload(request: Request, spool: UploadSpool) -> tuple[str, str]:
+    """Recopie le corps (brut ou multipart) dans le tampon ; retourne (type MIME, nom de fichier)."""
+    content_type = request.headers.get("content-type", "")
+    filename = request.headers.get("x-filename", "")
+
+    if content_type.startswith("multipart/form-data"):
+        # Analyse au fil de la réception : la limite de taille s'applique avant que le corps soit entièrement reçu
+        try:
+            part = await spool_multipart(request.stream(), content_type, spool,
+                                         max_body_bytes=UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if part is None:
+            raise HTTPException(status_code=400, detail="Champ 'file' manquant dans le formulaire.")
+        part_type, part_name = part
+        return part_type, part_name or filename
+
+    async for chunk in request.stream():
+        spool.write(chunk)
+    return content_type, filename
+
+
+@app.post("/api/analyze/upload")
+async def analyze_upload_endpoint(request: Request, sep: Optional[str] = None, no_cache: bool = False):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+         raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
+
+    if _upload_too_large(request):
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (limite : {UPLOAD_MAX_BYTES} octets).")
+
+    with UploadSpool(max_bytes=UPLOAD_MAX_BYTES, memory_bytes=UPLOAD_MEMORY_BYTES, directory=UPLOAD_DIR) as spool:
+        try:
+            content_type, filename = await _spool_upload(request, spool)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if spool.size == 0:
+            raise HTTPException(status_code=400, detail="Le fichier reçu est vide.")
+
+        try:
+            data_analyst = await analyst.aget()
+            read_options = upload_read_options(spool, content_type=content_type, filename=filename, sep=sep)
+            # Au-delà du seuil (taille décompressée), profilage par blocs en mémoire constante
+            chunksize = data_analyst.STREAMING_CHUNKSIZE if spool.data_size() >= data_analyst.STREAMING_MIN_BYTES else None
+            # Le processus de travail relit le fichier temporaire (ou reçoit une copie du tampon mémoire)
+            analysis_report = await _run_analysis(
+                spool.source(), is_file=True, chunksize=chunksize, read_options=read_options
+            )
+            return await _format_report(analysis_report, no_cache=no_cache)
+
+        except Exception as e:
+            raise _analysis_error("/api/analyze/upload", e)
+
+
+# --- ⏳ Endpoint 2 ter : Analyses asynchrones (/api/analyze/jobs) ---
+# La soumission rend un identifiant tout de suite (202) ; le profilage puis la rédaction par Gemini
+# s'exécutent en tâche de fond. Suivi : GET /api/analyze/jobs/{id} (interrogation, ?wait=N pour
+# attendre un changement) ou GET /api/analyze/jobs/{id}/events (SSE). Un contenu identique à un
+# travail en cours ou terminé renvoie ce travail. Configuration : FREY_JOBS_MAX_RUNNING,
+# FREY_JOBS_MAX_PENDING, FREY_JOBS_MAX, FREY_JOBS_TTL (voir modules/jobs.py).
+ANALYSIS_JOB_STEPS = ("profiling", "formatting")
+JOB_WAIT_MAX_SECONDS = 30
+JOB_EVENTS_HEARTBEAT_SECONDS = 15
+
+analysis_jobs = JobStore.from_env(error_detail=lambda e: _analysis_error("/api/analyze/jobs", e).detail)
+
+
+async def _analysis_job(job: Job, data_source, no_cache: bool, **kwargs) -> str:
+    analysis_report = await _run_analysis(data_source, **kwargs)
+    job.set_stage("formatting")
+    # Un échec de rédaction termine le travail en erreur : il n'est alors ni conservé ni dédupliqué
+    return (await _format_report(analysis_report, no_cache=no_cache, raise_errors=True))["report"]
+
+
+def _submit_job(key: Optional[str], work, cleanup=None) -> dict:
+    try:
+        job, created = analysis_jobs.submit(key, work, steps=ANALYSIS_JOB_STEPS, cleanup=cleanup)
+    except JobStoreFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {"success": True, "deduplicated": not created, **job.to_dict()}
+
+
+def _get_job(job_id: str) -> Job:
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analyse introuvable ou expirée.")
+    return job
+
+
+@app.post("/api/analyze/jobs", status_code=202)
+async def submit_analysis_job_endpoint(request: AnalyzeRequest):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+         raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
+
+    # no_cache : nouvelle analyse forcée, sans réutiliser un travail existant
+    key = None if request.no_cache else content_key("text", request.data_input)
+    return _submit_job(key, lambda job: _analysis_job(job, request.data_input, request.no_cache, is_file=False))
+
+
+@app.post("/api/analyze/jobs/upload", status_code=202)
+async def submit_analysis_upload_job_endpoint(request: Request, sep: Optional[str] = None, no_cache: bool = False):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+         raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
+
+    if _upload_too_large(request):
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (limite : {UPLOAD_MAX_BYTES} octets).")
+
+    # Le tampon survit à la requête : il est fermé par le travail, ou tout de suite s'il n'est pas lancé
+    spool = UploadSpool(max_bytes=UPLOAD_MAX_BYTES, memory_bytes=UPLOAD_MEMORY_BYTES, directory=UPLOAD_DIR, digest=True)
+    submitted = False
+    try:
+        try:
+            content_type, filename = await _spool_upload(request, spool)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if spool.size == 0:
+            raise HTTPException(status_code=400, detail="Le fichier reçu est vide.")
+
+        data_analyst = await analyst.aget()
+        read_options = upload_read_options(spool, content_type=content_type, filename=filename, sep=sep)
+        chunksize = data_analyst.STREAMING_CHUNKSIZE if spool.data_size() >= data_analyst.STREAMING_MIN_BYTES else None
+        key = None if no_cache else content_key("upload", spool.hexdigest(), read_options.get("sep"),
+                                                 read_options.get("compression"))
+        response = _submit_job(key, lambda job: _analysis_job(
+            job, spool.source(), no_cache, is_file=True, chunksize=chunksize, read_options=read_options
+        ), cleanup=spool.close)
+        submitted = not response["deduplicated"]
+        return response
+    finally:
+        if not submitted:
+            spool.close()
+
+
+@app.get("/api/analyze/jobs/{job_id}")
+async def analysis_job_endpoint(job_id: str, wait: float = 0):
+    """État du travail ; avec `wait` (secondes, 30 au plus), attend d'abord un changement d'état."""
+    job = _get_job(job_id)
+    if wait > 0:
+        await job.wait_change(min(wait, JOB_WAIT_MAX_SECONDS))
+    return {"success": True, **job.to_dict()}
+
+
+@app.get("/api/analyze/jobs/{job_id}/events")
+async def analysis_job_events_endpoint(job_id: str):
+    """Abonnement SSE : un événement 'progress' à chaque étape (et toutes les 15 s), puis 'done' ou 'error'."""
+    job = _get_job(job_id)
+
+    async def events() -> AsyncIterator[str]:
+        while not job.done:
+            yield _sse_event("progress", job.to_dict())
+            await job.wait_change(JOB_EVENTS_HEARTBEAT_SECONDS)
+        yield _sse_event("done" if job.status == "done" else "error", {"success": job.status == "done", **job.to_dict()})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.delete("/api/analyze/jobs/{job_id}")
+async def cancel_analysis_job_endpoint(job_id: str):
+    """Annule un travail en attente ou en cours."""
+    _get_job(job_id)
+    return {"success": analysis_jobs.cancel(job_id)}
 
 
 # --- ✍️ Endpoint 3 : Générateur de Contenu (/api/generate) ---
 @app.post("/api/generate")
 async def generate_endpoint(request: ContentRequest):
     
+    gemini_client = await gemini.aget()
     if not gemini_client:
          raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
     
     try:
         # ⚠️ MODIFICATION ICI : Appel à la fonction de génération de contenu avec le system_prompt
-        generated_content = generate_content(
-            client=gemini_client,
-            subject=request.subject,
-            ton=request.ton,
-            system_prompt=FREY_SYSTEM_PROMPT # <--- AJOUTER LE PROMPT SYSTÈME GLOBAL
-        )
+        model = await _route("generate", len(request.subject) + len(request.ton))
+        async with gemini_limiter.limit("generate"):
+            generated_content = await generate_content_async(
+                client=gemini_client,
+                subject=request.subject,
+                ton=request.ton,
+                system_prompt=FREY_SYSTEM_PROMPT, # <--- AJOUTER LE PROMPT SYSTÈME GLOBAL
+                cache=response_cache,
+                bypass_cache=request.no_cache,
+                similar=await similarity.aget(),
+                model=model
+            )
         
         return {"success": True, "content": generated_content.strip()}
         
@@ -168,28 +558,263 @@ async def generate_endpoint(request: ContentRequest):
         print(f"Erreur lors de la génération de contenu (/api/generate): {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération de contenu : {str(e)}")
 
+# --- 📡 Streaming (Server-Sent Events) ---
+def _sse_event(event: str, payload: dict) -> str:
+    """Formate un événement SSE ; le JSON garantit une seule ligne 'data:' par événement."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _sse_stream(endpoint: str, chunks: AsyncIterator[str], done_payload: dict) -> AsyncIterator[str]:
+    """
+    Relaie les fragments du modèle en événements 'chunk', puis 'done' (ou 'error').
+    La place de concurrence est conservée pendant toute la durée du flux.
+    """
+    async with gemini_limiter.limit(endpoint):
+        try:
+            async for text in chunks:
+                yield _sse_event("chunk", {"text": text})
+            yield _sse_event("done", {"success": True, **done_payload})
+        except Exception as e:
+            print(f"Erreur lors du streaming Gemini (/api/{endpoint}/stream): {e}")
+            yield _sse_event("error", {"success": False, "detail": f"Erreur interne lors de l'appel Gemini : {str(e)}"})
+
+
+def _sse_response(endpoint: str, chunks: AsyncIterator[str], headers: Optional[dict] = None, **done_payload) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(endpoint, chunks, done_payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+        raise HTTPException(status_code=503, detail="Service Gemini non disponible : Clé API manquante ou invalide.")
+
+    await model_router.aget()
+    session_id, session = await chat_sessions.aget_or_create(request.session_id, request.history)
+
+    async def locked_chunks():
+        parts = []
+        async with session.lock:
+            async for text in stream_chatbot_query_async(session.chat, request.user_prompt):
+                parts.append(text)
+                yield text
+        chat_sessions.update(session_id, turn=(request.user_prompt, "".join(parts).strip()))
+
+    return _sse_response("chat", locked_chunks(), headers={"X-Session-Id": session_id}, session_id=session_id)
+
+
+@app.post("/api/generate/stream")
+async def generate_stream_endpoint(request: ContentRequest):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+         raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
+
+    return _sse_response("generate", generate_content_stream_async(
+        client=gemini_client,
+        subject=request.subject,
+        ton=request.ton,
+        system_prompt=FREY_SYSTEM_PROMPT,
+        model=await _route("generate", len(request.subject) + len(request.ton))
+    ))
+
+# --- 📦 Endpoint 3 bis : Génération par lots (/api/generate/batch) ---
+# Les éléments sont générés en parallèle (au plus FREY_BATCH_CONCURRENCY à la fois par lot,
+# dans la limite globale de l'endpoint generate) : la durée d'un lot est proche de celle d'un appel.
+BATCH_MAX_ITEMS = env_int("FREY_BATCH_MAX_ITEMS", 500)
+BATCH_CONCURRENCY = env_int("FREY_BATCH_CONCURRENCY", 16)
+
+
+async def _generate_batch_item(index: int, item: ContentRequest, semaphore: asyncio.Semaphore) -> dict:
+    """Génère un élément du lot ; une erreur n'interrompt pas les autres éléments."""
+    try:
+        async with semaphore, gemini_limiter.limit("generate"):
+            content = await generate_content_async(
+                client=gemini.get(),
+                subject=item.subject,
+                ton=item.ton,
+                system_prompt=FREY_SYSTEM_PROMPT,
+                cache=response_cache,
+                bypass_cache=item.no_cache,
+                raise_errors=True,
+                similar=similarity.get(),
+                model=await _route("generate", len(item.subject) + len(item.ton))
+            )
+        return {"index": index, "success": True, "content": content.strip()}
+    except Exception as e:
+        print(f"Erreur lors de la génération de contenu (/api/generate/batch, élément {index}): {e}")
+        return {"index": index, "success": False, "detail": f"Erreur lors de la génération de contenu : {str(e)}"}
+
+
+async def _batch_events(tasks: list) -> AsyncIterator[str]:
+    """Émet un événement 'item' par élément terminé, puis 'done' ; annule le reste si le client se déconnecte."""
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            failed += not result["success"]
+            yield _sse_event("item", result)
+        yield _sse_event("done", {"success": True, "count": len(tasks), "failed": failed})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/generate/batch")
+async def generate_batch_endpoint(request: BatchContentRequest, http_request: Request):
+
+    gemini_client = await gemini.aget()
+    if not gemini_client:
+         raise HTTPException(status_code=503, detail="Service Gemini non disponible.")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Lot trop volumineux (limite : {BATCH_MAX_ITEMS} éléments).")
+
+    # Chaque élément du lot compte comme une requête pour la limite de débit du client
+    if admission is not None and len(request.items) > 1:
+        try:
+            admission.consume(http_request.state.client_id, cost=len(request.items) - 1)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail,
+                                headers={"Retry-After": str(retry_after_seconds(e.retry_after))})
+
+    await similarity.aget()  # Construit avant les tâches, qui le lisent avec similarity.get()
+    await model_router.aget()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [asyncio.create_task(_generate_batch_item(i, item, semaphore)) for i, item in enumerate(request.items)]
+
+    if request.stream:
+        return StreamingResponse(
+            _batch_events(tasks),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # Résultats dans l'ordre de la requête
+    results = await asyncio.gather(*tasks)
+    failed = sum(not result["success"] for result in results)
+    return {"success": True, "count": len(results), "failed": failed, "results": results}
+
+@app.get("/api/analyze/stats")
+async def analysis_stats_endpoint():
+    """Occupation du pool d'analyse : travaux en cours, en file, délais dépassés, rejets."""
+    return {"success": True, **analysis_pool.stats(), "jobs": analysis_jobs.stats(),
+            "memory": metrics.frame_memory_stats()}
+
+@app.get("/api/chat/stats")
+async def chat_stats_endpoint():
+    """Sessions de chat en mémoire et, si configurée, conversation durable (écritures par lots, reprises, compactage)."""
+    return {"success": True, **chat_sessions.stats(),
+            "conversations": await asyncio.to_thread(conversations.stats) if conversations is not None else None}
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """Compteurs de succès/échecs et occupation de chaque niveau du cache de réponses."""
+    # Appels Gemini partagés entre requêtes identiques simultanées (déduplication en vol)
+    single_flight = llm.inflight.stats() if llm.inflight is not None else None
+    # Cache des prompts quasi identiques : taux de succès et durée des recherches
+    similar = similarity.get() if similarity.loaded else None
+    similar_stats = similar.stats() if similar is not None else None
+    if response_cache is None:
+        return {"success": True, "enabled": False, "single_flight": single_flight, "similarity": similar_stats}
+    return {"success": True, "enabled": True, **response_cache.stats(), "single_flight": single_flight,
+            "similarity": similar_stats}
+
+# Comptage des tokens des prompts fixes (mémorisé : un seul appel count_tokens par texte)
+prompt_token_counter = startup.deferred("prompt_token_counter", lambda: TokenCounter(gemini.get(), model="gemini-2.5-flash"))
+
+@app.get("/api/admission/stats")
+async def admission_stats_endpoint():
+    """Places occupées, files par priorité et compteurs de rejets du contrôle d'admission."""
+    if admission is None:
+        return {"success": True, "enabled": False}
+    return {"success": True, "enabled": True, **admission.stats()}
+
+@app.get("/api/resilience/stats")
+async def resilience_stats_endpoint():
+    """Nouvelles tentatives, hedging, replis et état des disjoncteurs par modèle."""
+    if llm.caller is None:
+        return {"success": True, "enabled": False}
+    return {"success": True, "enabled": True, **llm.caller.stats()}
+
+@app.get("/api/prompts/report")
+async def prompts_report_endpoint():
+    """Tokens d'entrée par endpoint : partie fixe (prompt système + gabarit) et moyennes observées."""
+    report = await asyncio.to_thread(prompt_token_report, await prompt_token_counter.aget())
+    return {"success": True, "endpoints": report}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métriques au format texte Prometheus (histogrammes par étape, tokens, tailles, compteurs des composants)."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Métriques désactivées (FREY_METRICS=0).")
+    extra = []
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        extra += metrics.stats_lines("frey_cache_hits_total", "Succès du cache de réponses par niveau.",
+                                     cache_stats["hits"], "tier", kind="counter")
+    if similarity.loaded and similarity.get() is not None:
+        extra += metrics.stats_lines("frey_similarity_cache", "Cache des prompts quasi identiques : recherches, succès, index.",
+                                     similarity.get().stats(), "kind")
+    if llm.caller is not None:
+        extra += metrics.stats_lines("frey_resilience_total", "Appels, nouvelles tentatives, hedging et replis Gemini.",
+                                     llm.caller.counters, "outcome", kind="counter")
+    if llm.inflight is not None:
+        extra += metrics.stats_lines("frey_single_flight", "Appels Gemini partagés entre requêtes identiques.",
+                                     llm.inflight.stats(), "kind")
+    if admission is not None:
+        extra += metrics.stats_lines("frey_admission", "Contrôle d'admission : places, rejets, attentes.",
+                                     admission.stats(), "kind")
+    if model_router.loaded and model_router.get() is not None:
+        extra += metrics.stats_lines("frey_model_routes_total", "Décisions du routeur de modèles par endpoint et modèle.",
+                                     model_router.get().stats()["decisions"], "route", kind="counter")
+    if conversations is not None:
+        extra += metrics.stats_lines("frey_conversations", "Conversations durables : messages en file, écrits, reprises.",
+                                     await asyncio.to_thread(conversations.stats), "kind")
+    extra += metrics.stats_lines("frey_analysis_pool", "Pool d'analyse : travaux en cours, délais dépassés, rejets.",
+                                 analysis_pool.stats(), "kind")
+    extra += metrics.stats_lines("frey_analysis_jobs", "Analyses asynchrones : soumises, dédupliquées, terminées, expirées.",
+                                 analysis_jobs.stats(), "kind")
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/startup/stats")
+async def startup_stats_endpoint():
+    """Mode de démarrage, durée d'import de l'API et durée de construction de chaque composant différé."""
+    return {"success": True, **startup.startup_report()}
+
 # --- 🔍 Endpoint 4 : Lister les modèles Gemini disponibles (/api/models) ---
+# Servi depuis le catalogue en cache (client.models.list() relu toutes les FREY_MODEL_CATALOG_TTL secondes)
 @app.get("/api/models")
 async def list_models_endpoint():
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=503, detail="Service Gemini non disponible : Clé API manquante ou invalide.")
     
-    try:
-        # Initialiser le client genai pour lister les modèles
-        # Note: genai.list_models() n'a pas besoin d'un GenerativeModel
-        # mais d'un client configuré avec la clé API.
-        # Nous utilisons la clé directement ici.
-        models = []
-        for m in gemini_client.list_models():
-            if "generateContent" in m.supported_generation_methods:
-                models.append({"name": m.name, "display_name": m.display_name})
-        
-        return {"success": True, "models": models}
-        
-    except Exception as e:
-        print(f"Erreur lors de la récupération des modèles Gemini : {e}")
-        raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des modèles Gemini : {str(e)}")
+    catalog = await model_catalog.aget()
+    models = await asyncio.to_thread(catalog.models)
+    if not catalog.loaded:
+        print(f"Erreur lors de la récupération des modèles Gemini : {catalog.last_error}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des modèles Gemini : {catalog.last_error}")
+    return {"success": True, "models": [model.to_dict() for model in models]}
+
+@app.get("/api/models/routing")
+async def model_routing_endpoint(endpoint: Optional[str] = None, prompt_chars: int = 0, limit: int = 50):
+    """
+    Décisions récentes du routeur, p95 par modèle et état du catalogue.
+    Avec `endpoint` (et `prompt_chars`), ajoute la décision qui serait prise maintenant, sans l'enregistrer.
+    """
+    router = await model_router.aget()
+    if router is None:
+        return {"success": True, "enabled": False, "model": DEFAULT_MODEL}
+    decision = await asyncio.to_thread(router.choose, endpoint, prompt_chars, False) if endpoint else None
+    return {"success": True, "enabled": True, **router.stats(),
+            "decision": decision.to_dict() if decision is not None else None, "recent": router.recent(limit)}
         
+startup.mark_imported()
+
 # --- 🏃‍♂️ INSTRUCTION POUR LANCER LE SERVEUR ---
 # Lancez le serveur avec la commande dans votre terminal :
 # uvicorn api_server:app --reload
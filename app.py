@@ -2,32 +2,20 @@ import streamlit as st
 import os
 import pandas as pd
 import io
+import hashlib
 from google import genai
 from google.genai import types
 from typing import Any # Ajout pour l'annotation de type de la mémoire
 
 # Importation des modules
 from modules.chatbot import process_chatbot_query
+from modules.concurrency import env_int
 from modules.data_analyst import analyze_data_pandas, format_analysis_with_gemini
 from modules.content import generate_content
+from modules.history import BudgetedChat
+from modules.prompts import FREY_SYSTEM_PROMPT  # Prompt unique, partagé avec l'API
 
 
-# --- 🧠 PROMPT SYSTÉMIQUE FREY ---
-FREY_SYSTEM_PROMPT = """
-Tu es FREY, une Intelligence Artificielle multifonctionnelle.
-Ton style est professionnel, bienveillant, pédagogique et inspirant.
-Ton objectif est de simplifier la vie de l’utilisateur, de répondre rapidement et de produire du contenu de qualité.
-Tu es clair, fluide, amical, mais précis.
-
-RÈGLES DE RÉPONSE OBLIGATOIRES :
-1. Structure : Fournis toujours une réponse claire et détaillée en utilisant des titres, sous-titres, et emojis pertinents.
-2. Synthèse : Termine TOUJOURS ta réponse par deux sections en gras :
-    - **Résumé :** [Synthèse de ta réponse en une seule phrase.]
-    - **Suggestion :** [Une action concrète ou une piste de réflexion basée sur la réponse/l'analyse.]
-3. Ambiguïté : Si la question est floue, reformule-la avant de répondre.
-4. Contenu : Ne réponds JAMAIS "je ne sais pas". Propose toujours une explication logique ou une piste.
-"""
-
 # --- 🔑 SÉCURITÉ ET INITIALISATION GEMINI ---
 try: 
     if 'GEMINI_API_KEY' not in st.secrets:
@@ -49,17 +37,72 @@ except Exception as e:
 
 # --------------------------------------------------------
 
+# --- ⚡ CACHE DES ANALYSES ---
+# Un nouveau clic sur « Analyser » avec les mêmes données ne relit pas le fichier et ne rappelle pas Gemini :
+# l'analyse pandas est mémorisée par empreinte du contenu, le rapport rédigé par texte de l'analyse brute.
+ANALYSIS_CACHE_ENTRIES = env_int("FREY_APP_ANALYSIS_CACHE_ENTRIES", 32)
+ANALYSIS_CACHE_TTL = env_int("FREY_APP_ANALYSIS_CACHE_TTL", 3600)
+READ_ERRORS = ("Échec de la lecture des données", "Le DataFrame est vide")
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def cached_raw_analysis(content_hash: str, _data, is_file: bool) -> str:
+    """Analyse pandas mémorisée ; seule l'empreinte `content_hash` sert de clé (`_data` n'est pas haché par Streamlit)."""
+    source = io.BytesIO(_data) if is_file else _data
+    return analyze_data_pandas(source, is_file=is_file)
+
+
+class ReportError(Exception):
+    """Rédaction du rapport en échec : levée pour que le message d'erreur ne soit pas mis en cache."""
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def cached_formatted_report(raw_analysis: str) -> str:
+    report = format_analysis_with_gemini(
+        client=get_gemini_client(GEMINI_API_KEY),
+        raw_analysis=raw_analysis,
+        system_prompt=FREY_SYSTEM_PROMPT
+    )
+    if report.startswith("🚨"):
+        raise ReportError(report)
+    return report
+
+# --------------------------------------------------------
+
+# --- 💬 AFFICHAGE INCRÉMENTAL DU CHAT ---
+# Les messages affichés sont conservés sous forme de texte (rôle, texte) et complétés après chaque tour,
+# sans reparcourir l'historique ; seuls les derniers messages sont affichés en entier,
+# les plus anciens sont repliés et paginés.
+CHAT_VISIBLE_MESSAGES = env_int("FREY_APP_CHAT_VISIBLE_MESSAGES", 20)
+CHAT_PAGE_MESSAGES = env_int("FREY_APP_CHAT_PAGE_MESSAGES", 20)
+CHAT_ROLES = {"user": ("Utilisateur", "👤"), "model": ("FREY", "🤖")}
+
+
+def sync_chat_messages():
+    """Ajoute aux messages affichés ceux que la session a enregistrés depuis le dernier tour (l'historique ne fait que croître)."""
+    messages = st.session_state.chat_messages
+    for message in st.session_state.chat_session.transcript[len(messages):]:
+        messages.append((message.role, "".join(part.text or "" for part in message.parts or [])))
+
+
+def render_older_messages(older: list):
+    pages = max(1, -(-len(older) // CHAT_PAGE_MESSAGES))
+    with st.expander(f"📜 {len(older)} messages précédents"):
+        page = st.selectbox("Page", range(pages, 0, -1), format_func=lambda n: f"Page {n} / {pages}", key="chat_page")
+        for role, text in older[(page - 1) * CHAT_PAGE_MESSAGES:page * CHAT_PAGE_MESSAGES]:
+            role_name, avatar_icon = CHAT_ROLES.get(role, (role, "💬"))
+            st.markdown(f"**{avatar_icon} {role_name}**\n\n{text}")
+
+# --------------------------------------------------------
+
 # --- FONCTION DE RÉINITIALISATION DE LA MÉMOIRE ---
 def clear_chat_history():
     """Réinitialise la session de chat dans l'état de session de Streamlit."""
     gemini_client = get_gemini_client(GEMINI_API_KEY)
     try:
-        st.session_state.chat_session = gemini_client.chats.create(
-            model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=FREY_SYSTEM_PROMPT
-            )
-        )
+        # Session à budget de tokens : les anciens échanges sont résumés au lieu d'être renvoyés à chaque tour
+        st.session_state.chat_session = BudgetedChat.from_env(gemini_client, FREY_SYSTEM_PROMPT)
+        st.session_state.chat_messages = []
     except Exception as e:
         st.error(f"Erreur lors de la réinitialisation de la session de chat : {e}")
 
@@ -69,15 +112,11 @@ def clear_chat_history():
 if 'chat_session' not in st.session_state:
     gemini_client = get_gemini_client(GEMINI_API_KEY)
     try:
-        st.session_state.chat_session = gemini_client.chats.create(
-            model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=FREY_SYSTEM_PROMPT
-            )
-        )
+        st.session_state.chat_session = BudgetedChat.from_env(gemini_client, FREY_SYSTEM_PROMPT)
     except Exception as e:
         st.error(f"Erreur lors de la création de la session de chat : {e}")
         st.stop()
+    st.session_state.chat_messages = []
         
 # --------------------------------------------------------
 
@@ -150,22 +189,17 @@ with tab1:
     # Bouton pour réinitialiser la conversation
     st.button('🗑️ Commencer une nouvelle conversation', on_click=clear_chat_history)
     
-    # 1. Affichage de l'historique des messages
-    for message in st.session_state.chat_session.get_history():
-        
-        if message.role == "user":
-            role_name = "Utilisateur"
-            avatar_icon = "👤"
-        elif message.role == "model":
-            role_name = "FREY"
-            avatar_icon = "🤖"
-        else:
-            # Ignorer le rôle 'system' qui contient le prompt
-            continue
+    # 1. Affichage de l'historique des messages (les plus anciens repliés, par pages)
+    messages = st.session_state.chat_messages
+    visible_from = max(0, len(messages) - CHAT_VISIBLE_MESSAGES)
+    if visible_from:
+        render_older_messages(messages[:visible_from])
 
-        # Affiche le message (avec le nouvel avatar)
+    for role, text in messages[visible_from:]:
+        # Le rôle 'system' (prompt) n'est jamais enregistré dans l'historique affiché
+        role_name, avatar_icon = CHAT_ROLES.get(role, (role, "💬"))
         with st.chat_message(role_name, avatar=avatar_icon):
-            st.markdown(message.parts[0].text)
+            st.markdown(text)
 
     # 2. Zone de saisie utilisateur
     if chatbot_input := st.chat_input("Dites quelque chose à FREY..."):
@@ -174,20 +208,23 @@ with tab1:
         with st.chat_message("Utilisateur", avatar="👤"):
             st.markdown(chatbot_input)
 
-        # Appel de la fonction Gemini avec la session de chat
-        with st.spinner('FREY analyse et prépare la réponse...'):
-            result = process_chatbot_query(
+        # Appel de la fonction Gemini avec la session de chat, en flux :
+        # la réponse de FREY s'affiche au fur et à mesure de sa génération
+        with st.chat_message("FREY", avatar="🤖"):
+            st.write_stream(process_chatbot_query(
                 chat_session=st.session_state.chat_session, # Passe la session stockée
-                user_prompt=chatbot_input
+                user_prompt=chatbot_input,
+                stream=True
+            ))
+        sync_chat_messages()
+
+        # Taille du contexte envoyé pour ce tour, comparée à l'envoi de toute la conversation
+        last_turn = st.session_state.chat_session.stats()["last_turn"]
+        if last_turn.get("saved_tokens"):
+            st.caption(
+                f"Contexte envoyé : {last_turn['input_tokens']} tokens "
+                f"(au lieu de {last_turn['full_history_tokens']}, {last_turn['saved_tokens']} économisés grâce au résumé)."
             )
-            
-            # Afficher la réponse de FREY
-            if result["success"]:
-                with st.chat_message("FREY", avatar="🤖"):
-                    st.markdown(result["reponse_complete"])
-            else:
-                 with st.chat_message("FREY", avatar="🤖"):
-                    st.error(result["reponse_complete"])
 
 # --- 2. Onglet Analyseur de Données ---
 with tab2:
@@ -201,29 +238,33 @@ with tab2:
         if data_input or uploaded_file:
             with st.spinner('FREY analyse et rédige le rapport...'):
                 
-                source_data = uploaded_file if uploaded_file else data_input
                 is_file = uploaded_file is not None
+                source_data = uploaded_file.getvalue() if is_file else data_input
+                content_hash = hashlib.sha256(source_data if is_file else source_data.encode("utf-8")).hexdigest()
 
-                # Étape 1 : Analyse brute avec Pandas
-                raw_analysis = analyze_data_pandas(source_data, is_file=is_file) 
+                # Étape 1 : Analyse brute avec Pandas (mémorisée par empreinte du contenu)
+                raw_analysis = cached_raw_analysis(content_hash, source_data, is_file)
                 
                 # Vérification des erreurs de lecture de Pandas
-                if raw_analysis.startswith("Échec de la lecture des données") or raw_analysis.startswith("Le DataFrame est vide"):
+                if raw_analysis.startswith(READ_ERRORS):
+                     st.session_state.analysis_report = None
                      st.error(raw_analysis)
                 else:
-                    # Étape 2 : Rédaction et formatage par Gemini (style FREY)
-                    formatted_report = format_analysis_with_gemini(
-                        client=gemini_client,
-                        raw_analysis=raw_analysis,
-                        system_prompt=FREY_SYSTEM_PROMPT
-                    )
-                    
-                    st.markdown("---")
-                    st.markdown(formatted_report) # Affiche le rapport complet formaté
+                    # Étape 2 : Rédaction et formatage par Gemini (style FREY), mémorisée par analyse brute
+                    try:
+                        st.session_state.analysis_report = cached_formatted_report(raw_analysis)
+                    except ReportError as e:
+                        st.session_state.analysis_report = None
+                        st.error(str(e))
 
         else:
              st.error("Veuillez coller des données ou téléverser un fichier pour commencer l'analyse.")
 
+    # Le dernier rapport reste affiché lors des réexécutions suivantes (chat, autres onglets) sans être recalculé
+    if st.session_state.get("analysis_report"):
+        st.markdown("---")
+        st.markdown(st.session_state.analysis_report) # Affiche le rapport complet formaté
+
 # --- 3. Onglet Générateur de Contenu ---
 with tab3:
     st.header("✍️ Générateur de Contenu Intelligent")
@@ -238,19 +279,17 @@ with tab3:
     
     if st.button("Générer le Contenu", key='btn_gen'):
         if sujet_input:
-            with st.spinner(f'FREY rédige votre contenu en utilisant le ton {ton_select}...'):
-                
-                # Appel de la fonction Gemini du module de génération
-                generated_text = generate_content(
-                    client=gemini_client,
-                    subject=sujet_input, 
-                    ton=ton_select, 
-                    system_prompt=FREY_SYSTEM_PROMPT
-                )
-                
-                st.markdown("---")
-                st.markdown(f"### Contenu Généré (Ton : {ton_select}) :")
-                st.markdown(generated_text)
+            st.markdown("---")
+            st.markdown(f"### Contenu Généré (Ton : {ton_select}) :")
+
+            # Appel de la fonction Gemini du module de génération (affichage progressif)
+            st.write_stream(generate_content(
+                client=gemini_client,
+                subject=sujet_input, 
+                ton=ton_select, 
+                system_prompt=FREY_SYSTEM_PROMPT,
+                stream=True
+            ))
                 
             
         else:
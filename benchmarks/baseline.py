@@ -0,0 +1,89 @@
+# benchmarks/baseline.py
+"""
+Références de performance enregistrées (benchmarks/baselines/<nom>.json) et comparaison.
+
+Chaque résultat est un dict cas -> mesures. Pour chaque mesure comparée, on indique si
+une valeur plus basse (durée, latence) ou plus haute (débit) est meilleure ; un écart
+défavorable supérieur à la tolérance est signalé comme régression.
+"""
+
+import json
+import os
+import platform
+from pathlib import Path
+from typing import Optional
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def environment() -> dict:
+    """Contexte de la mesure, enregistré avec la référence (les chiffres n'ont de sens que sur une machine comparable)."""
+    import numpy
+    import pandas
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def baseline_path(name: str) -> Path:
+    return BASELINE_DIR / f"{name}.json"
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    return value
+
+
+def save(name: str, results: dict, settings: dict) -> Path:
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"settings": settings, "environment": environment(), "results": _rounded(results)}
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False, sort_keys=True) + "\n", encoding="utf-8")
+    return path
+
+
+def load(name: str) -> Optional[dict]:
+    path = baseline_path(name)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(name: str, results: dict, metrics: dict[str, str], tolerance: float = 0.15) -> bool:
+    """
+    Affiche l'écart de chaque mesure avec la référence `name`.
+    metrics : mesure -> "lower" ou "higher" (sens favorable). Retourne True si une régression dépasse la tolérance.
+    """
+    baseline = load(name)
+    if baseline is None:
+        print(f"Aucune référence {baseline_path(name)} : lancez d'abord avec --save-baseline.")
+        return False
+    if baseline.get("environment") != environment():
+        print(f"⚠️ Référence mesurée dans un autre environnement : {baseline.get('environment')}")
+
+    regressions = 0
+    print(f"\n{'cas':<34} {'mesure':<10} {'référence':>11} {'actuel':>11} {'écart':>8}")
+    for case, measures in results.items():
+        reference = baseline["results"].get(case)
+        if reference is None:
+            print(f"{case:<34} (nouveau cas, absent de la référence)")
+            continue
+        for metric, direction in metrics.items():
+            before, after = reference.get(metric), measures.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change > tolerance if direction == "lower" else change < -tolerance
+            regressions += worse
+            flag = "  ❌ régression" if worse else ""
+            print(f"{case:<34} {metric:<10} {before:>11.4f} {after:>11.4f} {change:>+7.1%}{flag}")
+    print(f"\n{regressions} régression(s) au-delà de ±{tolerance:.0%}.")
+    return regressions > 0
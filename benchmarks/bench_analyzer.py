@@ -0,0 +1,105 @@
+# benchmarks/bench_analyzer.py
+"""
+Microbenchmarks de analyze_data_pandas (données collées) selon le nombre de lignes,
+le nombre de colonnes et les types de colonnes, avec le détail par étape
+(lecture CSV, profilage, mise en forme du rapport, voir modules/metrics.py).
+
+Usage :
+  python -m benchmarks.bench_analyzer                          # grille complète
+  python -m benchmarks.bench_analyzer --rows 1000 10000 --cols 5 --dtypes mixed
+  python -m benchmarks.bench_analyzer --save-baseline          # enregistre benchmarks/baselines/analyzer.json
+  python -m benchmarks.bench_analyzer --compare                # compare à la référence (code 1 si régression)
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import baseline
+from modules import metrics
+from modules.data_analyst import analyze_data_pandas
+
+DTYPES = ("numeric", "text", "mixed")
+VILLES = np.array(["Paris", "Lyon", "Marseille", "Lille", "Nantes", "Nice", "Rennes", "Bordeaux"])
+
+
+def make_frame(rows: int, cols: int, dtype: str, seed: int = 0) -> pd.DataFrame:
+    """Tableau synthétique reproductible ; `mixed` alterne entiers, réels, texte, dates et booléens, avec des manquants."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(cols):
+        kind = {"numeric": ("float", "int")[i % 2], "text": ("city", "label")[i % 2],
+                "mixed": ("int", "float", "city", "date", "bool")[i % 5]}[dtype]
+        if kind == "int":
+            values = pd.Series(rng.integers(0, 1000, rows))
+        elif kind == "float":
+            values = pd.Series(rng.normal(100, 25, rows).round(3))
+        elif kind == "city":
+            values = pd.Series(VILLES[rng.integers(0, len(VILLES), rows)])
+        elif kind == "label":
+            values = pd.Series(np.char.add("ref-", rng.integers(0, max(1, rows // 10), rows).astype(str)))
+        elif kind == "date":
+            values = pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"))
+        else:
+            values = pd.Series(rng.random(rows) < 0.5)
+        if dtype == "mixed":
+            values = values.mask(rng.random(rows) < 0.03)
+        columns[f"{kind}_{i}"] = values
+    return pd.DataFrame(columns)
+
+
+def bench_case(text: str, repeat: int) -> dict:
+    """Médiane sur `repeat` exécutions de la durée totale et de chaque étape."""
+    totals, stages = [], {}
+    for _ in range(repeat):
+        with metrics.collect_stages(observe=False) as collected:
+            start = time.perf_counter()
+            analyze_data_pandas(text)
+            totals.append(time.perf_counter() - start)
+        for name, seconds in collected.items():
+            stages.setdefault(name, []).append(seconds)
+    result = {"seconds": statistics.median(totals)}
+    result.update({name: statistics.median(values) for name, values in stages.items()})
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--cols", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--dtypes", nargs="+", choices=DTYPES, default=list(DTYPES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme référence")
+    parser.add_argument("--compare", action="store_true", help="Compare les résultats à la référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--baseline-name", default="analyzer")
+    args = parser.parse_args()
+
+    if not metrics.ENABLED:
+        print("FREY_METRICS=0 : le détail par étape n'est pas disponible.")
+
+    results = {}
+    print(f"{'cas':<24} {'Mo':>6} {'total (s)':>10} {'lecture':>9} {'profil':>9} {'rapport':>9}")
+    for dtype in args.dtypes:
+        for cols in args.cols:
+            for rows in args.rows:
+                text = make_frame(rows, cols, dtype).to_csv(index=False)
+                case = f"{dtype}-{rows}x{cols}"
+                result = bench_case(text, args.repeat)
+                results[case] = result
+                print(f"{case:<24} {len(text) / 1e6:>6.2f} {result['seconds']:>10.4f} {result.get('csv_parse', 0):>9.4f} "
+                      f"{result.get('profile', 0):>9.4f} {result.get('report_format', 0):>9.4f}")
+
+    settings = {"rows": args.rows, "cols": args.cols, "dtypes": args.dtypes, "repeat": args.repeat}
+    if args.save_baseline:
+        print(f"\nRéférence enregistrée : {baseline.save(args.baseline_name, results, settings)}")
+    if args.compare and baseline.compare(args.baseline_name, results, {"seconds": "lower"}, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_csv_loader.py
+"""
+Compare la lecture des données collées : parseur historique (regex, moteur Python)
+contre read_pasted_data (détection du séparateur + moteur C), et vérifie que les
+rapports de analyze_data_pandas restent identiques.
+
+Différences voulues, vérifiées à part (INTENDED_DIFFERENCES) : le parseur historique ne connaît
+ni la tabulation ni les guillemets (une seule colonne pour un TSV, champs cités coupés sur leurs
+virgules) ; read_pasted_data lit ces entrées correctement, donc leurs rapports diffèrent.
+Code de sortie 1 si une vérification échoue.
+
+Usage : python -m benchmarks.bench_csv_loader --rows 10000 100000
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+
+import pandas as pd
+
+from modules import data_analyst
+from modules.data_analyst import LEGACY_SEP, read_pasted_data
+
+
+def make_pasted_text(rows: int, sep: str = ",", seed: int = 0) -> str:
+    """Données collées réalistes : espaces autour des séparateurs, valeurs manquantes, texte."""
+    rng = random.Random(seed)
+    villes = ["Paris", "Lyon", "Marseille", "Lille", "Nantes", "Nice"]
+    pad = " " if sep == "," else ""
+    lines = [f"id{pad}{sep}{pad}prix{pad}{sep}{pad}ville{pad}{sep}{pad}quantite{pad}{sep}{pad}note"]
+    for i in range(rows):
+        quantite = str(rng.randint(0, 50)) if rng.random() > 0.05 else ""
+        fields = [str(i), f"{rng.uniform(1, 500):.2f}", rng.choice(villes), quantite, f"{rng.gauss(3, 1):.3f}"]
+        lines.append(f"{pad}{sep}{pad}".join(fields))
+    return "\n".join(lines) + "\n"
+
+
+def _legacy_read(text: str) -> pd.DataFrame:
+    return pd.read_csv(io.StringIO(text), sep=LEGACY_SEP, engine="python", skipinitialspace=True)
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _reports_match(text: str) -> bool:
+    fast = data_analyst.analyze_data_pandas(text)
+    original_loader = data_analyst.read_pasted_data
+    data_analyst.read_pasted_data = _legacy_read
+    try:
+        legacy = data_analyst.analyze_data_pandas(text)
+    finally:
+        data_analyst.read_pasted_data = original_loader
+    return fast == legacy
+
+
+# (cas, texte collé, DataFrame attendu de read_pasted_data)
+INTENDED_DIFFERENCES = [
+    ("tabulations", "id\tville\tprix\n1\tParis\t10.5\n2\tLyon\t12\n",
+     pd.DataFrame({"id": [1, 2], "ville": ["Paris", "Lyon"], "prix": [10.5, 12.0]})),
+    ("guillemets", 'nom, ville, note\n"Dupont, Jean", Paris, 3\n"Martin, Léa" , Lyon , 4\n',
+     pd.DataFrame({"nom": ["Dupont, Jean", "Martin, Léa"], "ville": ["Paris", "Lyon"], "note": [3, 4]})),
+]
+
+
+def _check_intended_differences() -> bool:
+    """Les entrées tabulées ou citées sont lues correctement, et leurs rapports diffèrent de l'historique."""
+    ok = True
+    print(f"\n{'cas':>12} {'colonnes (historique)':>22} {'colonnes (rapide)':>18}  lecture attendue  rapports différents")
+    for case, text, expected in INTENDED_DIFFERENCES:
+        fast = read_pasted_data(text)
+        try:
+            pd.testing.assert_frame_equal(fast, expected, check_dtype=False)
+            read_ok = True
+        except AssertionError:
+            read_ok = False
+        differs = not _reports_match(text)
+        ok = ok and read_ok and differs
+        print(f"{case:>12} {_legacy_read(text).shape[1]:>22} {fast.shape[1]:>18}  {str(read_ok):>16}  {differs}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ok = True
+    print(f"{'sep':>4} {'lignes':>9} {'historique (s)':>15} {'rapide (s)':>11} {'gain':>7}  rapports identiques")
+    for sep in (",", ";"):
+        for rows in args.rows:
+            text = make_pasted_text(rows, sep=sep)
+            legacy = _best_of(_legacy_read, text, args.repeat)
+            fast = _best_of(read_pasted_data, text, args.repeat)
+            match = _reports_match(text)
+            ok = ok and match
+            print(f"{sep!r:>4} {rows:>9} {legacy:>15.4f} {fast:>11.4f} {legacy / fast:>6.1f}x  {match}")
+
+    if not _check_intended_differences() or not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_startup.py
+"""
+Coût du démarrage de l'API (démarrage à froid), hors ligne :
+- durée d'import de api_server par module et par paquet (python -X importtime) ;
+- pour chaque mode FREY_STARTUP (eager, lazy, prewarm) : durée d'import, délai avant de
+  pouvoir servir (import + démarrage du lifespan) et délai avant que tous les composants
+  différés soient construits (client Gemini, pandas...).
+
+Chaque mesure est faite dans un processus neuf. Le client Gemini est construit avec une
+clé factice : sa construction n'appelle pas le réseau.
+
+Usage :
+  python -m benchmarks.bench_startup
+  python -m benchmarks.bench_startup --repeat 5 --top 25
+  python -m benchmarks.bench_startup --save-baseline | --compare
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks import baseline
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _env(mode: str = "eager") -> dict:
+    return {**os.environ, "GEMINI_API_KEY": "benchmark-hors-ligne", "FREY_STARTUP": mode, "PYTHONPATH": str(ROOT)}
+
+
+def import_profile(repeat: int) -> dict[str, tuple[float, float]]:
+    """Module -> (durée propre, durée cumulée) en secondes, meilleure valeur sur `repeat` processus."""
+    best: dict[str, tuple[float, float]] = {}
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api_server"],
+                                   cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+        for line in completed.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            own, cumulative, name = int(match[1]) / 1e6, int(match[2]) / 1e6, match[4]
+            if name not in best or cumulative < best[name][1]:
+                best[name] = (own, cumulative)
+    return best
+
+
+def _child(mode: str) -> None:
+    """Processus mesuré : import de l'API, démarrage (startup.start), puis construction de tout le reste."""
+    start = time.perf_counter()
+    import api_server
+    from modules import startup
+
+    imported = time.perf_counter() - start
+    startup.start()
+    serving = time.perf_counter() - start
+    if startup._prewarm_thread is not None:
+        startup._prewarm_thread.join()
+    startup.prewarm()  # lazy : équivalent des premières requêtes qui construisent chaque composant
+    ready = time.perf_counter() - start
+    api_server.analysis_pool.shutdown()
+    components = {name: info["seconds"] for name, info in startup.startup_report()["components"].items()}
+    print(json.dumps({"import_seconds": imported, "serve_seconds": serving, "ready_seconds": ready,
+                      "components": components}))
+
+
+def cold_start(mode: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", mode],
+                                   cwd=ROOT, env=_env(mode), capture_output=True, text=True, check=True)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    result = {key: statistics.median(run[key] for run in runs) for key in ("import_seconds", "serve_seconds", "ready_seconds")}
+    for name in runs[0]["components"]:
+        seconds = [run["components"][name] for run in runs if run["components"][name] is not None]
+        result[f"load:{name}"] = statistics.median(seconds) if seconds else 0.0
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Nombre de modules affichés")
+    parser.add_argument("--modes", nargs="+", default=["eager", "lazy", "prewarm"])
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme référence")
+    parser.add_argument("--compare", action="store_true", help="Compare les résultats à la référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--baseline-name", default="startup")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(args.child)
+
+    profile = import_profile(args.repeat)
+    total = profile.get("api_server", (0.0, 0.0))[1]
+    packages: dict[str, float] = defaultdict(float)
+    for name, (own, _) in profile.items():
+        packages[name.split(".")[0]] += own
+
+    print(f"Import de api_server : {total:.3f} s\n")
+    print(f"{'paquet':<28} {'durée propre (s)':>17} {'part':>6}")
+    for package, own in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28} {own:>17.4f} {own / total if total else 0:>6.1%}")
+    print(f"\n{'module':<44} {'cumulé (s)':>11}")
+    for name, (_, cumulative) in sorted(profile.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{name:<44} {cumulative:>11.4f}")
+    print(f"\n{'module du projet':<44} {'cumulé (s)':>11}")
+    for name, (_, cumulative) in sorted(profile.items(), key=lambda item: -item[1][1]):
+        if name == "api_server" or name.startswith("modules"):
+            print(f"{name:<44} {cumulative:>11.4f}")
+
+    results = {"import:api_server": {"seconds": total}}
+    results.update({f"import:{package}": {"seconds": own} for package, own in packages.items() if own >= 0.005})
+    print(f"\n{'mode':<10} {'import (s)':>11} {'prêt à servir (s)':>18} {'tout construit (s)':>19}  composants (s)")
+    for mode in args.modes:
+        result = cold_start(mode, args.repeat)
+        results[f"mode:{mode}"] = result
+        components = ", ".join(f"{key[5:]}={value:.3f}" for key, value in result.items() if key.startswith("load:"))
+        print(f"{mode:<10} {result['import_seconds']:>11.3f} {result['serve_seconds']:>18.3f} "
+              f"{result['ready_seconds']:>19.3f}  {components}")
+
+    settings = {"repeat": args.repeat, "modes": args.modes}
+    if args.save_baseline:
+        print(f"\nRéférence enregistrée : {baseline.save(args.baseline_name, results, settings)}")
+    if args.compare and baseline.compare(args.baseline_name, results,
+                                         {"seconds": "lower", "serve_seconds": "lower", "ready_seconds": "lower"},
+                                         args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
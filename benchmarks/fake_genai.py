@@ -0,0 +1,297 @@
+# benchmarks/fake_genai.py
+"""
+Remplaçant local de genai.Client pour les benchmarks : aucune clé API, aucun réseau.
+
+Expose le sous-ensemble utilisé par FREY (models / aio.models / chats / aio.chats) :
+generate_content, generate_content_stream, count_tokens, list, et des sessions de chat
+avec send_message, send_message_stream et get_history. Les réponses sont de vrais objets
+google.genai.types (texte + usage_metadata), avec :
+- une latence tirée d'une loi configurable (constante, uniforme ou log-normale) ;
+- un flux découpé en fragments espacés dans le temps ;
+- une injection d'erreurs APIError (ex. 503) avec une probabilité donnée.
+
+Usage : FakeGenaiClient(latency=LatencyModel.parse("lognormal:0.2:0.5"), error_rate=0.02, seed=0)
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import AsyncIterator, Iterator, Optional
+
+from google.genai import errors, types
+
+ERROR_STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+class LatencyModel:
+    """
+    Loi de latence d'un appel (secondes). Spécification texte :
+    "const:0.05", "uniform:0.1:0.3", "lognormal:<médiane>:<sigma>".
+    """
+
+    def __init__(self, kind: str = "lognormal", a: float = 0.2, b: float = 0.5):
+        if kind not in ("const", "uniform", "lognormal"):
+            raise ValueError(f"Loi de latence inconnue : {kind}")
+        self.kind, self.a, self.b = kind, a, b
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params]
+        if kind == "const":
+            return cls(kind, values[0] if values else 0.0, 0.0)
+        defaults = {"uniform": (0.1, 0.3), "lognormal": (0.2, 0.5)}.get(kind, (0.0, 0.0))
+        return cls(kind, *(values + list(defaults[len(values):]))[:2])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "const":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+
+    def __str__(self) -> str:
+        return self.kind if self.kind == "const" and not self.a else f"{self.kind}:{self.a:g}:{self.b:g}"
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, types.Content):
+        return "".join(part.text or "" for part in contents.parts or [])
+    if isinstance(contents, list):
+        return "\n".join(_prompt_text(item) for item in contents)
+    return str(contents)
+
+
+def _system_text(config) -> str:
+    instruction = getattr(config, "system_instruction", None) if config is not None else None
+    return instruction if isinstance(instruction, str) else ""
+
+
+class FakeGenaiClient:
+    """
+    Client Gemini simulé. `response_chars` fixe la taille des réponses, `stream_chunks`
+    le nombre de fragments d'un flux (la latence est répartie entre eux). Une erreur injectée
+    dans un flux survient après la moitié des fragments.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, error_rate: float = 0.0, error_code: int = 503,
+                 response_chars: int = 1200, stream_chunks: int = 8, seed: Optional[int] = 0,
+                 model_names: tuple = ("gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.5-pro")):
+        self.latency = latency or LatencyModel("const", 0.0)
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.response_chars = response_chars
+        self.stream_chunks = max(1, stream_chunks)
+        self.model_names = model_names
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "streams": 0, "errors": 0, "count_tokens": 0}
+
+        self.models = _Models(self)
+        self.chats = _Chats(self)
+        self.aio = _Aio(self)
+
+    # --- Tirages (protégés : le client est partagé entre threads) ---
+
+    def _draw(self, stream: bool = False) -> tuple[float, bool]:
+        with self._lock:
+            self.counters["streams" if stream else "calls"] += 1
+            delay = self.latency.sample(self._rng)
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.counters["errors"] += 1
+        return delay, fail
+
+    def _error(self) -> errors.APIError:
+        status = ERROR_STATUS.get(self.error_code, "UNKNOWN")
+        return errors.APIError(self.error_code, {"error": {
+            "code": self.error_code, "message": "Erreur simulée par le faux client Gemini.", "status": status,
+        }})
+
+    # --- Construction des réponses ---
+
+    def _reply_text(self, prompt: str) -> str:
+        head = f"Réponse simulée ({len(prompt)} caractères reçus). "
+        tail = "\n\n**Résumé :** réponse de test.\n**Suggestion :** comparer avec la référence."
+        body = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (self.response_chars // 56 + 1))
+        return head + body[:max(0, self.response_chars - len(head) - len(tail))] + tail
+
+    @staticmethod
+    def _response(text: str, prompt_tokens: Optional[int], output_tokens: Optional[int]) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+            ),
+        )
+
+    def _build(self, contents, config) -> tuple[str, int]:
+        prompt = _prompt_text(contents)
+        return self._reply_text(prompt), (len(prompt) + len(_system_text(config))) // 4
+
+    def _chunks(self, text: str, prompt_tokens: int) -> list[types.GenerateContentResponse]:
+        size = math.ceil(len(text) / self.stream_chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        # Comme l'API : l'usage complet n'est connu que sur le dernier fragment
+        return [
+            self._response(piece, prompt_tokens, len(text) // 4 if i == len(pieces) - 1 else None)
+            for i, piece in enumerate(pieces)
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+class _Models:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None) -> types.GenerateContentResponse:
+        delay, fail = self._client._draw()
+        time.sleep(delay)
+        if fail:
+            raise self._client._error()
+        text, prompt_tokens = self._client._build(contents, config)
+        return self._client._response(text, prompt_tokens, len(text) // 4)
+
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator[types.GenerateContentResponse]:
+        delay, fail = self._client._draw(stream=True)
+        chunks = self._client._chunks(*self._client._build(contents, config))
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            if fail and i >= len(chunks) // 2:
+                raise self._client._error()
+            yield chunk
+
+    def count_tokens(self, model: str, contents, config=None) -> types.CountTokensResponse:
+        with self._client._lock:
+            self._client.counters["count_tokens"] += 1
+        return types.CountTokensResponse(total_tokens=len(_prompt_text(contents)) // 4)
+
+    def list(self, config=None) -> Iterator[types.Model]:
+        for name in self._client.model_names:
+            yield types.Model(
+                name=f"models/{name}", display_name=name.replace("-", " ").title(),
+                supported_actions=["generateContent", "countTokens"],
+            )
+
+
+class _AsyncModels:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None) -> types.GenerateContentResponse:
+        delay, fail = self._client._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise self._client._error()
+        text, prompt_tokens = self._client._build(contents, config)
+        return self._client._response(text, prompt_tokens, len(text) // 4)
+
+    async def generate_content_stream(self, model: str, contents, config=None) -> AsyncIterator[types.GenerateContentResponse]:
+        # Comme client.aio : la coroutine retourne un itérateur asynchrone
+        delay, fail = self._client._draw(stream=True)
+        chunks = self._client._chunks(*self._client._build(contents, config))
+
+        async def stream():
+            for i, chunk in enumerate(chunks):
+                await asyncio.sleep(delay / len(chunks))
+                if fail and i >= len(chunks) // 2:
+                    raise self._client._error()
+                yield chunk
+
+        return stream()
+
+    async def count_tokens(self, model: str, contents, config=None) -> types.CountTokensResponse:
+        return self._client.models.count_tokens(model=model, contents=contents, config=config)
+
+    async def list(self, config=None) -> AsyncIterator[types.Model]:
+        models = list(self._client.models.list(config=config))
+
+        async def pager():
+            for model in models:
+                yield model
+
+        return pager()
+
+
+class _FakeChat:
+    """Session de chat : l'historique complet est renvoyé au modèle à chaque message."""
+
+    def __init__(self, models, model: str, config, history: Optional[list]):
+        self._models = models
+        self._model = model
+        self._config = config
+        self._history: list[types.Content] = list(history or [])
+
+    def get_history(self, curated: bool = False) -> list[types.Content]:
+        return list(self._history)
+
+    def _contents(self, message: str) -> list[types.Content]:
+        return self._history + [types.Content(role="user", parts=[types.Part(text=message)])]
+
+    def _commit(self, message: str, reply: str) -> None:
+        self._history += [
+            types.Content(role="user", parts=[types.Part(text=message)]),
+            types.Content(role="model", parts=[types.Part(text=reply)]),
+        ]
+
+
+class _SyncChat(_FakeChat):
+    def send_message(self, message: str) -> types.GenerateContentResponse:
+        response = self._models.generate_content(model=self._model, contents=self._contents(message), config=self._config)
+        self._commit(message, response.text)
+        return response
+
+    def send_message_stream(self, message: str) -> Iterator[types.GenerateContentResponse]:
+        parts = []
+        for chunk in self._models.generate_content_stream(model=self._model, contents=self._contents(message), config=self._config):
+            parts.append(chunk.text or "")
+            yield chunk
+        self._commit(message, "".join(parts))
+
+
+class _AsyncChat(_FakeChat):
+    async def send_message(self, message: str) -> types.GenerateContentResponse:
+        response = await self._models.generate_content(model=self._model, contents=self._contents(message), config=self._config)
+        self._commit(message, response.text)
+        return response
+
+    async def send_message_stream(self, message: str) -> AsyncIterator[types.GenerateContentResponse]:
+        stream = await self._models.generate_content_stream(model=self._model, contents=self._contents(message), config=self._config)
+
+        async def chunks():
+            parts = []
+            async for chunk in stream:
+                parts.append(chunk.text or "")
+                yield chunk
+            self._commit(message, "".join(parts))
+
+        return chunks()
+
+
+class _Chats:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+
+    def create(self, model: str, config=None, history: Optional[list] = None) -> _SyncChat:
+        return _SyncChat(self._client.models, model, config, history)
+
+
+class _AsyncChats:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+
+    def create(self, model: str, config=None, history: Optional[list] = None) -> _AsyncChat:
+        return _AsyncChat(self._client.aio.models, model, config, history)
+
+
+class _Aio:
+    def __init__(self, client: FakeGenaiClient):
+        self.models = _AsyncModels(client)
+        self.chats = _AsyncChats(client)
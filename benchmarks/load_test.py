@@ -0,0 +1,176 @@
+# benchmarks/load_test.py
+"""
+Test de charge de l'API FastAPI, hors ligne : l'application est appelée en mémoire
+(httpx.ASGITransport, sans serveur ni réseau) et Gemini est remplacé par FakeGenaiClient.
+
+Pour chaque endpoint, `--concurrency` clients envoient des requêtes en boucle fermée
+(une nouvelle requête dès la réponse précédente) ; on mesure le débit et les latences
+p50/p95/p99. Les sujets et données varient d'une requête à l'autre : le cache de réponses
+ne sert pas de raccourci.
+
+Usage :
+  python -m benchmarks.load_test                                   # tous les endpoints
+  python -m benchmarks.load_test --endpoints chat generate --concurrency 32 --requests 500
+  python -m benchmarks.load_test --latency lognormal:0.3:0.6 --error-rate 0.05
+  python -m benchmarks.load_test --save-baseline | --compare
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+# Avant l'import de l'API : pas de clé réelle, et la limite de débit par client ne doit pas
+# brider le générateur de charge (toutes les requêtes viennent du même « client »).
+os.environ["GEMINI_API_KEY"] = "benchmark-hors-ligne"
+os.environ.setdefault("FREY_RATE_LIMIT_RPS", "1000000")
+os.environ.setdefault("FREY_RATE_LIMIT_BURST", "1000000")
+os.environ.setdefault("FREY_ADMISSION_CAPACITY", "1000")
+
+import httpx
+
+from benchmarks import baseline
+from benchmarks.bench_analyzer import make_frame
+from benchmarks.fake_genai import FakeGenaiClient, LatencyModel
+
+ENDPOINTS = ("chat", "chat_stream", "generate", "generate_stream", "batch", "analyze")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Percentile au rang le plus proche (valeurs déjà triées)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Scenario:
+    """Construit la i-ème requête d'un endpoint ; chaque client de chat garde sa session."""
+
+    def __init__(self, analyze_rows: int, batch_size: int):
+        self.csv = [make_frame(analyze_rows, 6, "mixed", seed=seed).to_csv(index=False) for seed in range(8)]
+        self.batch_size = batch_size
+
+    def request(self, endpoint: str, i: int, state: dict) -> tuple[str, dict]:
+        if endpoint == "chat":
+            body = {"user_prompt": f"Question de test n°{i} : comment organiser ma semaine ?"}
+            if state.get("session_id"):
+                body["session_id"] = state["session_id"]
+            return "/api/chat", body
+        if endpoint == "chat_stream":
+            body = {"user_prompt": f"Question de test n°{i} : résume l'actualité."}
+            if state.get("session_id"):
+                body["session_id"] = state["session_id"]
+            return "/api/chat/stream", body
+        if endpoint == "generate":
+            return "/api/generate", {"subject": f"Article de test n°{i}", "ton": "professionnel"}
+        if endpoint == "generate_stream":
+            return "/api/generate/stream", {"subject": f"Flux de test n°{i}", "ton": "amical"}
+        if endpoint == "batch":
+            items = [{"subject": f"Lot {i}, élément {k}", "ton": "neutre"} for k in range(self.batch_size)]
+            return "/api/generate/batch", {"items": items}
+        # Ligne supplémentaire unique : même coût d'analyse, clé de cache différente
+        return "/api/analyze", {"data_input": self.csv[i % len(self.csv)] + f"{',' * 5}{i}\n"}
+
+
+async def run_endpoint(client: httpx.AsyncClient, scenario: Scenario, endpoint: str,
+                       concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(requests))
+
+    async def worker():
+        state: dict = {}
+        for i in counter:
+            path, body = scenario.request(endpoint, i, state)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                await response.aread()
+                status = response.status_code
+                # Flux SSE : une erreur Gemini arrive en cours de réponse, après le statut 200
+                if status == 200 and endpoint.endswith("stream") and b"event: error" in response.content:
+                    status = "sse_error"
+            except Exception:
+                status = "exception"
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if status == 200 and endpoint == "chat":
+                state["session_id"] = response.json().get("session_id")
+            elif status == 200 and endpoint == "chat_stream":
+                state["session_id"] = response.headers.get("x-session-id")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        "requests": requests,
+        "errors": requests - ok,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run(args) -> dict:
+    import api_server
+
+    fake = FakeGenaiClient(latency=LatencyModel.parse(args.latency), error_rate=args.error_rate,
+                           response_chars=args.response_chars, seed=args.seed)
+    api_server.gemini.set(fake)
+
+    scenario = Scenario(args.analyze_rows, args.batch_size)
+    transport = httpx.ASGITransport(app=api_server.app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://frey.local", timeout=None) as client:
+            print(f"{'endpoint':<16} {'requêtes':>8} {'erreurs':>8} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8}")
+            for endpoint in args.endpoints:
+                result = await run_endpoint(client, scenario, endpoint, args.concurrency, args.requests)
+                results[endpoint] = result
+                print(f"{endpoint:<16} {result['requests']:>8} {result['errors']:>8} {result['rps']:>8.1f} "
+                      f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f}")
+                if result["errors"]:
+                    print(f"{'':<16} statuts : {result['statuses']}")
+    finally:
+        api_server.analysis_pool.shutdown()
+    print(f"\nFaux client Gemini : {fake.stats()}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par endpoint")
+    parser.add_argument("--latency", default="lognormal:0.05:0.5", help="Latence simulée de Gemini (voir LatencyModel)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion d'appels Gemini en erreur 503")
+    parser.add_argument("--response-chars", type=int, default=1200)
+    parser.add_argument("--analyze-rows", type=int, default=2_000)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme référence")
+    parser.add_argument("--compare", action="store_true", help="Compare les résultats à la référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--baseline-name", default="load_test")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("save_baseline", "compare", "tolerance", "baseline_name")}
+    if args.save_baseline:
+        print(f"Référence enregistrée : {baseline.save(args.baseline_name, results, settings)}")
+    if args.compare and baseline.compare(args.baseline_name, results, {"rps": "higher", "p95": "lower"}, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
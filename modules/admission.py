@@ -0,0 +1,262 @@
+# modules/admission.py
+"""
+Contrôle d'admission des requêtes de l'API :
+- limite de débit par client (seau à jetons) -> 429 + Retry-After ;
+- nombre borné de requêtes traitées simultanément ; au-delà, files d'attente par classe de
+  priorité (chat > generate > analyze), de taille bornée ;
+- rejet anticipé (503 + Retry-After) quand l'attente estimée dépasse l'échéance de la classe,
+  plutôt que de laisser la requête expirer dans la file.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from modules.concurrency import env_int
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée par le contrôle d'admission (429 ou 503)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class PriorityClass:
+    name: str
+    priority: int       # 0 = la plus prioritaire
+    max_queued: int
+    deadline: float     # Attente maximale en file (secondes)
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `burst` en réserve."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """
+        Consomme `cost` jetons ; retourne 0, ou le délai avant qu'ils soient disponibles.
+        Un coût supérieur à `burst` (ex. un gros lot) passe quand le seau est plein et le laisse
+        en dette : les requêtes suivantes du client attendent le remboursement.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        return (needed - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    """Limite de débit par client, places de traitement et files d'attente par priorité."""
+
+    def __init__(self, capacity: int, classes: list[PriorityClass], rate: float, burst: float,
+                 max_clients: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.classes = {c.name: c for c in classes}
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self.active = 0
+        self.service_time = 1.0  # Moyenne mobile (EWMA) de la durée d'une requête admise
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self.queued = {name: 0 for name in self.classes}
+        self.counters = {"admitted": 0, "waited": 0, "rate_limited": 0, "shed": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        defaults = [("chat", 64, 5), ("generate", 32, 15), ("analyze", 16, 30)]
+        classes = [
+            PriorityClass(
+                name, priority,
+                max_queued=env_int(f"FREY_ADMISSION_QUEUE_{name.upper()}", queued),
+                deadline=float(os.environ.get(f"FREY_ADMISSION_DEADLINE_{name.upper()}", deadline)),
+            )
+            for priority, (name, queued, deadline) in enumerate(defaults)
+        ]
+        return cls(
+            capacity=env_int("FREY_ADMISSION_CAPACITY", 32),
+            classes=classes,
+            rate=float(os.environ.get("FREY_RATE_LIMIT_RPS", 2)),
+            burst=float(os.environ.get("FREY_RATE_LIMIT_BURST", 20)),
+        )
+
+    # --- Limite de débit par client ---
+
+    def consume(self, client: str, cost: float = 1) -> None:
+        now = self.clock()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client)
+        wait = bucket.take(cost, now)
+        if wait:
+            self.counters["rate_limited"] += 1
+            raise AdmissionRejected(429, "Trop de requêtes pour ce client, veuillez ralentir.", wait)
+
+    # --- Places de traitement et files par priorité ---
+
+    def _estimated_wait(self, priority_class: PriorityClass) -> float:
+        # Les requêtes de priorité supérieure ou égale passeront avant celle-ci
+        ahead = sum(count for name, count in self.queued.items()
+                    if self.classes[name].priority <= priority_class.priority)
+        return (ahead + 1) * self.service_time / max(1, self.capacity)
+
+    async def acquire(self, name: str) -> None:
+        priority_class = self.classes[name]
+        if self.active < self.capacity and not self._waiters:
+            self.active += 1
+            self.counters["admitted"] += 1
+            return
+
+        estimated = self._estimated_wait(priority_class)
+        if self.queued[name] >= priority_class.max_queued or estimated > priority_class.deadline:
+            self.counters["shed"] += 1
+            raise AdmissionRejected(503, "Serveur saturé, veuillez réessayer dans quelques instants.", estimated)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority_class.priority, next(self._seq), future))
+        self.queued[name] += 1
+        self.counters["waited"] += 1
+        try:
+            await asyncio.wait_for(future, priority_class.deadline)
+        except asyncio.CancelledError:
+            # Client parti juste après avoir reçu la place : elle passe au suivant
+            if future.done() and not future.cancelled():
+                self._hand_over()
+            raise
+        except asyncio.TimeoutError:
+            self.counters["expired"] += 1
+            raise AdmissionRejected(503, "Serveur saturé, veuillez réessayer dans quelques instants.",
+                                    self._estimated_wait(priority_class))
+        finally:
+            self.queued[name] -= 1
+        self.counters["admitted"] += 1
+
+    def release(self, service_time: float) -> None:
+        self.service_time = 0.9 * self.service_time + 0.1 * service_time
+        self._hand_over()
+
+    def _hand_over(self) -> None:
+        # La place libérée passe directement à la requête en attente la plus prioritaire
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": dict(self.queued),
+            "avg_service_time": round(self.service_time, 3),
+            "clients": len(self._buckets),
+            **self.counters,
+        }
+
+
+# Routes soumises au contrôle d'admission (POST uniquement) et leur classe de priorité. Les routes de
+# lecture (statistiques, suivi et abonnement SSE des travaux d'analyse, suppression) ne calculent rien :
+# un abonnement ne doit pas occuper une place pendant toute la durée du travail.
+ROUTE_CLASSES = {
+    "/api/chat": "chat",
+    "/api/chat/stream": "chat",
+    "/api/generate": "generate",
+    "/api/generate/stream": "generate",
+    "/api/generate/batch": "generate",
+    "/api/analyze": "analyze",
+    "/api/analyze/upload": "analyze",
+    "/api/analyze/jobs": "analyze",
+    "/api/analyze/jobs/upload": "analyze",
+}
+
+
+def route_class(path: str, method: str = "POST") -> Optional[str]:
+    """Classe de priorité d'une route (None : route non soumise au contrôle d'admission)."""
+    if method != "POST":
+        return None
+    return ROUTE_CLASSES.get(path)
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI : la place est conservée jusqu'à la fin de la réponse (flux SSE compris).
+    Le client est identifié par son adresse IP, ou par l'en-tête `client_header`
+    (ex. x-forwarded-for derrière un proxy de confiance).
+    """
+
+    def __init__(self, app, controller: AdmissionController, client_header: Optional[str] = None):
+        self.app = app
+        self.controller = controller
+        self.client_header = client_header.lower().encode() if client_header else None
+
+    def _client_id(self, scope) -> str:
+        if self.client_header:
+            for name, value in scope.get("headers", []):
+                if name == self.client_header:
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "inconnu"
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["path"], scope.get("method", "GET")) if scope["type"] == "http" else None
+        if name is None or scope.get("method") == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        client = self._client_id(scope)
+        # Les endpoints peuvent facturer un coût supplémentaire (ex. taille d'un lot)
+        scope.setdefault("state", {})["client_id"] = client
+        try:
+            self.controller.consume(client)
+            await self.controller.acquire(name)
+        except AdmissionRejected as e:
+            return await _reject(send, e)
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - start)
+
+
+def retry_after_seconds(delay: float) -> int:
+    """Valeur de l'en-tête Retry-After : secondes entières, entre 1 et 1 heure."""
+    return int(min(3600, max(1, math.ceil(delay))))
+
+
+async def _reject(send, rejection: AdmissionRejected) -> None:
+    body = json.dumps({"detail": rejection.detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": rejection.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after_seconds(rejection.retry_after)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
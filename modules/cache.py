@@ -0,0 +1,206 @@
+# modules/cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def make_cache_key(model: str, temperature: Optional[float], system_prompt: Optional[str], prompt: Any) -> str:
+    """Empreinte SHA-256 de (modèle, température, prompt système, prompt complet assemblé)."""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "system": system_prompt, "prompt": prompt},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Niveau mémoire : LRU borné en nombre d'entrées et en octets, avec TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._data.pop(key)
+        self._bytes -= len(value.encode("utf-8"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "bytes": self._bytes,
+                "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+
+class SQLiteCache:
+    """Niveau disque : table SQLite partagée entre redémarrages (et entre workers), avec TTL et éviction LRU."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 100_000, max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            # Supprime par lots les entrées les moins récemment lues
+            batch = max(1, count - self.max_entries, count // 10 if total > self.max_bytes else 0)
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (batch,),
+            )
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total, "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes, "path": self.path}
+
+
+class ResponseCache:
+    """
+    Cache des réponses Gemini adressé par le contenu, à plusieurs niveaux (mémoire puis disque).
+
+    Un succès sur un niveau inférieur est recopié dans les niveaux supérieurs.
+    Tout objet exposant get/set/clear/stats peut servir de niveau (cache pluggable).
+    """
+
+    def __init__(self, tiers: list):
+        self.tiers = tiers
+        self.hits = {tier.name: 0 for tier in tiers}
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """
+        FREY_CACHE=0 désactive le cache. FREY_CACHE_TTL (s), FREY_CACHE_MAX_ENTRIES,
+        FREY_CACHE_MAX_BYTES règlent le niveau mémoire ; FREY_CACHE_PATH active le niveau SQLite
+        (FREY_CACHE_DISK_TTL, FREY_CACHE_DISK_MAX_ENTRIES, FREY_CACHE_DISK_MAX_BYTES).
+        """
+        if os.environ.get("FREY_CACHE", "1") == "0":
+            return None
+        ttl = float(os.environ.get("FREY_CACHE_TTL", 3600))
+        tiers = [MemoryCache(
+            max_entries=int(os.environ.get("FREY_CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.environ.get("FREY_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            ttl_seconds=ttl,
+        )]
+        path = os.environ.get("FREY_CACHE_PATH")
+        if path:
+            tiers.append(SQLiteCache(
+                path,
+                max_entries=int(os.environ.get("FREY_CACHE_DISK_MAX_ENTRIES", 100_000)),
+                max_bytes=int(os.environ.get("FREY_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024)),
+                ttl_seconds=float(os.environ.get("FREY_CACHE_DISK_TTL", 24 * 3600)),
+            ))
+        return cls(tiers)
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                self.hits[tier.name] += 1
+                for upper in self.tiers[:i]:
+                    upper.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> dict:
+        lookups = sum(self.hits.values()) + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(sum(self.hits.values()) / lookups, 4) if lookups else 0.0,
+            "tiers": {tier.name: tier.stats() for tier in self.tiers},
+        }
@@ -1,24 +1,60 @@
 # modules/chatbot.py
 
-from google import genai
-from google.genai import types
-from typing import Any # Ajout pour l'annotation de type de la mémoire
+from typing import Any, AsyncIterator, Iterator # Ajout pour l'annotation de type de la mémoire
 
-def process_chatbot_query(chat_session: Any, user_prompt: str) -> dict:
+from modules import llm, metrics
+from modules.prompts import token_usage
+
+DEFAULT_CHAT_MODEL = "gemini-2.5-flash"
+
+
+def _session_model(chat_session: Any) -> str:
+    # Sert à choisir le disjoncteur : client.chats expose `_model`, BudgetedChat `model`
+    return getattr(chat_session, "model", None) or getattr(chat_session, "_model", None) or DEFAULT_CHAT_MODEL
+
+
+def send_message(chat_session: Any, user_prompt: str):
+    """
+    Envoie un message avec nouvelles tentatives et disjoncteur (voir modules/resilience.py).
+    Pas de repli ni de hedging : la session est liée à son modèle et un envoi en double
+    dupliquerait le message dans l'historique.
+    """
+    with metrics.stage("gemini_call"):
+        if llm.caller is None:
+            return chat_session.send_message(user_prompt)
+        return llm.caller.call(lambda model: chat_session.send_message(user_prompt), _session_model(chat_session), fallback=False)
+
+
+async def send_message_async(chat_session: Any, user_prompt: str):
+    """Variante asynchrone de send_message, pour une session client.aio.chats."""
+    with metrics.stage("gemini_call"):
+        if llm.caller is None:
+            return await chat_session.send_message(user_prompt)
+        return await llm.caller.call_async(
+            lambda model: chat_session.send_message(user_prompt), _session_model(chat_session), fallback=False, hedge=False
+        )
+
+
+def process_chatbot_query(chat_session: Any, user_prompt: str, stream: bool = False):
     """
     Traite la requête utilisateur via la session de chat Gemini, qui gère l'historique et le prompt système.
     
     Args:
         chat_session (Any): La session de chat Gemini (objet Chat).
         user_prompt (str): La question soumise par l'utilisateur.
+        stream (bool): Si True, retourne un générateur de fragments de texte (compatible st.write_stream).
         
     Returns:
         dict: Contient la réponse formatée complète générée par le modèle.
+        (En mode stream : un générateur de str ; une erreur est émise comme dernier fragment.)
     """
     
+    if stream:
+        return _stream_chatbot_query(chat_session, user_prompt)
+
     try:
-        # Envoi du message à la session de chat
-        response = chat_session.send_message(user_prompt)
+        # Envoi du message à la session de chat (nouvelles tentatives en cas de surcharge)
+        response = send_message(chat_session, user_prompt)
 
         # Retourne la réponse complète
         return {
@@ -27,8 +63,35 @@ def process_chatbot_query(chat_session: Any, user_prompt: str) -> dict:
         }
 
     except Exception as e:
-        # Gérer les erreurs de l'API (y compris la surcharge)
-        return {
-            "reponse_complete": f"🚨 ERREUR API GEMINI : Je n'ai pas pu traiter votre demande. Détails: {e}. (La mémoire est conservée, veuillez réessayer).",
-            "success": False
-        }
\ No newline at end of file
+        return _error_result(e)
+
+
+def _stream_chatbot_query(chat_session: Any, user_prompt: str) -> Iterator[str]:
+    try:
+        for chunk in chat_session.send_message_stream(user_prompt):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        yield "\n\n" + _error_result(e)["reponse_complete"]
+
+
+async def stream_chatbot_query_async(chat_session: Any, user_prompt: str) -> AsyncIterator[str]:
+    """
+    Envoie le message à une session client.aio.chats et émet les fragments de texte dès leur arrivée.
+    Les erreurs de l'API sont propagées à l'appelant (qui décide comment les signaler).
+    """
+
+    usage = None
+    async for chunk in await chat_session.send_message_stream(user_prompt):
+        usage = chunk.usage_metadata or usage
+        if chunk.text:
+            yield chunk.text
+    token_usage.record("chat", usage)
+
+
+def _error_result(e: Exception) -> dict:
+    # Gérer les erreurs de l'API (y compris la surcharge)
+    return {
+        "reponse_complete": f"🚨 ERREUR API GEMINI : Je n'ai pas pu traiter votre demande. Détails: {e}. (La mémoire est conservée, veuillez réessayer).",
+        "success": False
+    }
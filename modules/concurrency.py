@@ -0,0 +1,67 @@
+# modules/concurrency.py
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+
+def env_int(name: str, default: int) -> int:
+    """Lit un entier dans les variables d'environnement (valeur par défaut si absente ou invalide)."""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class ConcurrencyLimiter:
+    """
+    Borne le nombre d'appels Gemini en vol : une limite globale partagée par tous
+    les endpoints, plus une limite propre à chaque endpoint.
+
+    Les limites par endpoint se lisent dans FREY_MAX_CONCURRENT_<ENDPOINT>
+    (ex. FREY_MAX_CONCURRENT_CHAT) ; à défaut, la limite globale s'applique.
+    """
+
+    def __init__(self, global_limit: int, endpoint_limits: dict | None = None):
+        self.global_limit = global_limit
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self._global = asyncio.Semaphore(global_limit)
+        self._endpoints: dict[str, asyncio.Semaphore] = {}
+        self._in_flight: dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "ConcurrencyLimiter":
+        global_limit = env_int("FREY_MAX_CONCURRENT_CALLS", 64)
+        endpoint_limits = {}
+        for name, value in os.environ.items():
+            if name.startswith("FREY_MAX_CONCURRENT_") and name != "FREY_MAX_CONCURRENT_CALLS":
+                endpoint = name[len("FREY_MAX_CONCURRENT_"):].lower()
+                endpoint_limits[endpoint] = env_int(name, global_limit)
+        return cls(global_limit, endpoint_limits)
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        if endpoint not in self._endpoints:
+            limit = self.endpoint_limits.get(endpoint, self.global_limit)
+            self._endpoints[endpoint] = asyncio.Semaphore(limit)
+        return self._endpoints[endpoint]
+
+    @asynccontextmanager
+    async def limit(self, endpoint: str):
+        """Attend une place pour l'endpoint puis une place globale."""
+        async with self._semaphore(endpoint):
+            async with self._global:
+                self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+                try:
+                    yield
+                finally:
+                    self._in_flight[endpoint] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "global_limit": self.global_limit,
+            "endpoint_limits": {
+                endpoint: self.endpoint_limits.get(endpoint, self.global_limit)
+                for endpoint in set(self.endpoint_limits) | set(self._in_flight)
+            },
+            "in_flight": dict(self._in_flight),
+        }
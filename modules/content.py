@@ -1,45 +1,168 @@
 # modules/content.py (Correction de la fonction generate_content)
 
-from google import genai
-from google.genai import types # S'assurer que 'types' est importé au début du fichier
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, Optional
 
-def generate_content(client: genai.Client, subject: str, ton: str, system_prompt: str) -> str:
+from modules import llm, metrics
+from modules.cache import ResponseCache
+from modules.prompts import CONTENT_TEMPLATE, token_usage
+
+if TYPE_CHECKING:  # google.genai est importé au premier appel (démarrage rapide, voir modules/startup.py)
+    from google import genai
+    from google.genai import types
+
+    from modules.similarity import SimilarityCache
+
+MODEL_NAME = "gemini-2.5-flash"
+
+
+def _build_prompt(subject: str, ton: str) -> str:
+    # Le prompt système n'est plus recopié ici : il est transmis une seule fois, via system_instruction
+    return CONTENT_TEMPLATE.render(subject=subject, ton=ton)
+
+
+def _build_config(system_prompt: str) -> "types.GenerateContentConfig":
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+         temperature=0.7,
+         system_instruction=system_prompt # Le prompt système est appliqué directement ici
+    )
+
+
+def _similar_answer(similar: Optional["SimilarityCache"], subject: str, ton: str, system_prompt: str,
+                    bypass_cache: bool, model: str = MODEL_NAME) -> tuple[Optional[int], Optional[str]]:
+    """(périmètre, réponse) du cache de similarité : même modèle, même ton, même prompt système."""
+    if similar is None:
+        return None, None
+    scope = similar.scope("generate", model, ton.strip().lower(), system_prompt)
+    match = None if bypass_cache else similar.get(subject, scope)
+    return scope, match[0] if match else None
+
+
+def _remember(similar: Optional["SimilarityCache"], scope: Optional[int], subject: str, result: llm.ModelResult,
+              model: str = MODEL_NAME) -> None:
+    # Comme pour le cache exact, une réponse du modèle de repli n'est pas retenue
+    if similar is not None and result.text and (result.cached or result.model == model):
+        similar.set(subject, scope, result.text.strip())
+
+
+def _extract_text(result: llm.ModelResult) -> str:
+    # ⚠️ SOLUTION : VÉRIFICATION SIMPLE ET ROBUSTE
+    if result.text:
+        return result.text.strip()
+    response = result.response
+
+    # Si la réponse est vide (souvent à cause d'un filtre de sécurité)
+    # On tente d'extraire le message du filtre pour le diagnostic
+    try:
+         # Ceci fonctionne avec la structure moderne de google-genai
+         feedback = response.prompt_feedback.block_reason.name if response.prompt_feedback.block_reason else "Non spécifié"
+         return f"⚠️ La génération de contenu a échoué. Réponse vide (Filtre de Sécurité ? Raison: {feedback})"
+    except Exception:
+         return "⚠️ La génération de contenu a échoué. La réponse de l'API était vide."
+
+
+def generate_content(client: "genai.Client", subject: str, ton: str, system_prompt: str, stream: bool = False,
+                     cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                     similar: Optional["SimilarityCache"] = None, model: str = MODEL_NAME):
     """
     ✅ Génère du contenu textuel avec Gemini.
+    Avec stream=True, retourne un générateur de fragments de texte (compatible st.write_stream).
+    Avec un cache, une demande identique (sujet, ton, prompt système) est servie sans appel à l'API ;
+    avec `similar`, une demande quasi identique (sujet reformulé, même ton) aussi.
+    `model` : modèle choisi par l'appelant (voir modules/model_router.py).
     """
 
-    prompt = f"""
-{system_prompt}
+    with metrics.stage("prompt_build"):
+        prompt = _build_prompt(subject, ton)
 
-🎯 Objectif :
-Rédige un texte fluide, pertinent et de qualité professionnelle sur le sujet suivant,
-en adoptant un ton **{ton}**.
+    if stream:
+        return _stream_content(client, prompt, system_prompt, model)
 
-📝 Sujet : "{subject}"
-"""
+    try:
+        scope, answer = _similar_answer(similar, subject, ton, system_prompt, bypass_cache, model)
+        if answer is not None:
+            return answer
+        result = llm.generate(
+            client,
+            model=model,
+            contents=prompt,
+            config=_build_config(system_prompt),
+            cache=cache,
+            bypass_cache=bypass_cache,
+            endpoint="generate"
+        )
+        _remember(similar, scope, subject, result, model)
+        return _extract_text(result)
+
+    except Exception as e:
+        return f"🚨 ERREUR API GEMINI lors de la génération : {e}"
 
+
+def _stream_content(client: "genai.Client", prompt: str, system_prompt: str, model: str = MODEL_NAME) -> Iterator[str]:
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash", 
+        for chunk in client.models.generate_content_stream(
+            model=model,
             contents=prompt,
-            config=types.GenerateContentConfig(
-                 temperature=0.7,
-                 system_instruction=system_prompt # Le prompt système est appliqué directement ici
-            )
+            config=_build_config(system_prompt)
+        ):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        yield f"\n\n🚨 ERREUR API GEMINI lors de la génération : {e}"
+
+
+async def generate_content_async(client: "genai.Client", subject: str, ton: str, system_prompt: str,
+                                 cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                                 raise_errors: bool = False, similar: Optional["SimilarityCache"] = None,
+                                 model: str = MODEL_NAME) -> str:
+    """
+    ✅ Variante asynchrone de generate_content (client.aio) : n'occupe pas la boucle d'événements.
+    Avec raise_errors=True, les erreurs de l'API sont propagées au lieu d'être renvoyées en texte.
+    """
+
+    with metrics.stage("prompt_build"):
+        prompt = _build_prompt(subject, ton)
+
+    try:
+        scope, answer = _similar_answer(similar, subject, ton, system_prompt, bypass_cache, model)
+        if answer is not None:
+            return answer
+        result = await llm.generate_async(
+            client,
+            model=model,
+            contents=prompt,
+            config=_build_config(system_prompt),
+            cache=cache,
+            bypass_cache=bypass_cache,
+            endpoint="generate"
         )
+        _remember(similar, scope, subject, result, model)
+        return _extract_text(result)
 
-        # ⚠️ SOLUTION : VÉRIFICATION SIMPLE ET ROBUSTE
-        if response.text:
-            return response.text.strip()
-        
-        # Si la réponse est vide (souvent à cause d'un filtre de sécurité)
-        # On tente d'extraire le message du filtre pour le diagnostic
-        try:
-             # Ceci fonctionne avec la structure moderne de google-genai
-             feedback = response.prompt_feedback.block_reason.name if response.prompt_feedback.block_reason else "Non spécifié"
-             return f"⚠️ La génération de contenu a échoué. Réponse vide (Filtre de Sécurité ? Raison: {feedback})"
-        except Exception:
-             return "⚠️ La génération de contenu a échoué. La réponse de l'API était vide."
-        
     except Exception as e:
-        return f"🚨 ERREUR API GEMINI lors de la génération : {e}"
\ No newline at end of file
+        if raise_errors:
+            raise
+        return f"🚨 ERREUR API GEMINI lors de la génération : {e}"
+
+
+async def generate_content_stream_async(client: "genai.Client", subject: str, ton: str, system_prompt: str,
+                                        model: str = MODEL_NAME) -> AsyncIterator[str]:
+    """
+    ✅ Génération en flux (client.aio) : émet les fragments de texte dès leur arrivée.
+    Les erreurs de l'API sont propagées à l'appelant.
+    """
+
+    with metrics.stage("prompt_build"):
+        prompt = _build_prompt(subject, ton)
+
+    usage = None
+    async for chunk in await client.aio.models.generate_content_stream(
+        model=model,
+        contents=prompt,
+        config=_build_config(system_prompt)
+    ):
+        usage = chunk.usage_metadata or usage
+        if chunk.text:
+            yield chunk.text
+    token_usage.record("generate", usage)
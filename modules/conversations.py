@@ -0,0 +1,300 @@
+# modules/conversations.py
+"""
+Historique durable des conversations de chat, dans un fichier SQLite local (mode WAL) partagé
+par tous les workers uvicorn de la machine.
+
+- Écriture différée : les messages sont mis en file en mémoire et écrits par lots, dans une seule
+  transaction, par un thread d'écriture (jamais sur le chemin de la requête). Les messages pas encore
+  écrits restent visibles pour le processus qui les a produits ; un autre worker les voit après
+  au plus `flush_interval` secondes.
+- Reprise : une seule lecture indexée (session_id, id) rend les `window` derniers messages. Les lectures
+  passent par une connexion en lecture seule : elles n'attendent jamais le verrou d'écriture (WAL).
+- Compactage périodique : les sessions inactives depuis plus de `retention_seconds` sont supprimées,
+  ou déplacées dans une base d'archive si `archive_path` est défini.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+import threading
+import time
+from typing import Optional
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS {db}sessions ("
+    " session_id TEXT PRIMARY KEY, created REAL NOT NULL, updated REAL NOT NULL, messages INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS {db}messages ("
+    " id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS {db}messages_session ON messages(session_id, id)",
+    "CREATE INDEX IF NOT EXISTS {db}sessions_updated ON sessions(updated)",
+)
+
+
+class ConversationStore:
+    """Messages par session (table messages) et résumé par session (table sessions : dates, nombre de messages)."""
+
+    def __init__(self, path: str, window: int = 50, batch_size: int = 200, flush_interval: float = 0.5,
+                 retention_seconds: float = 30 * 24 * 3600, compact_interval: float = 3600,
+                 archive_path: Optional[str] = None):
+        self.path = path
+        self.window = window
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_seconds
+        self.compact_interval = compact_interval
+        self.archive_path = archive_path
+
+        self._lock = threading.Lock()  # Connexion partagée par les requêtes et les threads de fond
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement.format(db=""))
+        if archive_path:
+            self._conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            for statement in SCHEMA:
+                self._conn.execute(statement.format(db="archive."))
+        # Lectures (reprise, statistiques) : connexion séparée, sans le verrou d'écriture ni BEGIN IMMEDIATE
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True,
+                                       check_same_thread=False, isolation_level=None, timeout=10)
+
+        self._pending: list[tuple[str, str, str, float]] = []  # (session_id, rôle, texte, date)
+        self._pending_lock = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+        self.counters = {"appended": 0, "written": 0, "batches": 0, "write_errors": 0, "loads": 0,
+                         "resumed": 0, "deleted": 0, "compactions": 0, "sessions_compacted": 0}
+        self.last_compaction: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["ConversationStore"]:
+        """
+        FREY_CONVERSATION_DB (chemin du fichier SQLite) active le stockage durable.
+        FREY_CONVERSATION_WINDOW (messages rechargés à la reprise), FREY_CONVERSATION_BATCH,
+        FREY_CONVERSATION_FLUSH_INTERVAL (s), FREY_CONVERSATION_RETENTION_DAYS,
+        FREY_CONVERSATION_COMPACT_INTERVAL (s), FREY_CONVERSATION_ARCHIVE (base d'archive, facultative).
+        """
+        path = os.environ.get("FREY_CONVERSATION_DB")
+        if not path:
+            return None
+        return cls(
+            path,
+            window=int(os.environ.get("FREY_CONVERSATION_WINDOW", 50)),
+            batch_size=int(os.environ.get("FREY_CONVERSATION_BATCH", 200)),
+            flush_interval=float(os.environ.get("FREY_CONVERSATION_FLUSH_INTERVAL", 0.5)),
+            retention_seconds=float(os.environ.get("FREY_CONVERSATION_RETENTION_DAYS", 30)) * 24 * 3600,
+            compact_interval=float(os.environ.get("FREY_CONVERSATION_COMPACT_INTERVAL", 3600)),
+            archive_path=os.environ.get("FREY_CONVERSATION_ARCHIVE") or None,
+        )
+
+    # --- Écriture différée ---
+
+    def append(self, session_id: str, messages: list[tuple[str, str]]) -> int:
+        """
+        Met en file des messages (rôle, texte) ; retour immédiat, l'écriture se fait par lots.
+        Retourne le nombre de messages retenus (les messages vides sont ignorés).
+        """
+        now = time.time()
+        queued = [(session_id, role, text, now) for role, text in messages if text]
+        with self._pending_lock:
+            self._pending.extend(queued)
+            self.counters["appended"] += len(messages)
+            if len(self._pending) >= self.batch_size:
+                self._pending_lock.notify()
+        if not self._threads:
+            self.start()
+        return len(queued)
+
+    def _writer(self) -> None:
+        # Un lot par intervalle (ou dès que batch_size messages attendent) plutôt qu'une transaction par tour
+        while True:
+            with self._pending_lock:
+                if len(self._pending) < self.batch_size and not self._stopping.is_set():
+                    self._pending_lock.wait(self.flush_interval)
+                stopping = self._stopping.is_set() and not self._pending
+            if stopping:
+                return
+            if not self.flush():
+                self._stopping.wait(self.flush_interval)  # Base indisponible : pas de nouvel essai immédiat
+
+    def flush(self) -> bool:
+        """
+        Écrit les messages en attente en une transaction. Le lot ne quitte la file qu'au COMMIT, pris sous
+        le verrou de la file : une lecture concurrente le voit soit dans la file, soit dans la base.
+        """
+        with self._lock:
+            with self._pending_lock:
+                batch = list(self._pending)
+            if not batch:
+                return True
+            sessions: dict[str, tuple[float, float, int]] = {}
+            for session_id, _, _, created in batch:
+                first, _, count = sessions.get(session_id, (created, created, 0))
+                sessions[session_id] = (first, created, count + 1)
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "INSERT INTO messages (session_id, role, text, created) VALUES (?, ?, ?, ?)", batch)
+                    self._conn.executemany(
+                        "INSERT INTO sessions (session_id, created, updated, messages) VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT(session_id) DO UPDATE SET updated = excluded.updated,"
+                        " messages = messages + excluded.messages",
+                        [(session_id, *values) for session_id, values in sessions.items()])
+                    with self._pending_lock:
+                        self._conn.execute("COMMIT")
+                        del self._pending[:len(batch)]  # append() ne fait qu'ajouter en fin de file
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                # Base verrouillée ou disque plein : le lot reste en tête de file pour le prochain essai
+                print(f"Écriture de l'historique des conversations impossible : {e}")
+                self.counters["write_errors"] += 1
+                return False
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+        return True
+
+    # --- Lecture ---
+
+    def load(self, session_id: str, window: Optional[int] = None) -> list[dict]:
+        """
+        Derniers messages de la session ({"role", "text"}, du plus ancien au plus récent), en une lecture indexée.
+        Bloquant (lecture SQLite) : depuis la boucle d'événements, à appeler via asyncio.to_thread.
+        """
+        return self.snapshot(session_id, window)[0]
+
+    def _stored_count(self, session_id: str) -> int:
+        row = self._reader.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def message_count(self, session_id: str) -> int:
+        """
+        Nombre de messages de la session (base et file de ce processus), en une lecture par clé primaire :
+        il augmente quand un autre worker ajoute un tour. Bloquant : via asyncio.to_thread.
+        """
+        with self._read_lock:
+            # Lecture et file sous _pending_lock : un lot écrit entre les deux n'est pas compté deux fois
+            with self._pending_lock:
+                return self._stored_count(session_id) + sum(item[0] == session_id for item in self._pending)
+
+    def snapshot(self, session_id: str, window: Optional[int] = None) -> tuple[list[dict], int]:
+        """load() et message_count() lus sur le même instantané de la base."""
+        window = window or self.window
+        with self._read_lock:
+            self._reader.execute("BEGIN")
+            try:
+                # L'instantané WAL de la transaction est fixé par sa première lecture, prise avec la copie de la file :
+                # un lot écrit entre les deux (COMMIT sous _pending_lock) n'est ni perdu ni compté deux fois
+                with self._pending_lock:
+                    total = self._stored_count(session_id)
+                    pending = [(role, text) for sid, role, text, _ in self._pending if sid == session_id]
+                total += len(pending)
+                rows = self._reader.execute(
+                    "SELECT role, text FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, window)).fetchall()
+            finally:
+                self._reader.execute("COMMIT")
+        messages = [{"role": role, "text": text} for role, text in reversed(rows)]
+        messages = (messages + [{"role": role, "text": text} for role, text in pending])[-window:]
+        # La fenêtre commence par une question : un message du modèle isolé en tête est ignoré
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        self.counters["loads"] += 1
+        self.counters["resumed"] += bool(messages)
+        return messages, total
+
+    def delete(self, session_id: str) -> bool:
+        """Supprime la conversation (file et base). Bloquant : depuis la boucle d'événements, via asyncio.to_thread."""
+        with self._lock:
+            with self._pending_lock:
+                before = len(self._pending)
+                self._pending = [item for item in self._pending if item[0] != session_id]
+                dropped = before - len(self._pending)
+            self._conn.execute("BEGIN IMMEDIATE")
+            deleted = self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("COMMIT")
+        self.counters["deleted"] += bool(deleted or dropped)
+        return bool(deleted or dropped)
+
+    # --- Compactage ---
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Supprime (ou archive) les sessions inactives depuis plus de retention_seconds ; retourne leur nombre."""
+        cutoff = (time.time() if now is None else now) - self.retention_seconds
+        stale = "SELECT session_id FROM sessions WHERE updated < ?"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.archive_path:
+                    self._conn.execute(
+                        "INSERT INTO archive.messages (session_id, role, text, created)"
+                        f" SELECT session_id, role, text, created FROM messages WHERE session_id IN ({stale}) ORDER BY id",
+                        (cutoff,))
+                    self._conn.execute("INSERT OR REPLACE INTO archive.sessions SELECT * FROM sessions WHERE updated < ?",
+                                       (cutoff,))
+                self._conn.execute(f"DELETE FROM messages WHERE session_id IN ({stale})", (cutoff,))
+                removed = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Rend au système les pages du journal WAL une fois les suppressions reportées dans la base
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.counters["compactions"] += 1
+        self.counters["sessions_compacted"] += removed
+        self.last_compaction = time.time()
+        return removed
+
+    def _compactor(self) -> None:
+        while not self._stopping.wait(self.compact_interval):
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Compactage de l'historique des conversations impossible : {e}")
+
+    # --- Cycle de vie ---
+
+    def start(self) -> None:
+        """Démarre le thread d'écriture et le thread de compactage (idempotent)."""
+        with self._pending_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._writer, name="frey-conversations-writer", daemon=True),
+                threading.Thread(target=self._compactor, name="frey-conversations-compactor", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def close(self) -> None:
+        """Arrête les threads après avoir écrit les messages en attente."""
+        self._stopping.set()
+        with self._pending_lock:
+            self._pending_lock.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._read_lock:
+            sessions, messages = self._reader.execute(
+                "SELECT COUNT(*), COALESCE(SUM(messages), 0) FROM sessions").fetchone()
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "path": self.path,
+            "sessions": sessions,
+            "messages": messages,
+            "pending": pending,
+            "window": self.window,
+            "avg_batch": round(self.counters["written"] / self.counters["batches"], 1) if self.counters["batches"] else 0.0,
+            "last_compaction": self.last_compaction,
+            **self.counters,
+        }
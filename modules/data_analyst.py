@@ -1,95 +1,444 @@
 import pandas as pd
 import io
+import os
+import re
 from google import genai
 from google.genai import types
 import numpy as np
+from typing import Optional
 
-# Fonction principale pour l'analyse des données (Phase 1: Pandas)
-def analyze_data_pandas(data_source, is_file: bool = False) -> str:
-    """Analyse brute des données avec Pandas et retourne les résultats bruts."""
-    
+from modules import llm, metrics
+from modules.cache import ResponseCache
+from modules.dtypes import FrameMemory, is_text, optimize_from_env, read_optimized_from_env
+from modules.prompts import ANALYSIS_TEMPLATE
+from modules.profiler import StreamingProfiler
+from modules.table_profile import PROFILE_MODE, TableProfile, profile_from_env
+
+# --- ⚡ LECTURE RAPIDE DES DONNÉES COLLÉES ---
+# Le séparateur regex historique (r'\s*,\s*|;') impose le parseur Python de pandas, très lent.
+# On détecte le séparateur, on lit avec le parseur C (ou pyarrow via FREY_CSV_ENGINE=pyarrow,
+# dont l'inférence des dates diffère), puis on reproduit le nettoyage des espaces de l'ancien parseur.
+# Écarts voulus avec l'ancien parseur, qui ne connaît ni la tabulation ni les guillemets : un texte tabulé
+# est lu en colonnes et un champ entre guillemets reste entier (voir benchmarks/bench_csv_loader.py).
+LEGACY_SEP = r'\s*,\s*|;'
+_LINE_EDGES = re.compile(r'^[^\S\n]+|[^\S\n]+$', re.MULTILINE)
+_COMMA_SPACES = re.compile(r'[^\S\n]*,[^\S\n]*')
+
+
+def _csv_engine() -> str:
+    if os.environ.get("FREY_CSV_ENGINE", "c") == "pyarrow":
+        try:
+            import pyarrow  # noqa: F401
+            return "pyarrow"
+        except ImportError:
+            pass
+    return "c"
+
+
+def sniff_delimiter(text: str) -> Optional[str]:
+    """
+    Retourne ',', ';' ou '\t' si un seul de ces séparateurs est présent, None si la virgule
+    et le point-virgule sont mélangés (cas réservé au parseur historique).
+    """
+    has_comma, has_semicolon = "," in text, ";" in text
+    if has_comma and has_semicolon:
+        return None
+    if has_semicolon:
+        return ";"
+    if not has_comma and "\t" in text:
+        return "\t"
+    return ","
+
+
+def _strip_edges(values: pd.Series, side: str) -> pd.Series:
+    return values.str.strip() if side == "both" else values.str.lstrip() if side == "left" else values.str.rstrip()
+
+
+def _reparse_column(values: pd.Series, sep: str, quoted: bool = False) -> Optional[pd.Series]:
+    """
+    Relit une colonne texte nettoyée avec le parseur C, pour retrouver le type qu'aurait
+    inféré le parseur historique ("NA " -> NaN, "True " -> booléen...). None si impossible.
+    """
+    values_text = values.fillna("").astype(str)
+    if quoted:  # to_csv remet entre guillemets les valeurs qui contiennent le séparateur ou un saut de ligne
+        text = values_text.to_csv(index=False, header=False, sep=sep, lineterminator="\n")
+    else:
+        text = "\n".join(values_text.to_numpy(dtype=object).tolist()) + "\n"
     try:
-        if is_file:
-            # Pour Streamlit, data_source est un objet UploadedFile.
-            df = pd.read_csv(data_source) 
-        else:
-            # Lecture des données collées (utilisant io.StringIO pour lire la chaîne comme un fichier)
-            # Utilise une regex pour supporter la virgule ou le point-virgule comme séparateur
-            df = pd.read_csv(io.StringIO(data_source), sep=r'\s*,\s*|;', engine='python', skipinitialspace=True)
-            
-    except Exception as e:
-        return f"Échec de la lecture des données. Erreur: {e}. Assurez-vous que les données sont au format CSV ou tabulé et que les séparateurs sont corrects."
+        parsed = pd.read_csv(io.StringIO(text), sep=sep, header=None, names=[0], skip_blank_lines=False, engine="c")
+    except Exception:
+        return None
+    if parsed.shape != (len(values), 1):
+        return None
+    column = parsed[0]
+    column.index = values.index
+    return column
 
-    if df.empty:
-        return "Le DataFrame est vide. Veuillez fournir des données valides."
+
+def _clean_edge_whitespace(df: pd.DataFrame, sep: str, quoted: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Retire les espaces de bord comme le parseur historique : de tous les champs pour la virgule,
+    seulement en début/fin de ligne pour le point-virgule. None si une colonne ne se relit pas.
+    `quoted` : le texte d'origine contient des champs entre guillemets.
+    """
+    last = len(df.columns) - 1
+    if sep == ",":
+        sides = {i: "both" for i in range(len(df.columns))}
+    else:
+        sides = {0: "left", last: "right"} if last > 0 else {0: "both"}
+
+    renamed = {}
+    for i, side in sides.items():
+        name = df.columns[i]
+        if isinstance(name, str):
+            clean = _strip_edges(pd.Series([name]), side)[0]
+            if clean != name:
+                renamed[name] = clean
+        col = df[name]
+        if not (col.dtype == object or pd.api.types.is_string_dtype(col.dtype)):
+            continue  # Le parseur C tolère déjà les espaces autour des nombres
+        present = col.notna()
+        stripped = _strip_edges(col[present].astype(str), side)
+        if (stripped.str.len() == col[present].astype(str).str.len()).all():
+            continue
+        cleaned = col.copy()
+        cleaned[present] = stripped
+        reparsed = _reparse_column(cleaned, sep, quoted)
+        if reparsed is None:
+            return None
+        df[name] = reparsed
+    return df.rename(columns=renamed) if renamed else df
+
+
+def _read_pasted_fast(text: str, sep: str) -> pd.DataFrame:
+    if sep == "\t":
+        return pd.read_csv(io.StringIO(text), sep=sep, engine=_csv_engine())
+    if '"' in text:
+        # Champs entre guillemets : on laisse le parseur C gérer le quoting plutôt que de réécrire le texte,
+        # puis on retire les espaces de bord comme ci-dessous (texte jamais réécrit : un champ cité reste entier)
+        df = pd.read_csv(io.StringIO(text), sep=sep, engine="c", skipinitialspace=True)
+        cleaned = _clean_edge_whitespace(df.copy(deep=False), sep, quoted=True)
+        return df if cleaned is None else cleaned
+
+    # Le parseur historique ignore les espaces en bord de ligne et autour des virgules
+    # (pas autour des points-virgules). On lit directement avec le parseur C, puis on ne
+    # nettoie que les colonnes texte concernées ; en dernier recours, on réécrit le texte.
+    engine = _csv_engine()
+    df = pd.read_csv(io.StringIO(text), sep=sep, engine=engine, skipinitialspace=(sep == "," and engine == "c"))
+    cleaned = _clean_edge_whitespace(df, sep)
+    if cleaned is not None:
+        return cleaned
+
+    text = _LINE_EDGES.sub("", text)
+    if sep == ",":
+        text = _COMMA_SPACES.sub(",", text)
+    return pd.read_csv(io.StringIO(text), sep=sep, engine=_csv_engine())
+
+
+def read_pasted_data(text: str) -> pd.DataFrame:
+    """Lit des données CSV/TSV collées ; bascule sur le parseur historique si la voie rapide échoue."""
+    sep = sniff_delimiter(text)
+    if sep is not None:
+        try:
+            return _read_pasted_fast(text, sep)
+        except Exception:
+            pass  # Entrée mal formée pour le parseur C : on retente avec le parseur historique
+    return pd.read_csv(io.StringIO(text), sep=LEGACY_SEP, engine='python', skipinitialspace=True)
+
+
+def load_dataframe(data_source, is_file: bool = False, read_options: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Charge la source (fichier ou texte collé) dans un DataFrame ; lève une exception en cas d'échec.
+    `read_options` est transmis à pd.read_csv pour les fichiers (sep, compression...).
+    """
+    if is_file:
+        # Pour Streamlit, data_source est un objet UploadedFile (ou un fichier binaire / mmap pour l'API).
+        return pd.read_csv(data_source, **(read_options or {}))
+    return read_pasted_data(data_source)
+
+
+def iter_dataframe_chunks(data_source, is_file: bool = False, chunksize: int = 100_000,
+                          read_options: Optional[dict] = None):
+    """Lit la source par blocs de `chunksize` lignes (mêmes règles de lecture que load_dataframe)."""
+    if is_file:
+        with pd.read_csv(data_source, chunksize=chunksize, **(read_options or {})) as reader:
+            yield from reader
+        return
+
+    sep = sniff_delimiter(data_source)
+    if sep is None:
+        with pd.read_csv(io.StringIO(data_source), sep=LEGACY_SEP, engine='python',
+                         skipinitialspace=True, chunksize=chunksize) as reader:
+            yield from reader
+        return
+    with pd.read_csv(io.StringIO(data_source), sep=sep, engine="c",
+                     skipinitialspace=(sep == ","), chunksize=chunksize) as reader:
+        for chunk in reader:
+            cleaned = _clean_edge_whitespace(chunk, sep) if sep != "\t" else chunk
+            yield chunk if cleaned is None else cleaned
+
+
+# --- 📏 PROFILAGE PAR BLOCS (GROS FICHIERS) ---
+# Au-delà de FREY_STREAMING_MIN_BYTES (200 Mo par défaut), un fichier est profilé par blocs
+# de FREY_STREAMING_CHUNKSIZE lignes, en mémoire constante (voir modules/profiler.py).
+STREAMING_MIN_BYTES = int(os.environ.get("FREY_STREAMING_MIN_BYTES", 200 * 1024 * 1024))
+STREAMING_CHUNKSIZE = int(os.environ.get("FREY_STREAMING_CHUNKSIZE", 100_000))
+
+
+def _source_size(data_source, is_file: bool) -> Optional[int]:
+    if not is_file:
+        return len(data_source)
+    if isinstance(data_source, (str, os.PathLike)):
+        return os.path.getsize(data_source)
+    size = getattr(data_source, "size", None)  # UploadedFile Streamlit (attribut) ou mmap (méthode)
+    return size() if callable(size) else size
+
+
+def _format_insights(n_rows: int, columns: list, dtypes: pd.Series, describe: Optional[pd.DataFrame],
+                     top: Optional[tuple], missing: pd.Series, profile: Optional[TableProfile] = None) -> str:
+    """Mise en forme commune du rapport brut (analyse en mémoire ou par blocs)."""
 
     # --- Collecte des insights bruts ---
     
     insights = []
     
     # 1. Dimensions et Types
-    insights.append(f"Dimensions: {len(df)} lignes et {len(df.columns)} colonnes.")
-    insights.append(f"Colonnes: {', '.join(df.columns)}.")
-    insights.append(f"Types de données:\n{df.dtypes.to_string()}")
+    insights.append(f"Dimensions: {n_rows} lignes et {len(columns)} colonnes.")
+    insights.append(f"Colonnes: {', '.join(columns)}.")
+    insights.append(f"Types de données:\n{dtypes.to_string()}")
     
     # 2. Statistiques descriptives
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    if not numeric_cols.empty:
-        insights.append(f"\nStatistiques descriptives des colonnes numériques:\n{df[numeric_cols].describe().to_string()}")
+    if describe is not None:
+        insights.append(f"\nStatistiques descriptives des colonnes numériques:\n{describe.to_string()}")
 
-    # 3. Tendances clés (Exemple: Top 5 des valeurs pour la première colonne catégorielle)
-    categorical_cols = df.select_dtypes(include=['object']).columns
-    if not categorical_cols.empty:
-        top_col = categorical_cols[0]
-        top_values = df[top_col].value_counts().nlargest(5).to_string()
-        insights.append(f"\nTop 5 des valeurs pour la colonne '{top_col}':\n{top_values}")
+    # 3. Tendances clés : profil complet (top-k de chaque colonne texte, corrélations, valeurs aberrantes,
+    # cardinalités) ou, à défaut, Top 5 des valeurs pour la première colonne catégorielle
+    if profile is not None:
+        insights.extend(profile.sections())
+    elif top is not None:
+        top_col, top_values = top
+        insights.append(f"\nTop 5 des valeurs pour la colonne '{top_col}':\n{top_values.to_string()}")
 
     # 4. Anomalies (Exemple: Valeurs manquantes)
-    missing_data = df.isnull().sum()
-    if missing_data.any():
-        missing_report = missing_data[missing_data > 0].to_string()
+    if missing.any():
+        missing_report = missing[missing > 0].to_string()
         insights.append(f"\nAnomalies: Valeurs manquantes détectées :\n{missing_report}")
         
     return "\n---\n".join(insights)
 
-# Fonction pour la rédaction de l'analyse par Gemini (Phase 2: LLM)
-def format_analysis_with_gemini(client: genai.Client, raw_analysis: str, system_prompt: str) -> str:
+
+def analyze_data_streaming(data_source, is_file: bool = False, chunksize: int = STREAMING_CHUNKSIZE,
+                           read_options: Optional[dict] = None) -> str:
     """
-    Rédige les résultats bruts de Pandas dans le style FREY via l'API Gemini.
+    Même rapport que analyze_data_pandas, calculé en un seul passage par blocs.
+    Quantiles et top 5 sont exacts sur les petits volumes et approchés au-delà (mention dans le rapport ;
+    le top 5 approché n'annonce que des nombres garantis).
     """
-    
-    # ✅ CORRIGÉ: Utilisation du client existant pour générer du contenu (méthode moderne)
-    model_name = "gemini-2.5-flash"
+    profiler = StreamingProfiler()
+    try:
+        # Lecture et profilage sont entrelacés bloc par bloc : une seule étape mesurée
+        with metrics.stage("stream_profile"):
+            for chunk in iter_dataframe_chunks(data_source, is_file=is_file, chunksize=chunksize, read_options=read_options):
+                profiler.update(chunk)
+    except Exception as e:
+        return f"Échec de la lecture des données. Erreur: {e}. Assurez-vous que les données sont au format CSV ou tabulé et que les séparateurs sont corrects."
 
-    # Le prompt d'analyse est intégré dans les 'contents'
-    full_analysis_prompt = f"""
-    En tant que FREY, votre mission est de transformer l'analyse de données brutes suivante en un rapport lisible, pédagogique, et inspirant.
-    
-    Votre réponse doit :
-    1. Décrire les tendances générales (dimensions, statistiques principales).
-    2. Identifier un insight clé (anomalie, top valeur, corrélation implicite).
-    3. Respecter STRICTEMENT la structure finale : Réponse claire + Résumé + Suggestion (selon les règles FREY).
+    if not profiler.rows:
+        return "Le DataFrame est vide. Veuillez fournir des données valides."
+
+    text_cols = profiler.text_columns()
+    top_values = profiler.top_values(text_cols[0]).nlargest(5) if text_cols else None
+    with metrics.stage("report_format"):
+        report = _format_insights(
+            n_rows=profiler.rows,
+            columns=profiler.columns,
+            dtypes=profiler.dtypes_series(),
+            describe=profiler.describe(),
+            top=(text_cols[0], top_values) if top_values is not None and len(top_values) else None,
+            missing=profiler.missing_series(),
+        )
+    if not profiler.is_exact():
+        report += ("\n---\nNote: profil calculé par blocs ; quantiles approchés ; top 5 : nombres minimaux garantis,"
+                   " sans les valeurs qui ne se distinguent pas des autres.")
+        if top_values is not None and not len(top_values):
+            report += f" Aucune valeur de la colonne '{text_cols[0]}' ne se distingue : top 5 omis."
+    return report
+
+
+# --- 🗜️ TYPES ÉCONOMES EN MÉMOIRE ---
+# Entiers réduits, décimaux exacts en float32 et texte peu varié en `category` (lu directement
+# ainsi pour un fichier, voir modules/dtypes.py) : le rapport est inchangé. FREY_OPTIMIZE_DTYPES=0 pour désactiver.
+OPTIMIZE_DTYPES = os.environ.get("FREY_OPTIMIZE_DTYPES", "1") != "0"
+
+# --- 🔬 PROFIL COMPLET ---
+# Top-k de chaque colonne texte, corrélations, valeurs aberrantes et cardinalités (voir modules/table_profile.py),
+# exact ou estimé sur un échantillon selon FREY_PROFILE_MODE et FREY_PROFILE_TIME_BUDGET.
+# FREY_PROFILE_MODE=off : seul le Top 5 de la première colonne texte figure au rapport.
+FULL_PROFILE = PROFILE_MODE != "off"
+
+
+def _analyze(data_source, is_file: bool, chunksize: Optional[int],
+             read_options: Optional[dict]) -> tuple[str, Optional[FrameMemory]]:
+    """Rapport brut et, pour une analyse en mémoire optimisée, la mémoire du DataFrame avant/après."""
+
+    if chunksize is None:
+        size = _source_size(data_source, is_file)
+        if is_file and size is not None and size >= STREAMING_MIN_BYTES:
+            chunksize = STREAMING_CHUNKSIZE
+    if chunksize:
+        return analyze_data_streaming(data_source, is_file=is_file, chunksize=chunksize, read_options=read_options), None
     
-    Voici les résultats bruts de l'analyse Pandas :
-    ---
-    {raw_analysis}
-    ---
+    # Fichier : colonnes texte répétitives lues directement en `category` (pic de mémoire réduit)
+    read_optimized = OPTIMIZE_DTYPES and is_file
+    try:
+        with metrics.stage("csv_parse"):
+            if read_optimized:
+                df, memory = read_optimized_from_env(data_source, read_options)
+            else:
+                df = load_dataframe(data_source, is_file=is_file, read_options=read_options)
+            
+    except Exception as e:
+        return f"Échec de la lecture des données. Erreur: {e}. Assurez-vous que les données sont au format CSV ou tabulé et que les séparateurs sont corrects.", None
+
+    if df.empty:
+        return "Le DataFrame est vide. Veuillez fournir des données valides.", None
+
+    # Le rapport décrit les types lus, pas ceux de la représentation optimisée
+    if read_optimized:
+        dtypes = memory.original_dtypes
+    else:
+        dtypes, memory = df.dtypes, None
+    if OPTIMIZE_DTYPES and not read_optimized:
+        with metrics.stage("dtype_optimize"):
+            df, memory = optimize_from_env(df)
+
+    with metrics.stage("profile"):
+        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        categorical_cols = [name for name, dtype in dtypes.items() if is_text(dtype)]
+        top = None
+        if categorical_cols and not FULL_PROFILE:
+            top_col = categorical_cols[0]
+            top = (top_col, df[top_col].value_counts().nlargest(5))
+        describe = None
+        if not numeric_cols.empty:
+            # Décimaux passés en float32 : statistiques calculées en float64, comme sur la colonne lue
+            upcast = {name: dtypes[name] for name in numeric_cols if df[name].dtype != dtypes[name] and df[name].dtype.kind == "f"}
+            describe = df[numeric_cols].astype(upcast).describe()
+        missing = df.isnull().sum()
+
+    profile = None
+    if FULL_PROFILE and df.columns.is_unique:
+        with metrics.stage("table_profile"):
+            profile = profile_from_env(df, list(numeric_cols), categorical_cols)
+
+    with metrics.stage("report_format"):
+        report = _format_insights(
+            n_rows=len(df),
+            columns=list(df.columns),
+            dtypes=dtypes,
+            describe=describe,
+            top=top,
+            missing=missing,
+            profile=profile,
+        )
+    return report, memory
+
+
+# Fonction principale pour l'analyse des données (Phase 1: Pandas)
+def analyze_data_pandas(data_source, is_file: bool = False, chunksize: Optional[int] = None,
+                        read_options: Optional[dict] = None) -> str:
     """
-    
-    config = types.GenerateContentConfig(
+    Analyse brute des données avec Pandas et retourne les résultats bruts.
+    Avec `chunksize` (ou automatiquement pour les fichiers volumineux), l'analyse se fait par blocs.
+    """
+    report, memory = _analyze(data_source, is_file, chunksize, read_options)
+    if memory is not None:
+        metrics.record_frame_memory(memory.before_bytes, memory.after_bytes)
+    return report
+
+
+def analyze_data_timed(data_source, is_file: bool = False, chunksize: Optional[int] = None,
+                       read_options: Optional[dict] = None) -> tuple[str, dict, Optional[tuple[int, int]]]:
+    """
+    analyze_data_pandas pour le pool de processus : retourne (rapport, durées par étape, mémoire avant/après).
+    Durées et mémoire mesurées dans le processus de travail sont enregistrées par l'appelant
+    (metrics.merge_stages, metrics.record_frame_memory).
+    """
+    with metrics.collect_stages(observe=False) as stages:
+        report, memory = _analyze(data_source, is_file, chunksize, read_options)
+    return report, stages, (memory.before_bytes, memory.after_bytes) if memory is not None else None
+
+MODEL_NAME = "gemini-2.5-flash"
+
+
+def _build_analysis_prompt(raw_analysis: str) -> str:
+    # Le prompt d'analyse est intégré dans les 'contents' (gabarit précompilé, sans indentation superflue)
+    return ANALYSIS_TEMPLATE.render(raw_analysis=raw_analysis)
+
+
+def _build_analysis_config(system_prompt: str) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
         temperature=0.3, # Faible créativité, l'accent est mis sur la fidélité aux données
         # Le prompt système est appliqué via system_instruction ici
         system_instruction=system_prompt 
     )
 
+
+# Fonction pour la rédaction de l'analyse par Gemini (Phase 2: LLM)
+def format_analysis_with_gemini(client: genai.Client, raw_analysis: str, system_prompt: str,
+                                cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                                model: str = MODEL_NAME) -> str:
+    """
+    Rédige les résultats bruts de Pandas dans le style FREY via l'API Gemini.
+    Avec un cache, un même rapport brut (même jeu de données) est servi sans appel à l'API.
+    """
+    
+    with metrics.stage("prompt_build"):
+        full_analysis_prompt = _build_analysis_prompt(raw_analysis)
+        config = _build_analysis_config(system_prompt)
+
     try:
         # Appel corrigé via client.models
-        response = client.models.generate_content(
-            model=model_name,
+        result = llm.generate(
+            client,
+            model=model,
             contents=[full_analysis_prompt], # On passe le prompt complet ici
             config=config,
+            cache=cache,
+            bypass_cache=bypass_cache,
+            endpoint="analyze",
         )
-        return response.text.strip()
+        return result.text.strip()
     
     except Exception as e:
         return f"🚨 ERREUR API GEMINI lors de la rédaction de l'analyse : {e}."
+
+
+async def format_analysis_with_gemini_async(client: genai.Client, raw_analysis: str, system_prompt: str,
+                                            cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                                            model: str = MODEL_NAME, raise_errors: bool = False) -> str:
+    """
+    Variante asynchrone de format_analysis_with_gemini (client.aio), pour l'API FastAPI.
+    Avec raise_errors=True, les erreurs de l'API sont propagées au lieu d'être renvoyées en texte.
+    """
+
+    with metrics.stage("prompt_build"):
+        full_analysis_prompt = _build_analysis_prompt(raw_analysis)
+        config = _build_analysis_config(system_prompt)
+
+    try:
+        result = await llm.generate_async(
+            client,
+            model=model,
+            contents=[full_analysis_prompt],
+            config=config,
+            cache=cache,
+            bypass_cache=bypass_cache,
+            endpoint="analyze",
+        )
+        return result.text.strip()
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        return f"🚨 ERREUR API GEMINI lors de la rédaction de l'analyse : {e}."
@@ -0,0 +1,212 @@
+# modules/dtypes.py
+"""
+Types économes en mémoire pour les DataFrames analysés.
+
+read_csv lit tous les entiers en int64, tous les décimaux en float64 et, avec pandas 2, le texte
+en objets Python. Après lecture, optimize_frame :
+- réduit les entiers au plus petit type qui contient leur plage (int8, int16, int32) ;
+- passe en float32 les colonnes décimales dont toutes les valeurs y sont représentables
+  exactement (ex. entiers avec valeurs manquantes) ;
+- convertit en `category` les colonnes texte à faible cardinalité, estimée sur un échantillon ;
+- avec arrow_strings, range les autres colonnes texte objet en chaînes pyarrow (pandas 2 ;
+  pandas 3 les lit déjà ainsi).
+
+Pour un fichier, read_csv_optimized lit d'abord un échantillon des premières lignes et passe
+`dtype="category"` à read_csv pour les colonnes texte à faible cardinalité : elles ne sont jamais
+matérialisées en objets Python, ce qui réduit le pic de mémoire de la lecture, pas seulement le
+DataFrame final. Les entiers et décimaux, dont la plage ne se déduit pas d'un échantillon, restent
+convertis après lecture.
+
+Les conversions sont sans perte : les statistiques et le rapport calculés ensuite sont identiques
+(voir analyze_data_pandas, qui affiche les types d'origine).
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class FrameMemory:
+    """Mémoire (octets, index compris) avant et après optimisation, et types d'origine."""
+    before_bytes: int
+    after_bytes: int
+    original_dtypes: pd.Series
+    conversions: dict = field(default_factory=dict)  # colonne -> nouveau type
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.after_bytes / self.before_bytes if self.before_bytes else 0.0
+
+
+def is_text(dtype) -> bool:
+    return dtype == object or pd.api.types.is_string_dtype(dtype)
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _sample(df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    return df if len(df) <= rows else df.sample(n=rows, random_state=0)
+
+
+def _integer_target(column: pd.Series):
+    if column.empty:
+        return None
+    low, high = column.min(), column.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return None
+
+
+def _float32_exact(values: np.ndarray) -> bool:
+    return bool(np.array_equal(values, values.astype(np.float32).astype(values.dtype), equal_nan=True))
+
+
+def _arrow_strings_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def infer_schema(df: pd.DataFrame, sample_rows: int = 10_000, category_ratio: float = 0.5,
+                 arrow_strings: bool = False) -> dict:
+    """
+    Type cible de chaque colonne à convertir. Les plages d'entiers et la représentabilité en float32
+    sont vérifiées sur la colonne entière (une conversion doit être sans perte) ; la cardinalité des
+    colonnes texte est estimée sur `sample_rows` lignes tirées au hasard.
+    """
+    sample = _sample(df, sample_rows)
+    arrow_strings = arrow_strings and _arrow_strings_available()
+    schema = {}
+    for name in df.columns:
+        column = df[name]
+        dtype = column.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            continue
+        if dtype.kind == "i" and dtype.itemsize > 1:
+            target = _integer_target(column)
+            if target is not None and target.itemsize < dtype.itemsize:
+                schema[name] = target
+        elif dtype.kind == "f" and dtype.itemsize > 4:
+            # Rejet rapide sur l'échantillon avant de vérifier toute la colonne
+            if _float32_exact(sample[name].to_numpy()) and _float32_exact(column.to_numpy()):
+                schema[name] = np.dtype(np.float32)
+        elif is_text(dtype):
+            present = sample[name].dropna()
+            if len(present) and present.nunique() / len(present) <= category_ratio:
+                schema[name] = "category"
+            elif arrow_strings and dtype == object and present.map(type).eq(str).all():
+                schema[name] = "string[pyarrow]"
+    return schema
+
+
+def _to_category(column: pd.Series) -> pd.Series:
+    # Catégories dans l'ordre d'apparition : value_counts départage les ex æquo comme sur la colonne texte
+    categories = pd.unique(column.dropna())
+    return pd.Series(pd.Categorical(column, categories=categories), index=column.index, name=column.name)
+
+
+def optimize_frame(df: pd.DataFrame, sample_rows: int = 10_000, category_ratio: float = 0.5,
+                   arrow_strings: bool = False) -> tuple[pd.DataFrame, FrameMemory]:
+    """
+    Retourne (DataFrame converti, mémoire avant/après). Une colonne qui ne se convertit pas garde son type ;
+    le DataFrame d'origine est rendu tel quel si la conversion ne réduit pas sa taille.
+    """
+    original_dtypes = df.dtypes
+    before = _frame_bytes(df)
+    if not df.columns.is_unique:  # Colonnes homonymes : df[nom] ne désigne pas une seule colonne
+        return df, FrameMemory(before, before, original_dtypes)
+    schema = infer_schema(df, sample_rows, category_ratio, arrow_strings)
+    converted = {}
+    for name, target in schema.items():
+        try:
+            converted[name] = _to_category(df[name]) if target == "category" else df[name].astype(target)
+        except (TypeError, ValueError):
+            continue
+    original = df
+    if converted:
+        df = df.copy(deep=False)
+        for name, column in converted.items():
+            df[name] = column
+    after = _frame_bytes(df) if converted else before
+    if after >= before:  # Petits tableaux : le surcoût des catégories dépasse le gain
+        return original, FrameMemory(before, before, original_dtypes)
+    conversions = {name: str(df[name].dtype) for name in converted}
+    return df, FrameMemory(before, after, original_dtypes, conversions)
+
+
+def read_csv_optimized(source, read_options: Optional[dict] = None, sample_rows: int = 10_000,
+                       category_ratio: float = 0.5, arrow_strings: bool = False) -> tuple[pd.DataFrame, FrameMemory]:
+    """
+    pd.read_csv(source, **read_options) suivi d'optimize_frame, les colonnes texte à faible cardinalité
+    (estimée sur les `sample_rows` premières lignes) étant lues directement en `category`.
+    Types d'origine : ceux de la lecture simple ; mémoire « avant » des colonnes lues en `category` :
+    extrapolée de l'échantillon. Fichier plus court que l'échantillon : l'échantillon est le DataFrame.
+    Source non repositionnable (ou `dtype`/`chunksize` déjà fournis) : lecture simple puis optimize_frame.
+    """
+    read_options = read_options or {}
+    seekable = isinstance(source, (str, os.PathLike)) or (hasattr(source, "seek") and hasattr(source, "tell"))
+    if not seekable or "dtype" in read_options or "chunksize" in read_options:
+        return optimize_frame(pd.read_csv(source, **read_options), sample_rows, category_ratio, arrow_strings)
+
+    start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    sample = pd.read_csv(source, **{**read_options, "nrows": sample_rows})
+    if len(sample) < sample_rows:  # Fichier entièrement lu
+        return optimize_frame(sample, sample_rows, category_ratio, arrow_strings)
+    if start is not None:
+        source.seek(start)
+    schema = {}
+    if sample.columns.is_unique:
+        for name in sample.columns:
+            present = sample[name].dropna()
+            if is_text(sample[name].dtype) and len(present) and present.nunique() / len(present) <= category_ratio:
+                schema[name] = "category"
+    if not schema:
+        return optimize_frame(pd.read_csv(source, **read_options), sample_rows, category_ratio, arrow_strings)
+
+    df = pd.read_csv(source, dtype=schema, **read_options)
+    categorical = [name for name in schema if isinstance(df[name].dtype, pd.CategoricalDtype)]
+    object_bytes = 0
+    for name in categorical:
+        # Catégories dans l'ordre d'apparition, comme _to_category : value_counts départage les ex æquo à l'identique
+        column = df[name]
+        df[name] = column.cat.reorder_categories(pd.unique(column.dropna()).astype(object))
+        row_bytes = sample[name].memory_usage(deep=True, index=False) / len(sample)
+        object_bytes += int(row_bytes * len(df)) - int(df[name].memory_usage(deep=True, index=False))
+    original_dtypes = df.dtypes.copy()
+    for name in categorical:
+        original_dtypes[name] = sample[name].dtype
+
+    df, memory = optimize_frame(df, sample_rows, category_ratio, arrow_strings)
+    conversions = {**{name: "category" for name in categorical}, **memory.conversions}
+    return df, FrameMemory(memory.before_bytes + object_bytes, memory.after_bytes, original_dtypes, conversions)
+
+
+def optimize_from_env(df: pd.DataFrame) -> tuple[pd.DataFrame, FrameMemory]:
+    """FREY_DTYPE_SAMPLE_ROWS, FREY_CATEGORY_RATIO (0-1), FREY_ARROW_STRINGS=1."""
+    return optimize_frame(
+        df,
+        sample_rows=int(os.environ.get("FREY_DTYPE_SAMPLE_ROWS", 10_000)),
+        category_ratio=float(os.environ.get("FREY_CATEGORY_RATIO", 0.5)),
+        arrow_strings=os.environ.get("FREY_ARROW_STRINGS", "0") == "1",
+    )
+
+
+def read_optimized_from_env(source, read_options: Optional[dict] = None) -> tuple[pd.DataFrame, FrameMemory]:
+    """read_csv_optimized avec la configuration d'optimize_from_env."""
+    return read_csv_optimized(
+        source,
+        read_options,
+        sample_rows=int(os.environ.get("FREY_DTYPE_SAMPLE_ROWS", 10_000)),
+        category_ratio=float(os.environ.get("FREY_CATEGORY_RATIO", 0.5)),
+        arrow_strings=os.environ.get("FREY_ARROW_STRINGS", "0") == "1",
+    )
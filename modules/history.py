@@ -0,0 +1,183 @@
+# modules/history.py
+
+import os
+from typing import Iterator, Optional
+
+from google import genai
+from google.genai import types
+
+from modules.prompts import CHAT_SUMMARY_SUFFIX, CHAT_SUMMARY_TEMPLATE, token_usage
+from modules.tokens import TokenCounter, estimate_tokens
+
+
+def _text_of(message: types.Content) -> str:
+    return "".join(part.text or "" for part in message.parts or [])
+
+
+class BudgetedChat:
+    """
+    Session de chat à budget de tokens, interchangeable avec une session client.chats
+    (send_message, send_message_stream, get_history).
+
+    Seuls les derniers échanges sont renvoyés tels quels au modèle ; quand la conversation dépasse
+    `token_budget`, les échanges les plus anciens (au-delà des `keep_turns` derniers) sont condensés
+    dans un résumé glissant, transmis avec le prompt système. get_history() renvoie toujours
+    la conversation complète, pour l'affichage.
+
+    Les tokens de chaque message sont déduits de usage_metadata, sans appel de comptage : la réponse
+    (candidates_token_count) et la question (écart entre prompt_token_count et l'entrée du tour précédent
+    augmentée de sa réponse). À défaut (premier tour, après un compactage, réponse sans usage_metadata) :
+    `counter` s'il est fourni, sinon l'estimation locale.
+    """
+
+    def __init__(self, client: genai.Client, model: str, system_prompt: str, token_budget: int = 8000,
+                 keep_turns: int = 4, summary_model: Optional[str] = None, counter: Optional[TokenCounter] = None):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_model = summary_model or model
+        self.counter = counter
+
+        self.transcript: list[types.Content] = []   # Conversation complète (affichage)
+        self.recent: list[tuple[types.Content, int]] = []  # Messages envoyés tels quels, avec leur nombre de tokens
+        self.summary = ""
+        self.summary_tokens = 0
+        self.transcript_tokens = 0
+        self._next_base: Optional[int] = None  # Entrée attendue au prochain tour, hors nouvelle question
+
+        self.turns = 0
+        self.compactions = 0
+        self.last_turn: dict = {}
+        self.total_saved_tokens = 0
+
+    @classmethod
+    def from_env(cls, client: genai.Client, system_prompt: str, model: str = "gemini-2.5-flash") -> "BudgetedChat":
+        return cls(
+            client,
+            model=model,
+            system_prompt=system_prompt,
+            token_budget=int(os.environ.get("FREY_CHAT_TOKEN_BUDGET", 8000)),
+            keep_turns=int(os.environ.get("FREY_CHAT_KEEP_TURNS", 4)),
+            summary_model=os.environ.get("FREY_CHAT_SUMMARY_MODEL", "gemini-2.5-flash-lite"),
+        )
+
+    # --- Interface d'une session de chat ---
+
+    def get_history(self, curated: bool = False) -> list[types.Content]:
+        return list(self.transcript)
+
+    def send_message(self, message: str) -> types.GenerateContentResponse:
+        contents = self._contents(message)
+        response = self.client.models.generate_content(model=self.model, contents=contents, config=self._config())
+        self._commit(message, response.text or "", response.usage_metadata)
+        return response
+
+    def send_message_stream(self, message: str) -> Iterator[types.GenerateContentResponse]:
+        contents = self._contents(message)
+        parts, usage = [], None
+        for chunk in self.client.models.generate_content_stream(model=self.model, contents=contents, config=self._config()):
+            parts.append(chunk.text or "")
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        # L'échange n'est mémorisé qu'une fois la réponse complète (comme client.chats)
+        self._commit(message, "".join(parts), usage)
+
+    # --- Construction de la requête ---
+
+    def _config(self) -> types.GenerateContentConfig:
+        system_instruction = self.system_prompt
+        if self.summary:
+            system_instruction += CHAT_SUMMARY_SUFFIX.render(summary=self.summary)
+        return types.GenerateContentConfig(system_instruction=system_instruction)
+
+    def _contents(self, message: str) -> list[types.Content]:
+        return [content for content, _ in self.recent] + [types.Content(role="user", parts=[types.Part(text=message)])]
+
+    # --- Mise à jour de l'historique et compactage ---
+
+    def _count(self, text: str) -> int:
+        return self.counter.count(text) if self.counter is not None else estimate_tokens(text)
+
+    def _commit(self, message: str, reply: str, usage=None) -> None:
+        token_usage.record("chat", usage)
+        prompt_tokens = usage.prompt_token_count if usage and usage.prompt_token_count else None
+        reply_tokens = (usage.candidates_token_count if usage and usage.candidates_token_count else None) \
+            or self._count(reply)
+        # Question : ce que l'entrée de ce tour ajoute à celle du tour précédent et à sa réponse
+        delta = prompt_tokens - self._next_base if prompt_tokens and self._next_base is not None else 0
+        user_tokens = delta if delta > 0 else self._count(message)
+        recent_tokens = sum(tokens for _, tokens in self.recent)
+
+        # Taille de l'entrée de ce tour, comparée à l'envoi de toute la conversation
+        saved = max(0, self.transcript_tokens - recent_tokens - self.summary_tokens)
+        sent = prompt_tokens or self._count(self.system_prompt) + self.summary_tokens + recent_tokens + user_tokens
+        self.last_turn = {"input_tokens": sent, "full_history_tokens": sent + saved, "saved_tokens": saved}
+        self.total_saved_tokens += saved
+
+        user = types.Content(role="user", parts=[types.Part(text=message)])
+        model = types.Content(role="model", parts=[types.Part(text=reply)])
+        self.transcript += [user, model]
+        self.recent += [(user, user_tokens), (model, reply_tokens)]
+        self.transcript_tokens += user_tokens + reply_tokens
+        self.turns += 1
+        self._next_base = prompt_tokens + reply_tokens if prompt_tokens else None
+        self._compact_if_needed()
+
+    def _context_tokens(self) -> int:
+        return self.summary_tokens + sum(tokens for _, tokens in self.recent)
+
+    def _compact_if_needed(self) -> None:
+        if self._context_tokens() <= self.token_budget:
+            return
+        # On descend à la moitié du budget pour ne pas résumer à chaque tour
+        target = self.token_budget // 2
+        count = 0
+        while len(self.recent) - count > 2 * self.keep_turns and \
+                self._context_tokens() - sum(t for _, t in self.recent[:count]) > target:
+            count += 2
+        if count == 0:
+            return
+        try:
+            summary, summary_tokens = self._summarize(self.recent[:count])
+        except Exception as e:
+            # Les messages restent tels quels ; nouvel essai au prochain tour
+            print(f"Compactage de l'historique impossible : {e}")
+            return
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        del self.recent[:count]
+        self.compactions += 1
+        self._next_base = None  # L'entrée du prochain tour ne prolonge plus celle de ce tour
+
+    def _summarize(self, messages: list[tuple[types.Content, int]]) -> tuple[str, int]:
+        """Résumé glissant et son nombre de tokens (tokens générés, à défaut estimés)."""
+        turns = "\n".join(
+            f"{'Utilisateur' if content.role == 'user' else 'FREY'} : {_text_of(content)}" for content, _ in messages
+        )
+        prompt = CHAT_SUMMARY_TEMPLATE.render(
+            max_words=max(50, self.token_budget // 8), summary=self.summary or "(aucun)", turns=turns
+        )
+        response = self.client.models.generate_content(
+            model=self.summary_model,
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=0.2)
+        )
+        if not response.text:
+            raise ValueError("résumé vide")
+        summary = response.text.strip()
+        usage = response.usage_metadata
+        return summary, (usage.candidates_token_count if usage and usage.candidates_token_count else None) \
+            or self._count(summary)
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "compactions": self.compactions,
+            "summary_tokens": self.summary_tokens,
+            "context_tokens": self._context_tokens(),
+            "token_budget": self.token_budget,
+            "last_turn": self.last_turn,
+            "total_saved_tokens": self.total_saved_tokens,
+        }
@@ -0,0 +1,233 @@
+# modules/jobs.py
+"""
+Travaux d'analyse asynchrones : la requête de soumission rend immédiatement un identifiant,
+le travail (profilage pandas puis rédaction par Gemini) s'exécute en tâche de fond, et le client
+suit l'avancement par interrogation ou par abonnement (SSE).
+
+- Déduplication : une soumission dont l'empreinte du contenu correspond à un travail en cours
+  ou terminé (et non expiré) renvoie ce travail au lieu d'en lancer un nouveau.
+- Les travaux terminés sont conservés `ttl_seconds`, puis oubliés ; au plus `max_jobs` en mémoire.
+- Au plus `max_running` travaux s'exécutent simultanément ; au-delà de `max_pending` travaux
+  non terminés, les soumissions sont refusées (JobStoreFull).
+"""
+
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from modules.concurrency import env_int
+
+TERMINAL = ("done", "error", "cancelled")
+
+
+class JobStoreFull(Exception):
+    """Trop de travaux en attente : la soumission est refusée."""
+
+
+def content_key(*parts: Any) -> str:
+    """Empreinte SHA-256 du contenu soumis et des options qui changent le résultat."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class Job:
+    def __init__(self, job_id: str, key: Optional[str], steps: tuple):
+        self.id = job_id
+        self.key = key
+        self.steps = steps
+        self.status = "queued"   # queued -> running -> done | error | cancelled
+        self.stage: Optional[str] = None
+        self.result: Any = None
+        self.detail: Optional[str] = None
+        self.created = time.time()
+        self.finished_at: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if self.stage in self.steps:
+            return round(self.steps.index(self.stage) / len(self.steps), 2)
+        return 0.0
+
+    def _notify(self) -> None:
+        # Réveille les abonnés en attente ; les suivants attendront le prochain changement
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def set_stage(self, stage: str) -> None:
+        self.status, self.stage = "running", stage
+        self._notify()
+
+    def _finish(self, status: str, result: Any = None, detail: Optional[str] = None) -> None:
+        self.status, self.result, self.detail = status, result, detail
+        self.finished_at = time.time()
+        self._finished_monotonic = time.monotonic()
+        self._notify()
+
+    async def wait_change(self, timeout: Optional[float] = None) -> None:
+        """Attend le prochain changement d'état (ou `timeout` secondes)."""
+        if self.done:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._changed.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "created": self.created,
+            "finished": self.finished_at,
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        if self.detail:
+            data["detail"] = self.detail
+        return data
+
+
+class JobStore:
+    """Travaux en mémoire, indexés par identifiant et par empreinte de contenu (déduplication)."""
+
+    def __init__(self, max_running: int = 4, max_pending: int = 64, max_jobs: int = 1000,
+                 ttl_seconds: float = 3600, error_detail: Callable[[Exception], str] = str):
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.error_detail = error_detail
+        self._slots = asyncio.Semaphore(max_running)
+        self.max_running = max_running
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: dict[str, str] = {}
+        self.counters = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0, "cancelled": 0,
+                         "rejected": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls, error_detail: Callable[[Exception], str] = str) -> "JobStore":
+        """FREY_JOBS_MAX_RUNNING, FREY_JOBS_MAX_PENDING, FREY_JOBS_MAX, FREY_JOBS_TTL (secondes)."""
+        return cls(
+            max_running=env_int("FREY_JOBS_MAX_RUNNING", 4),
+            max_pending=env_int("FREY_JOBS_MAX_PENDING", 64),
+            max_jobs=env_int("FREY_JOBS_MAX", 1000),
+            ttl_seconds=env_int("FREY_JOBS_TTL", 3600),
+            error_detail=error_detail,
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.purge_expired()
+        return self._jobs.get(job_id)
+
+    def pending(self) -> int:
+        return sum(not job.done for job in self._jobs.values())
+
+    def submit(self, key: Optional[str], work: Callable[[Job], Awaitable[Any]], steps: tuple = (),
+               cleanup: Optional[Callable[[], None]] = None) -> tuple[Job, bool]:
+        """
+        Lance `work(job)` en tâche de fond ; retourne (travail, nouveau ?).
+        key=None : pas de déduplication (ex. no_cache). `cleanup` est appelé à la fin du travail,
+        quelle qu'en soit l'issue, mais pas si la soumission est dédupliquée ou refusée.
+        """
+        self.purge_expired()
+        existing = self._jobs.get(self._by_key.get(key)) if key else None
+        if existing is not None and existing.status in ("queued", "running", "done"):
+            self.counters["deduplicated"] += 1
+            return existing, False
+        if self.pending() >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise JobStoreFull("Trop d'analyses en attente, veuillez réessayer dans quelques instants.")
+
+        job = Job(uuid.uuid4().hex, key, steps)
+        self._jobs[job.id] = job
+        if key:
+            self._by_key[key] = job.id
+        self.counters["submitted"] += 1
+        job._task = asyncio.create_task(self._run(job, work))
+        job._task.add_done_callback(lambda task: self._settle(job, cleanup))
+        self._evict()
+        return job, True
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> None:
+        try:
+            async with self._slots:
+                job.set_stage(job.steps[0] if job.steps else "running")
+                result = await work(job)
+        except asyncio.CancelledError:
+            job._finish("cancelled", detail="Analyse annulée.")
+            self.counters["cancelled"] += 1
+        except Exception as e:
+            job._finish("error", detail=self.error_detail(e))
+            self.counters["failed"] += 1
+        else:
+            job._finish("done", result=result)
+            self.counters["completed"] += 1
+
+    def _settle(self, job: Job, cleanup: Optional[Callable[[], None]]) -> None:
+        # Tâche annulée avant même de démarrer : _run n'a pas pu enregistrer l'issue
+        if not job.done:
+            job._finish("cancelled", detail="Analyse annulée.")
+            self.counters["cancelled"] += 1
+        if cleanup is not None:
+            cleanup()
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.done or job._task is None:
+            return False
+        job._task.cancel()
+        return True
+
+    def _forget(self, job: Job) -> None:
+        self._jobs.pop(job.id, None)
+        if job.key and self._by_key.get(job.key) == job.id:
+            del self._by_key[job.key]
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        expired = [job for job in self._jobs.values()
+                   if job._finished_monotonic is not None and now - job._finished_monotonic > self.ttl_seconds]
+        for job in expired:
+            self._forget(job)
+        self.counters["expired"] += len(expired)
+        return len(expired)
+
+    def _evict(self) -> None:
+        # Les travaux terminés les plus anciens partent en premier ; les travaux en cours sont conservés
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job in [job for job in self._jobs.values() if job.done][:len(self._jobs) - self.max_jobs]:
+            self._forget(job)
+
+    def shutdown(self) -> None:
+        for job in self._jobs.values():
+            if not job.done and job._task is not None:
+                job._task.cancel()
+
+    def stats(self) -> dict:
+        statuses: dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "by_status": statuses,
+            "max_running": self.max_running,
+            "max_pending": self.max_pending,
+            "ttl_seconds": self.ttl_seconds,
+            **self.counters,
+        }
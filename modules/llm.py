@@ -0,0 +1,97 @@
+# modules/llm.py
+
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from modules import metrics
+from modules.cache import ResponseCache, make_cache_key
+from modules.prompts import dedupe_system_prompt, token_usage
+from modules.resilience import ResilientCaller
+from modules.singleflight import SingleFlight
+
+if TYPE_CHECKING:  # Annotations seulement : google.genai n'est pas importé au chargement du module
+    from google import genai
+    from google.genai import types
+
+# Les appels identiques simultanés partagent un seul appel à l'API (FREY_SINGLE_FLIGHT=0 pour désactiver)
+inflight: Optional[SingleFlight] = None if os.environ.get("FREY_SINGLE_FLIGHT", "1") == "0" else SingleFlight()
+
+# Nouvelles tentatives, disjoncteur, hedging et modèle de repli (FREY_RESILIENCE=0 pour désactiver)
+caller: Optional[ResilientCaller] = None if os.environ.get("FREY_RESILIENCE", "1") == "0" else ResilientCaller.from_env()
+
+
+@dataclass
+class ModelResult:
+    """Résultat d'un appel generate_content ; `response` vaut None quand le texte vient du cache."""
+    text: Optional[str]
+    response: Any = None
+    cached: bool = False
+    model: Optional[str] = None  # Modèle ayant répondu (diffère du modèle demandé en cas de repli)
+
+
+def _cache_key(model: str, contents: Any, config: "types.GenerateContentConfig") -> str:
+    return make_cache_key(model, config.temperature, config.system_instruction, contents)
+
+
+def _record(result: ModelResult, model: str, key: str, cache: Optional[ResponseCache], endpoint: Optional[str]) -> ModelResult:
+    token_usage.record(endpoint, getattr(result.response, "usage_metadata", None))
+    # Une réponse du modèle de repli n'est pas mise en cache sous la clé du modèle demandé
+    if cache is not None and result.text and result.model == model:
+        cache.set(key, result.text)
+    return result
+
+
+def generate(client: "genai.Client", *, model: str, contents: Any, config: "types.GenerateContentConfig",
+             cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+             endpoint: Optional[str] = None) -> ModelResult:
+    """
+    Point d'entrée commun des appels client.models.generate_content.
+    Avec un cache, une réponse identique déjà produite est renvoyée sans appel réseau ;
+    bypass_cache=True force un nouvel appel (dont le résultat remplace l'entrée du cache).
+    Les demandes identiques arrivées pendant un appel en cours reçoivent le résultat de cet appel.
+    Un prompt système recopié dans les contents en est retiré (il est déjà dans system_instruction) ;
+    les tokens d'entrée sont comptabilisés pour `endpoint`.
+    """
+    contents = dedupe_system_prompt(contents, config.system_instruction)
+    key = _cache_key(model, contents, config)
+    if cache is not None and not bypass_cache:
+        cached = cache.get(key)
+        metrics.CACHE_LOOKUPS.inc(endpoint=endpoint or "", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return ModelResult(text=cached, cached=True)
+
+    def send(used_model: str) -> ModelResult:
+        response = client.models.generate_content(model=used_model, contents=contents, config=config)
+        return ModelResult(text=response.text, response=response, model=used_model)
+
+    def call() -> ModelResult:
+        with metrics.stage("gemini_call"):
+            result = caller.call(send, model) if caller is not None else send(model)
+        return _record(result, model, key, cache, endpoint)
+
+    return inflight.do(key, call) if inflight is not None else call()
+
+
+async def generate_async(client: "genai.Client", *, model: str, contents: Any, config: "types.GenerateContentConfig",
+                         cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                         endpoint: Optional[str] = None) -> ModelResult:
+    """Variante asynchrone de generate (client.aio)."""
+    contents = dedupe_system_prompt(contents, config.system_instruction)
+    key = _cache_key(model, contents, config)
+    if cache is not None and not bypass_cache:
+        cached = cache.get(key)
+        metrics.CACHE_LOOKUPS.inc(endpoint=endpoint or "", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return ModelResult(text=cached, cached=True)
+
+    async def send(used_model: str) -> ModelResult:
+        response = await client.aio.models.generate_content(model=used_model, contents=contents, config=config)
+        return ModelResult(text=response.text, response=response, model=used_model)
+
+    async def call() -> ModelResult:
+        with metrics.stage("gemini_call"):
+            result = await caller.call_async(send, model) if caller is not None else await send(model)
+        return _record(result, model, key, cache, endpoint)
+
+    return await inflight.do_async(key, call) if inflight is not None else await call()
@@ -0,0 +1,266 @@
+# modules/metrics.py
+"""
+Métriques au format texte Prometheus, sans dépendance externe :
+- histogrammes de latence par étape (lecture CSV, profilage, construction du prompt, appel Gemini...) ;
+- tokens d'entrée et de sortie, tailles des requêtes et réponses, résultats du cache ;
+- en-tête Server-Timing optionnel par requête (FREY_SERVER_TIMING=1).
+
+Avec FREY_METRICS=0, stage() renvoie un contexte vide et les enregistrements sont ignorés.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+ENABLED = os.environ.get("FREY_METRICS", "1") != "0"
+SERVER_TIMING = os.environ.get("FREY_SERVER_TIMING", "0") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(12))  # 256 o ... 1 Go
+
+
+def _labels_text(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"'.replace("\n", " ") for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_labels_text(self.labels, key)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self._series: dict[tuple, list] = {}  # clé -> [compteurs par seau..., somme, effectif]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self, **labels) -> tuple[float, int]:
+        """(somme, effectif) d'une série."""
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            return (series[-2], series[-1]) if series else (0, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    bucket_labels = _labels_text(self.labels, key, 'le="%g"' % bound)
+                    yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+                bucket_labels = _labels_text(self.labels, key, 'le="+Inf"')
+                yield f"{self.name}_bucket{bucket_labels} {series[-1]}"
+                yield f"{self.name}_sum{_labels_text(self.labels, key)} {series[-2]:g}"
+                yield f"{self.name}_count{_labels_text(self.labels, key)} {series[-1]}"
+
+
+STAGE_SECONDS = Histogram("frey_stage_seconds", "Durée de chaque étape de traitement.", ("stage",))
+REQUEST_SECONDS = Histogram("frey_request_seconds", "Durée des requêtes HTTP.", ("route", "method", "status"))
+PAYLOAD_BYTES = Histogram("frey_payload_bytes", "Taille des corps de requête et de réponse.",
+                          ("route", "direction"), buckets=SIZE_BUCKETS)
+TOKENS = Counter("frey_tokens_total", "Tokens envoyés et reçus par endpoint.", ("endpoint", "kind"))
+CACHE_LOOKUPS = Counter("frey_cache_lookups_total", "Consultations du cache de réponses.", ("endpoint", "result"))
+FRAME_BYTES = Histogram("frey_dataframe_bytes", "Mémoire des DataFrames analysés, à la lecture et après optimisation des types.",
+                        ("state",), buckets=SIZE_BUCKETS)
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, PAYLOAD_BYTES, TOKENS, CACHE_LOOKUPS, FRAME_BYTES]
+
+
+# --- ⏱️ Étapes ---
+# Collecteur de la requête en cours : (durées par étape, enregistrer dans les histogrammes ?)
+_collector: ContextVar[Optional[tuple[dict, bool]]] = ContextVar("frey_stage_collector", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_DISABLED_STAGE = nullcontext()
+
+
+def stage(name: str):
+    """Chronomètre une étape : `with metrics.stage("csv_parse"): ...`."""
+    return _Stage(name) if ENABLED else _DISABLED_STAGE
+
+
+def record_stage(name: str, seconds: float) -> None:
+    collector = _collector.get()
+    if collector is None or collector[1]:
+        STAGE_SECONDS.observe(seconds, stage=name)
+    if collector is not None:
+        collector[0][name] = collector[0].get(name, 0.0) + seconds
+
+
+@contextmanager
+def collect_stages(observe: bool = True):
+    """
+    Collecte les durées des étapes exécutées dans ce contexte (dict étape -> secondes).
+    observe=False : collecte seulement, pour un processus de travail dont les durées
+    sont renvoyées au processus principal (voir merge_stages).
+    """
+    stages: dict = {}
+    token = _collector.set((stages, observe and ENABLED))
+    try:
+        yield stages
+    finally:
+        _collector.reset(token)
+
+
+def merge_stages(stages: dict) -> None:
+    """Enregistre des durées mesurées ailleurs (ex. dans le pool de processus d'analyse)."""
+    for name, seconds in stages.items():
+        record_stage(name, seconds)
+
+
+def record_tokens(endpoint: Optional[str], usage_metadata) -> None:
+    if not ENABLED or not endpoint or usage_metadata is None:
+        return
+    for kind, attribute in (("input", "prompt_token_count"), ("output", "candidates_token_count")):
+        value = getattr(usage_metadata, attribute, None)
+        if value:
+            TOKENS.inc(value, endpoint=endpoint, kind=kind)
+
+
+def record_frame_memory(loaded_bytes: int, optimized_bytes: int) -> None:
+    FRAME_BYTES.observe(loaded_bytes, state="loaded")
+    FRAME_BYTES.observe(optimized_bytes, state="optimized")
+
+
+def frame_memory_stats() -> dict:
+    """Cumul de la mémoire des DataFrames analysés par ce processus, avant et après optimisation."""
+    loaded, frames = FRAME_BYTES.totals(state="loaded")
+    optimized, _ = FRAME_BYTES.totals(state="optimized")
+    return {"frames": frames, "loaded_bytes": int(loaded), "optimized_bytes": int(optimized),
+            "saved_ratio": round(1 - optimized / loaded, 4) if loaded else 0.0}
+
+
+# --- 📤 Exposition ---
+
+def render(extra_lines: Iterable[str] = ()) -> str:
+    lines = [line for metric in REGISTRY for line in metric.render()]
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def stats_lines(name: str, help_text: str, values: dict, label: str, kind: str = "gauge") -> list[str]:
+    """Expose un dict de compteurs existant (ex. stats() d'un composant) comme une métrique étiquetée."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'{name}{{{label}="{key}"}} {value:g}')
+    return lines
+
+
+def server_timing(stages: dict) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items())
+
+
+def route_label(scope) -> str:
+    """
+    Gabarit de la route (« /api/analyze/jobs/{job_id} ») : nombre de séries borné. Une requête arrêtée avant
+    le routage (ex. rejet d'admission) est rapprochée des routes de l'application ; sans correspondance : "unmatched".
+    """
+    route = scope.get("route")
+    if route is None:
+        from starlette.routing import Match
+
+        routes = getattr(getattr(scope.get("app"), "router", None), "routes", ())
+        route = next((candidate for candidate in routes if candidate.matches(scope)[0] == Match.FULL), None)
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : durée et tailles de chaque requête, collecte des étapes de la requête
+    et, si FREY_SERVER_TIMING=1, en-tête Server-Timing (étapes terminées avant l'envoi des en-têtes).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        received = 0
+        sent = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            return message
+
+        with collect_stages() as stages:
+            async def timed_send(message):
+                nonlocal sent, status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if SERVER_TIMING:
+                        stages["total"] = time.perf_counter() - start
+                        message = {**message, "headers": [*message.get("headers", []),
+                                                          (b"server-timing", server_timing(stages).encode())]}
+                elif message["type"] == "http.response.body":
+                    sent += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, counting_receive, timed_send)
+            finally:
+                route = route_label(scope)
+                REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=scope["method"], status=status)
+                PAYLOAD_BYTES.observe(received, route=route, direction="request")
+                PAYLOAD_BYTES.observe(sent, route=route, direction="response")
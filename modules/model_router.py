@@ -0,0 +1,334 @@
+# modules/model_router.py
+"""
+Catalogue des modèles Gemini et choix du modèle par requête.
+
+- ModelCatalog : client.models.list() est lu une fois puis gardé `ttl_seconds`. Passé ce délai, le
+  catalogue reste servi pendant qu'un thread de fond le relit (une seule relecture à la fois) ;
+  après un échec de lecture, le dernier catalogue connu est conservé et la lecture est retentée
+  après `retry_seconds`.
+- ModelRouter : choisit le modèle de chaque appel selon l'endpoint, la taille du prompt et le SLO
+  de latence de l'endpoint, au vu du p95 glissant observé par modèle (les LatencyTracker du
+  ResilientCaller, alimentés par chaque appel réussi). Seules les mesures des `latency_max_age`
+  dernières secondes comptent, et un modèle écarté pour lenteur reçoit encore un appel toutes les
+  `explore_interval` secondes : il est réintégré dès qu'il respecte de nouveau le SLO.
+  Les dernières décisions sont gardées pour inspection (GET /api/models/routing).
+
+Le client est obtenu par une fonction (`client_factory`) : le faux client de benchmarks/fake_genai.py
+suffit pour les tests.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from modules.resilience import LatencyTracker
+
+if TYPE_CHECKING:
+    from modules.resilience import ResilientCaller
+
+GENERATE_ACTION = "generateContent"
+DEFAULT_MODEL = "gemini-2.5-flash"
+LIGHT_MODEL = "gemini-2.5-flash-lite"
+
+
+@dataclass(frozen=True)
+class ModelInfo:
+    name: str            # Nom complet renvoyé par l'API ("models/gemini-2.5-flash")
+    id: str              # Identifiant passé à generate_content ("gemini-2.5-flash")
+    display_name: Optional[str]
+    supported_actions: tuple
+    input_token_limit: Optional[int] = None
+    output_token_limit: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "supported_actions": list(self.supported_actions)}
+
+
+class ModelCatalog:
+    """Modèles disponibles pour la clé API, lus par client.models.list() et mis en cache."""
+
+    def __init__(self, client_factory: Callable[[], Any], ttl_seconds: float = 3600, retry_seconds: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.client_factory = client_factory
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self._models: dict[str, ModelInfo] = {}
+        self._next_refresh: Optional[float] = None  # None : jamais lu
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # Une seule lecture à la fois
+        self.counters = {"fetches": 0, "fetch_errors": 0, "background_refreshes": 0}
+        self.fetched_at: Optional[float] = None  # Date (time.time()) de la dernière lecture réussie
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, client_factory: Callable[[], Any]) -> "ModelCatalog":
+        """FREY_MODEL_CATALOG_TTL (s), FREY_MODEL_CATALOG_RETRY (s, après un échec de lecture)."""
+        return cls(
+            client_factory,
+            ttl_seconds=float(os.environ.get("FREY_MODEL_CATALOG_TTL", 3600)),
+            retry_seconds=float(os.environ.get("FREY_MODEL_CATALOG_RETRY", 60)),
+        )
+
+    def _fetch(self) -> dict[str, ModelInfo]:
+        client = self.client_factory()
+        if client is None:
+            raise RuntimeError("client Gemini non disponible")
+        models = {}
+        for model in client.models.list():
+            name = model.name or ""
+            model_id = name.removeprefix("models/")
+            models[model_id] = ModelInfo(
+                name=name,
+                id=model_id,
+                display_name=model.display_name,
+                supported_actions=tuple(model.supported_actions or ()),
+                input_token_limit=model.input_token_limit,
+                output_token_limit=model.output_token_limit,
+            )
+        return models
+
+    def refresh(self) -> bool:
+        """Relit le catalogue ; en cas d'échec, garde le précédent et retourne False."""
+        with self._fetch_lock:
+            try:
+                models = self._fetch()
+            except Exception as e:
+                print(f"Lecture du catalogue des modèles Gemini impossible : {e}")
+                with self._lock:
+                    self.counters["fetch_errors"] += 1
+                    self.last_error = str(e)
+                    self._next_refresh = self.clock() + self.retry_seconds
+                return False
+            with self._lock:
+                self._models = models
+                self._next_refresh = self.clock() + self.ttl_seconds
+                self.counters["fetches"] += 1
+                self.fetched_at = time.time()
+                self.last_error = None
+            return True
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self) -> None:
+        if self._next_refresh is None:
+            self.refresh()  # Première lecture : synchrone
+            return
+        with self._lock:
+            if self._refreshing or self.clock() < self._next_refresh:
+                return
+            self._refreshing = True
+            self.counters["background_refreshes"] += 1
+        threading.Thread(target=self._background_refresh, name="frey-model-catalog", daemon=True).start()
+
+    def models(self, action: Optional[str] = GENERATE_ACTION) -> list[ModelInfo]:
+        """Modèles du catalogue qui prennent en charge `action` (tous si None)."""
+        self._ensure_fresh()
+        with self._lock:
+            models = list(self._models.values())
+        return [model for model in models if action is None or action in model.supported_actions]
+
+    def get(self, model_id: str) -> Optional[ModelInfo]:
+        self._ensure_fresh()
+        with self._lock:
+            return self._models.get(model_id)
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._models)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "ttl_seconds": self.ttl_seconds,
+                "fetched_at": self.fetched_at,
+                "refreshing": self._refreshing,
+                "last_error": self.last_error,
+                **self.counters,
+            }
+
+
+@dataclass
+class RouteDecision:
+    endpoint: str
+    prompt_chars: int
+    model: str
+    reason: str                # default, short_prompt, catalog, slo, slo_best_effort, explore
+    p95: Optional[float]       # p95 observé du modèle choisi (s)
+    slo: Optional[float]       # SLO de latence de l'endpoint (s)
+    at: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _parse_slo(spec: str) -> dict[str, float]:
+    """Ex. "generate=3,chat=5" -> {"generate": 3.0, "chat": 5.0}."""
+    slo = {}
+    for item in spec.split(","):
+        endpoint, _, seconds = item.partition("=")
+        if endpoint.strip() and seconds.strip():
+            slo[endpoint.strip()] = float(seconds)
+    return slo
+
+
+class ModelRouter:
+    """
+    Choix du modèle, dans l'ordre :
+    1. `light_model` pour les endpoints de `light_endpoints` dont le prompt fait au plus `light_max_chars`
+       caractères, `default_model` sinon ;
+    2. le modèle doit figurer au catalogue (generateContent, limite de tokens d'entrée) ; à défaut, le
+       premier des `candidates` qui y figure ;
+    3. si le p95 observé du modèle dépasse le SLO de l'endpoint, le candidat le plus rapide qui respecte
+       le SLO (ou, à défaut, le plus rapide s'il fait mieux) ; un appel toutes les `explore_interval`
+       secondes reste sur le modèle écarté, pour mesurer sa latence actuelle. Les modèles dont le
+       disjoncteur est ouvert sont écartés.
+    Sans catalogue chargé (lecture impossible), les noms configurés sont utilisés tels quels.
+    """
+
+    def __init__(self, catalog: Optional[ModelCatalog], default_model: str = DEFAULT_MODEL,
+                 light_model: Optional[str] = LIGHT_MODEL, light_endpoints: tuple = ("generate",),
+                 light_max_chars: int = 500, slo_seconds: Optional[dict] = None,
+                 candidates: tuple = (DEFAULT_MODEL, LIGHT_MODEL), caller: Optional["ResilientCaller"] = None,
+                 latency_max_age: Optional[float] = 300, explore_interval: Optional[float] = 30,
+                 history: int = 200, clock: Callable[[], float] = time.monotonic):
+        self.catalog = catalog
+        self.default_model = default_model
+        self.light_model = light_model
+        self.light_endpoints = tuple(light_endpoints)
+        self.light_max_chars = light_max_chars
+        self.slo_seconds = dict(slo_seconds or {})
+        self.candidates = tuple(candidates)
+        self.caller = caller
+        self.latency_max_age = latency_max_age
+        self.explore_interval = explore_interval
+        self.clock = clock
+        self._explored: dict[str, float] = {}  # Modèle écarté -> date du dernier appel d'exploration
+        # Latences partagées avec ResilientCaller (qui les alimente) ; sinon, alimentées par observe()
+        self.latencies: dict[str, LatencyTracker] = caller.latencies if caller is not None else {}
+        self.decisions: deque = deque(maxlen=history)
+        self.counts: Counter = Counter()   # (endpoint, modèle) -> décisions
+        self.reasons: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, catalog: Optional[ModelCatalog], caller: Optional["ResilientCaller"] = None) -> "ModelRouter":
+        """
+        FREY_ROUTER_DEFAULT_MODEL, FREY_ROUTER_LIGHT_MODEL (vide : jamais de modèle léger),
+        FREY_ROUTER_LIGHT_ENDPOINTS ("generate"), FREY_ROUTER_LIGHT_MAX_CHARS (taille du prompt utilisateur),
+        FREY_ROUTER_SLO ("generate=4,chat=6,analyze=20", secondes), FREY_ROUTER_MODELS (candidats, par ordre de préférence),
+        FREY_ROUTER_LATENCY_MAX_AGE (s), FREY_ROUTER_EXPLORE_INTERVAL (s, 0 : pas d'exploration).
+        """
+        default_model = os.environ.get("FREY_ROUTER_DEFAULT_MODEL", DEFAULT_MODEL)
+        light_model = os.environ.get("FREY_ROUTER_LIGHT_MODEL", LIGHT_MODEL) or None
+        candidates = os.environ.get("FREY_ROUTER_MODELS", ",".join(m for m in (default_model, light_model) if m))
+        return cls(
+            catalog,
+            default_model=default_model,
+            light_model=light_model,
+            light_endpoints=tuple(e.strip() for e in os.environ.get("FREY_ROUTER_LIGHT_ENDPOINTS", "generate").split(",") if e.strip()),
+            light_max_chars=int(os.environ.get("FREY_ROUTER_LIGHT_MAX_CHARS", 500)),
+            slo_seconds=_parse_slo(os.environ.get("FREY_ROUTER_SLO", "generate=4,chat=6,analyze=20")),
+            candidates=tuple(m.strip() for m in candidates.split(",") if m.strip()),
+            caller=caller,
+            latency_max_age=float(os.environ.get("FREY_ROUTER_LATENCY_MAX_AGE", 300)) or None,
+            explore_interval=float(os.environ.get("FREY_ROUTER_EXPLORE_INTERVAL", 30)) or None,
+        )
+
+    def observe(self, model: str, seconds: float) -> None:
+        """Latence d'un appel réussi (inutile si le ResilientCaller partagé mesure déjà les appels)."""
+        self.latencies.setdefault(model, LatencyTracker(clock=self.clock)).add(seconds)
+
+    def p95(self, model: str) -> Optional[float]:
+        tracker = self.latencies.get(model)
+        return tracker.p95(self.latency_max_age) if tracker is not None else None
+
+    def _explore(self, model: str, record: bool) -> bool:
+        """True si cet appel doit rester sur le modèle écarté `model` (un appel par explore_interval)."""
+        if self.explore_interval is None:
+            return False
+        now = self.clock()
+        with self._lock:
+            last = self._explored.setdefault(model, now)  # Première mise à l'écart : l'intervalle commence
+            if now - last < self.explore_interval:
+                return False
+            if record:
+                self._explored[model] = now
+            return True
+
+    def _usable(self, model: str, prompt_chars: int) -> bool:
+        if self.caller is not None and model in self.caller.breakers and self.caller.breakers[model].state == "open":
+            return False
+        if self.catalog is None or not self.catalog.loaded:
+            return True
+        info = self.catalog.get(model)
+        if info is None or GENERATE_ACTION not in info.supported_actions:
+            return False
+        # Estimation grossière : 4 caractères par token
+        return info.input_token_limit is None or prompt_chars // 4 <= info.input_token_limit
+
+    def choose(self, endpoint: str, prompt_chars: int, record: bool = True) -> RouteDecision:
+        """Modèle pour un appel de `endpoint` dont le prompt fait `prompt_chars` caractères."""
+        if self.light_model and endpoint in self.light_endpoints and prompt_chars <= self.light_max_chars:
+            model, reason = self.light_model, "short_prompt"
+        else:
+            model, reason = self.default_model, "default"
+
+        usable = [m for m in dict.fromkeys((*self.candidates, model)) if self._usable(m, prompt_chars)]
+        if model not in usable:
+            # Aucun candidat utilisable : le modèle par défaut, dont l'échec éventuel sera explicite
+            model, reason = (usable[0], "catalog") if usable else (self.default_model, "catalog")
+
+        slo = self.slo_seconds.get(endpoint)
+        p95 = self.p95(model)
+        if slo is not None and p95 is not None and p95 > slo:
+            measured = sorted((self.p95(m), m) for m in usable if m != model and self.p95(m) is not None)
+            within = [(latency, m) for latency, m in measured if latency <= slo]
+            best = within[0] if within else measured[0] if measured and measured[0][0] < p95 else None
+            if best is not None and self._explore(model, record):
+                reason = "explore"
+            elif best is not None:
+                p95, model = best
+                reason = "slo" if within else "slo_best_effort"
+        else:
+            with self._lock:
+                self._explored.pop(model, None)  # Modèle (de nouveau) dans le SLO
+
+        decision = RouteDecision(endpoint, prompt_chars, model, reason, p95, slo, time.time())
+        if record:
+            with self._lock:
+                self.decisions.append(decision)
+                self.counts[(endpoint, model)] += 1
+                self.reasons[reason] += 1
+        return decision
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            return [decision.to_dict() for decision in list(self.decisions)[-limit:]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {f"{endpoint}:{model}": count for (endpoint, model), count in self.counts.items()}
+            reasons = dict(self.reasons)
+        return {
+            "default_model": self.default_model,
+            "light_model": self.light_model,
+            "light_endpoints": list(self.light_endpoints),
+            "light_max_chars": self.light_max_chars,
+            "slo_seconds": self.slo_seconds,
+            "candidates": list(self.candidates),
+            "p95": {model: self.p95(model) for model in dict.fromkeys((*self.candidates, *self.latencies))},
+            "decisions": counts,
+            "reasons": reasons,
+            "catalog": self.catalog.stats() if self.catalog is not None else None,
+        }
@@ -0,0 +1,317 @@
+# modules/profiler.py
+"""
+Profilage en un seul passage, par blocs, pour les fichiers trop gros pour tenir en mémoire.
+
+Chaque bloc (DataFrame de `chunksize` lignes) est résumé par des calculs vectorisés,
+puis fusionné dans des accumulateurs de taille bornée :
+- NumericAccumulator : effectif, moyenne et variance (Welford / fusion de Chan), min/max,
+  quantiles approchés (QuantileSketch, exacts tant que la colonne tient dans le sketch) ;
+- HeavyHitters : top-k approché des colonnes texte (Space-Saving) ;
+- valeurs manquantes par colonne.
+La mémoire consommée ne dépend pas de la taille du fichier.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+DESCRIBE_QUANTILES = (0.25, 0.5, 0.75)
+
+
+class QuantileSketch:
+    """
+    Sketch de quantiles fusionnable à compacteurs (type KLL) : chaque niveau garde au plus
+    `capacity` valeurs ; un niveau plein est trié et une valeur sur deux monte au niveau
+    suivant avec un poids doublé. Tant qu'aucun compactage n'a eu lieu, le résultat est exact
+    (interpolation linéaire, comme pandas.describe).
+    """
+
+    def __init__(self, capacity: int = 4096, seed: int = 0):
+        self.capacity = capacity
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=float)])
+        self._compact()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compact()
+
+    def _compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) > self.capacity:
+                values = np.sort(values)
+                # Un élément impair reste au niveau courant pour conserver le poids total
+                keep = values[-1:] if len(values) % 2 else values[:0]
+                paired = values[:len(values) - len(keep)]
+                promoted = paired[self._rng.integers(2)::2]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep
+            level += 1
+
+    @property
+    def exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def quantile(self, q: float) -> float:
+        if self.exact:
+            if len(self.levels[0]) == 0:
+                return float("nan")
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2.0 ** i) for i, v in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        rank = q * cumulative[-1]
+        return float(values[min(np.searchsorted(cumulative, rank), len(values) - 1)])
+
+
+class NumericAccumulator:
+    """Statistiques d'une colonne numérique, fusionnables bloc par bloc."""
+
+    def __init__(self, sketch_capacity: int = 4096):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Somme compensée (Neumaier) : la moyenne finale reste aussi précise que celle de pandas
+        self.total = 0.0
+        self._compensation = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(sketch_capacity)
+
+    def update(self, column: pd.Series) -> None:
+        values = column.dropna().to_numpy(dtype=float)
+        if len(values) == 0:
+            return
+        total = float(values.sum())
+        mean = total / len(values)
+        self._add_total(total)
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+        self.sketch.update(values)
+
+    def merge(self, other: "NumericAccumulator") -> None:
+        if other.count:
+            self._add_total(other.total)
+            self._add_total(other._compensation)
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+            self.sketch.merge(other.sketch)
+
+    def _add_total(self, value: float) -> None:
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self._compensation += (self.total - total) + value
+        else:
+            self._compensation += (value - total) + self.total
+        self.total = total
+
+    def _combine(self, count: int, mean: float, m2: float, vmin: float, vmax: float) -> None:
+        # Fusion de deux résumés (Chan et al.) : généralisation par blocs de l'algorithme de Welford
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def describe(self) -> list[float]:
+        """Valeurs dans l'ordre de pandas.describe : count, mean, std, min, 25%, 50%, 75%, max."""
+        if self.count == 0:
+            return [0.0] + [np.nan] * 7
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        quantiles = [self.sketch.quantile(q) for q in DESCRIBE_QUANTILES]
+        mean = (self.total + self._compensation) / self.count
+        return [float(self.count), mean, std, self.min, *quantiles, self.max]
+
+
+class HeavyHitters:
+    """
+    Top-k approché (algorithme Space-Saving pondéré) avec au plus `capacity` compteurs.
+    Exact tant que la colonne a moins de `capacity` valeurs distinctes. Au-delà, chaque compteur
+    surestime d'au plus son erreur (`errors`), et une valeur non suivie peut avoir jusqu'à
+    floor() + missed occurrences : top() n'annonce que des nombres garantis.
+    """
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self.errors: dict = {}  # Surestimation maximale de chaque compteur
+        self.missed = 0  # Occurrences qui ont pu échapper à tous les compteurs (blocs tronqués, fusions)
+        self.exact = True
+
+    def update(self, column: pd.Series) -> None:
+        # value_counts est vectorisé ; seuls les `capacity` meilleurs candidats du bloc sont fusionnés
+        counts = column.value_counts(sort=False)
+        if len(counts) > self.capacity:
+            counts = counts.nlargest(self.capacity + 1)
+            self.missed += int(counts.iloc[-1])  # Plus grand nombre écarté du bloc
+            counts = counts.iloc[:-1]
+            self.exact = False
+        self._add((value, count, 0) for value, count in zip(counts.index, counts.to_numpy()))
+
+    def merge(self, other: "HeavyHitters") -> None:
+        self.exact = self.exact and other.exact
+        self.missed += other.missed + other.floor()
+        self._add((value, count, other.errors.get(value, 0)) for value, count in other.counts.items())
+
+    def _add(self, items) -> None:
+        for value, count, error in items:
+            if value in self.counts:
+                self.counts[value] += int(count)
+                self.errors[value] += int(error)
+            elif len(self.counts) < self.capacity:
+                self.counts[value] = int(count)
+                self.errors[value] = int(error)
+            else:
+                # Remplace le plus petit compteur, qui devient une borne haute de l'erreur
+                self.exact = False
+                smallest = min(self.counts, key=self.counts.get)
+                floor = self.counts.pop(smallest)
+                del self.errors[smallest]
+                self.counts[value] = floor + int(count)
+                self.errors[value] = floor + int(error)
+
+    def floor(self) -> int:
+        """Plus petit compteur quand tous sont occupés : borne des occurrences d'une valeur remplacée."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def top(self, k: int = 5) -> list[tuple]:
+        """
+        (valeur, nombre) des k valeurs les plus fréquentes. Approché : nombre minimal garanti (compteur moins
+        son erreur), et seules les valeurs dont ce minimum dépasse ce qu'une valeur non suivie a pu atteindre.
+        """
+        if self.exact:
+            return sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+        threshold = self.floor() + self.missed
+        guaranteed = ((value, count - self.errors[value]) for value, count in self.counts.items())
+        return sorted(((value, count) for value, count in guaranteed if count > threshold),
+                      key=lambda item: -item[1])[:k]
+
+
+def _is_text(dtype) -> bool:
+    return dtype == object or pd.api.types.is_string_dtype(dtype)
+
+
+def _merge_dtype(current, new, column_is_empty: bool):
+    """Type final d'une colonne vue sur plusieurs blocs (ex. int64 puis float64 -> float64)."""
+    if current is None:
+        return new
+    if column_is_empty or current == new or (_is_text(current) and _is_text(new)):
+        return current
+    if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new) \
+            and not pd.api.types.is_bool_dtype(current) and not pd.api.types.is_bool_dtype(new):
+        return np.promote_types(current, new)
+    # Nombres dans un bloc, texte dans un autre : pandas aurait lu la colonne entière comme texte
+    for dtype in (current, new):
+        if _is_text(dtype):
+            return dtype
+    return np.dtype(object)
+
+
+def _final_dtype(dtype, has_missing: bool):
+    """Comme read_csv sur le fichier entier : une colonne entière (ou booléenne) avec des manquants change de type."""
+    if has_missing and dtype.kind in "iu":
+        return np.dtype("float64")
+    if has_missing and dtype.kind == "b":
+        return np.dtype(object)
+    return dtype
+
+
+class StreamingProfiler:
+    """Accumule le profil d'un jeu de données bloc par bloc (mémoire constante)."""
+
+    def __init__(self, sketch_capacity: int = 4096, top_capacity: int = 512):
+        self.sketch_capacity = sketch_capacity
+        self.top_capacity = top_capacity
+        self.rows = 0
+        self.columns: Optional[list] = None
+        self.dtypes: dict = {}
+        self.missing: dict = {}
+        self.numeric: dict = {}
+        self.text: dict = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        self.rows += len(chunk)
+        missing = chunk.isnull().sum()
+        for name in self.columns:
+            column = chunk[name]
+            self.missing[name] = self.missing.get(name, 0) + int(missing[name])
+            empty = bool(missing[name] == len(chunk))
+            self.dtypes[name] = _merge_dtype(self.dtypes.get(name), column.dtype, empty)
+            if empty or pd.api.types.is_bool_dtype(column.dtype):
+                continue
+            if pd.api.types.is_numeric_dtype(column.dtype):
+                self.numeric.setdefault(name, NumericAccumulator(self.sketch_capacity)).update(column)
+            elif _is_text(column.dtype):
+                self.text.setdefault(name, HeavyHitters(self.top_capacity)).update(column)
+
+    def merge(self, other: "StreamingProfiler") -> None:
+        """Fusionne le profil d'une autre partie du même fichier (ex. calculée dans un autre processus)."""
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self.columns = list(other.columns)
+        self.rows += other.rows
+        for name in self.columns:
+            self.missing[name] = self.missing.get(name, 0) + other.missing.get(name, 0)
+            if name in other.dtypes:
+                self.dtypes[name] = _merge_dtype(self.dtypes.get(name), other.dtypes[name], False)
+        for name, acc in other.numeric.items():
+            self.numeric.setdefault(name, NumericAccumulator(self.sketch_capacity)).merge(acc)
+        for name, hitters in other.text.items():
+            self.text.setdefault(name, HeavyHitters(self.top_capacity)).merge(hitters)
+
+    # --- Restitution sous forme d'objets pandas (même mise en forme que analyze_data_pandas) ---
+
+    def final_dtypes(self) -> dict:
+        return {name: _final_dtype(self.dtypes[name], self.missing[name] > 0) for name in self.columns}
+
+    def dtypes_series(self) -> pd.Series:
+        dtypes = self.final_dtypes()
+        return pd.Series([dtypes[name] for name in self.columns], index=self.columns, dtype=object)
+
+    def numeric_columns(self) -> list:
+        dtypes = self.final_dtypes()
+        return [name for name in self.columns
+                if pd.api.types.is_numeric_dtype(dtypes[name]) and not pd.api.types.is_bool_dtype(dtypes[name])]
+
+    def mixed_columns(self) -> list:
+        """Colonnes numériques dans certains blocs et texte dans d'autres (leurs statistiques sont partielles)."""
+        return [name for name in self.columns if name in self.numeric and name in self.text]
+
+    def describe(self) -> Optional[pd.DataFrame]:
+        columns = self.numeric_columns()
+        if not columns:
+            return None
+        index = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        empty = NumericAccumulator(self.sketch_capacity)  # Colonne entièrement manquante
+        return pd.DataFrame({name: self.numeric.get(name, empty).describe() for name in columns}, index=index)
+
+    def text_columns(self) -> list:
+        dtypes = self.final_dtypes()
+        return [name for name in self.columns if _is_text(dtypes[name]) and name in self.text]
+
+    def top_values(self, name, k: int = 5) -> pd.Series:
+        top = self.text[name].top(k)
+        values, counts = zip(*top) if top else ((), ())
+        return pd.Series(list(counts), index=pd.Index(list(values), name=name), name="count", dtype="int64")
+
+    def missing_series(self) -> pd.Series:
+        return pd.Series([self.missing[name] for name in self.columns], index=self.columns, dtype="int64")
+
+    def is_exact(self) -> bool:
+        return (all(acc.sketch.exact for acc in self.numeric.values())
+                and all(h.exact for h in self.text.values())
+                and not self.mixed_columns())
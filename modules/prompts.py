@@ -0,0 +1,167 @@
+# modules/prompts.py
+"""
+Prompts partagés par l'application Streamlit et l'API : un seul prompt système FREY,
+des gabarits précompilés pour chaque fonctionnalité, et la mesure des tokens d'entrée.
+
+Le prompt système est transmis uniquement via system_instruction ; les gabarits ne
+contiennent que la consigne propre à la tâche.
+"""
+
+import string
+import threading
+from typing import Any, Optional
+
+from modules import metrics
+from modules.tokens import TokenCounter
+
+# --- 🧠 PROMPT SYSTÉMIQUE FREY ---
+FREY_SYSTEM_PROMPT = """
+Tu es FREY, une Intelligence Artificielle multifonctionnelle.
+Ton style est professionnel, bienveillant, pédagogique et inspirant.
+Ton objectif est de simplifier la vie de l’utilisateur, de répondre rapidement et de produire du contenu de qualité.
+Tu es clair, fluide, amical, mais précis.
+
+RÈGLES DE RÉPONSE OBLIGATOIRES :
+1. Structure : Fournis toujours une réponse claire et détaillée en utilisant des titres, sous-titres, et emojis pertinents. **Utilise fréquemment des sauts de ligne pour créer des micro-paragraphes et rendre le texte très aéré et scannable.**
+2. Synthèse : Termine TOUJOURS ta réponse par deux sections en gras :
+    - **Résumé :** [Synthèse de ta réponse en une seule phrase.]
+    - **Suggestion :** [Une action concrète ou une piste de réflexion basée sur la réponse/l'analyse.]
+3. Ambiguïté : Si la question est floue, reformule-la avant de répondre.
+4. Contenu : Ne réponds JAMAIS "je ne sais pas". Propose toujours une explication logique ou une piste.
+"""
+
+
+class PromptTemplate:
+    """
+    Gabarit analysé une seule fois (texte fixe et champs) : render() se contente de concaténer.
+    La partie fixe est mesurée en tokens pour le rapport par endpoint.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        self._parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+        self.fields = [field for _, field in self._parts if field]
+        self.static_text = "".join(literal for literal, _ in self._parts)
+
+    def render(self, **values: Any) -> str:
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+
+    def static_tokens(self, counter: TokenCounter) -> int:
+        return counter.count(self.static_text)
+
+
+CONTENT_TEMPLATE = PromptTemplate("generate", """🎯 Objectif :
+Rédige un texte fluide, pertinent et de qualité professionnelle sur le sujet suivant,
+en adoptant un ton **{ton}**.
+
+📝 Sujet : "{subject}"
+""")
+
+ANALYSIS_TEMPLATE = PromptTemplate("analyze", """En tant que FREY, votre mission est de transformer l'analyse de données brutes suivante en un rapport lisible, pédagogique, et inspirant.
+
+Votre réponse doit :
+1. Décrire les tendances générales (dimensions, statistiques principales).
+2. Identifier un insight clé (anomalie, top valeur, corrélation implicite).
+3. Respecter STRICTEMENT la structure finale : Réponse claire + Résumé + Suggestion (selon les règles FREY).
+
+Voici les résultats bruts de l'analyse Pandas :
+---
+{raw_analysis}
+---
+""")
+
+CHAT_SUMMARY_TEMPLATE = PromptTemplate("chat_summary", """Tu maintiens le résumé d'une conversation entre un utilisateur et FREY.
+Mets à jour le résumé existant avec les nouveaux échanges ci-dessous.
+Conserve les faits, décisions, préférences et questions en suspens ; supprime les formules de politesse.
+Réponds uniquement par le résumé, en {max_words} mots maximum.
+
+Résumé existant :
+{summary}
+
+Nouveaux échanges :
+{turns}
+""")
+
+CHAT_SUMMARY_SUFFIX = PromptTemplate("chat_context", "\n\nRésumé des échanges précédents avec l'utilisateur :\n{summary}")
+
+# Gabarit envoyé par chaque endpoint, en plus du prompt système (None : message utilisateur seul)
+ENDPOINT_TEMPLATES: dict[str, Optional[PromptTemplate]] = {
+    "chat": None,
+    "generate": CONTENT_TEMPLATE,
+    "analyze": ANALYSIS_TEMPLATE,
+}
+
+
+# Endpoints dont les contents recopiaient le prompt système avant la déduplication (ancien gabarit de /api/generate)
+DEDUPED_ENDPOINTS = ("generate",)
+
+
+def dedupe_system_prompt(contents: Any, system_instruction: Optional[str]) -> Any:
+    """
+    Retire des contents le prompt système s'il y est recopié : il est déjà transmis
+    via system_instruction et serait facturé deux fois.
+    """
+    if not system_instruction or not system_instruction.strip():
+        return contents
+    needle = system_instruction.strip()
+    if isinstance(contents, str):
+        return contents.replace(needle, "").strip() if needle in contents else contents
+    if isinstance(contents, list) and any(isinstance(item, str) and needle in item for item in contents):
+        return [item.replace(needle, "").strip() if isinstance(item, str) else item for item in contents]
+    return contents
+
+
+# --- 📏 Tokens d'entrée observés par endpoint ---
+class TokenUsage:
+    """Cumule les tokens d'entrée (usage_metadata.prompt_token_count) des appels réels à l'API."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, dict] = {}
+
+    def record(self, endpoint: Optional[str], usage_metadata) -> None:
+        metrics.record_tokens(endpoint, usage_metadata)
+        tokens = getattr(usage_metadata, "prompt_token_count", None) if usage_metadata is not None else None
+        if not endpoint or not tokens:
+            return
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {"calls": 0, "input_tokens": 0, "last_input_tokens": 0})
+            entry["calls"] += 1
+            entry["input_tokens"] += tokens
+            entry["last_input_tokens"] = tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {**entry, "avg_input_tokens": round(entry["input_tokens"] / entry["calls"], 1)}
+                for endpoint, entry in self._endpoints.items()
+            }
+
+
+token_usage = TokenUsage()
+
+
+def prompt_token_report(counter: TokenCounter) -> dict:
+    """
+    Tokens d'entrée par endpoint : partie fixe mesurée (prompt système + gabarit),
+    tokens économisés par la déduplication (gabarit compté avec et sans le prompt système recopié),
+    et moyennes observées sur les appels réels.
+    """
+    system_tokens = counter.count(FREY_SYSTEM_PROMPT)
+    observed = token_usage.snapshot()
+    report = {}
+    for endpoint, template in ENDPOINT_TEMPLATES.items():
+        template_tokens = template.static_tokens(counter) if template else 0
+        saved = 0
+        if template and endpoint in DEDUPED_ENDPOINTS:
+            # Contents d'avant la déduplication : prompt système recopié en tête du gabarit
+            saved = counter.count(f"\n{FREY_SYSTEM_PROMPT}\n\n{template.static_text}") - template_tokens
+        report[endpoint] = {
+            "system_tokens": system_tokens,
+            "template_tokens": template_tokens,
+            "fixed_input_tokens": system_tokens + template_tokens,
+            "saved_by_dedupe_tokens": saved,
+            "observed": observed.get(endpoint),
+        }
+    return report
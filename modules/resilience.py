@@ -0,0 +1,293 @@
+# modules/resilience.py
+"""
+Appels Gemini résilients : nouvelles tentatives avec attente exponentielle aléatoire,
+disjoncteur par modèle, requête de couverture (hedging) au-delà du p95 de latence,
+et repli sur un modèle plus léger.
+
+Les dépendances temporelles (sleep, horloge, aléa) sont injectables : ResilientCaller
+se teste avec un faux client sans attendre réellement.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+FALLBACK_MODEL = "gemini-2.5-flash-lite"
+
+
+class CircuitOpen(Exception):
+    """Le disjoncteur est ouvert : l'appel est refusé immédiatement."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Surcharge, quota, erreur serveur ou réseau : l'appel peut être retenté."""
+    # Imports différés : google.genai n'est chargé qu'au premier appel (voir modules/startup.py)
+    import httpx
+    from google.genai import errors
+
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur classique : fermé tant que l'amont répond ; ouvert après `failure_threshold`
+    échecs consécutifs (les appels échouent alors immédiatement) ; après `reset_timeout`,
+    demi-ouvert : un seul appel d'essai décide de la refermeture.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probe_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Appel d'essai terminé sans verdict sur l'amont (ex. erreur 400 ou annulation)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """
+    Fenêtre glissante des latences réussies, pour estimer le p95.
+    Chaque mesure est datée : p95(max_age=...) ignore les mesures plus anciennes que max_age secondes.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, clock: Callable[[], float] = time.monotonic):
+        self.samples: deque = deque(maxlen=window)  # (date, secondes)
+        self.min_samples = min_samples
+        self.clock = clock
+
+    def add(self, seconds: float) -> None:
+        self.samples.append((self.clock(), seconds))
+
+    def p95(self, max_age: Optional[float] = None) -> Optional[float]:
+        samples = list(self.samples)
+        if max_age is not None:
+            oldest = self.clock() - max_age
+            samples = [sample for sample in samples if sample[0] >= oldest]
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(seconds for _, seconds in samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Enveloppe commune des appels Gemini. `fn(model)` effectue l'appel pour le modèle donné :
+    - erreurs retentables : jusqu'à `max_attempts` essais, attente aléatoire dans
+      [0, min(max_delay, base_delay * 2**essai)] (« full jitter ») ;
+    - disjoncteur par modèle : un modèle en panne est court-circuité sans attendre ;
+    - hedging (asynchrone, optionnel) : si l'appel dépasse le p95 observé, une seconde requête
+      identique est lancée et la première réponse est gardée ;
+    - repli : en dernier recours, le même appel sur `fallback_model`.
+    Les erreurs non retentables (ex. requête invalide) sont propagées immédiatement.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 fallback_model: Optional[str] = FALLBACK_MODEL, hedge: bool = False, hedge_min_delay: float = 1.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30,
+                 sleep: Callable[[float], None] = time.sleep,
+                 async_sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.fallback_model = fallback_model
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.latencies: dict[str, LatencyTracker] = {}
+        self.counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "short_circuits": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        return cls(
+            max_attempts=int(os.environ.get("FREY_RETRY_ATTEMPTS", 3)),
+            base_delay=float(os.environ.get("FREY_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.environ.get("FREY_RETRY_MAX_DELAY", 8)),
+            fallback_model=os.environ.get("FREY_FALLBACK_MODEL", FALLBACK_MODEL) or None,
+            hedge=os.environ.get("FREY_HEDGE", "0") == "1",
+            hedge_min_delay=float(os.environ.get("FREY_HEDGE_MIN_DELAY", 1.0)),
+            failure_threshold=int(os.environ.get("FREY_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.environ.get("FREY_BREAKER_RESET", 30)),
+        )
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock)
+        return self.breakers[model]
+
+    def _latency(self, model: str) -> LatencyTracker:
+        return self.latencies.setdefault(model, LatencyTracker(clock=self.clock))
+
+    def _backoff(self, attempt: int) -> float:
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _models(self, model: str, fallback: bool) -> list[str]:
+        if fallback and self.fallback_model and self.fallback_model != model:
+            return [model, self.fallback_model]
+        return [model]
+
+    def _circuit_open(self, models: list[str]) -> CircuitOpen:
+        self.counters["short_circuits"] += 1
+        retry_after = min(self.breaker(m).retry_after() for m in models)
+        return CircuitOpen("Service Gemini momentanément indisponible (disjoncteur ouvert), veuillez réessayer.", retry_after)
+
+    # --- Appels synchrones (Streamlit) ---
+
+    def call(self, fn: Callable[[str], Any], model: str, fallback: bool = True) -> Any:
+        self.counters["calls"] += 1
+        models = self._models(model, fallback)
+        last_error: Optional[BaseException] = None
+        for index, current in enumerate(models):
+            breaker = self.breaker(current)
+            for attempt in range(self.max_attempts):
+                if not breaker.allow():
+                    break
+                if index and attempt == 0:
+                    self.counters["fallbacks"] += 1
+                start = self.clock()
+                try:
+                    result = fn(current)
+                except Exception as e:
+                    if not is_retryable(e):
+                        breaker.release()
+                        raise
+                    breaker.record_failure()
+                    last_error = e
+                    if attempt + 1 < self.max_attempts:
+                        self.counters["retries"] += 1
+                        self.sleep(self._backoff(attempt))
+                    continue
+                breaker.record_success()
+                self._latency(current).add(self.clock() - start)
+                return result
+        raise last_error if last_error is not None else self._circuit_open(models)
+
+    # --- Appels asynchrones (FastAPI) ---
+
+    async def call_async(self, fn: Callable[[str], Awaitable[Any]], model: str, fallback: bool = True,
+                         hedge: Optional[bool] = None) -> Any:
+        """hedge=False pour les appels non idempotents (ex. message d'une session de chat)."""
+        self.counters["calls"] += 1
+        hedge = self.hedge if hedge is None else hedge
+        models = self._models(model, fallback)
+        last_error: Optional[BaseException] = None
+        for index, current in enumerate(models):
+            breaker = self.breaker(current)
+            for attempt in range(self.max_attempts):
+                if not breaker.allow():
+                    break
+                if index and attempt == 0:
+                    self.counters["fallbacks"] += 1
+                start = self.clock()
+                try:
+                    result = await (self._hedged(fn, current) if hedge else fn(current))
+                except asyncio.CancelledError:
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        breaker.release()
+                        raise
+                    breaker.record_failure()
+                    last_error = e
+                    if attempt + 1 < self.max_attempts:
+                        self.counters["retries"] += 1
+                        await self.async_sleep(self._backoff(attempt))
+                    continue
+                breaker.record_success()
+                self._latency(current).add(self.clock() - start)
+                return result
+        raise last_error if last_error is not None else self._circuit_open(models)
+
+    async def _hedged(self, fn: Callable[[str], Awaitable[Any]], model: str) -> Any:
+        p95 = self._latency(model).p95()
+        if p95 is None:
+            return await fn(model)
+
+        primary = asyncio.ensure_future(fn(model))
+        done, _ = await asyncio.wait({primary}, timeout=max(p95, self.hedge_min_delay))
+        if done:
+            return primary.result()
+
+        self.counters["hedges"] += 1
+        backup = asyncio.ensure_future(fn(model))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.counters["hedge_wins"] += task is backup
+                        return task.result()
+                    if not pending:
+                        raise task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "breakers": {
+                model: {"state": breaker.state, "failures": breaker.failures}
+                for model, breaker in self.breakers.items()
+            },
+            "p95": {model: tracker.p95() for model, tracker in self.latencies.items()},
+        }
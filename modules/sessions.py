@@ -0,0 +1,239 @@
+# modules/sessions.py
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from modules.conversations import ConversationStore
+
+
+@dataclass
+class SessionEntry:
+    chat: Any
+    last_used: float
+    size_chars: int = 0
+    # Messages de la conversation durable reflétés dans `chat` (comparé au compte en base, voir aget_or_create)
+    stored_messages: int = 0
+    # Empêche deux requêtes simultanées d'entrelacer leurs tours dans la même session
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+def history_to_contents(history: Optional[list]) -> list:
+    """
+    Convertit l'historique envoyé par le client en objets types.Content.
+
+    Formats acceptés pour chaque message : {"role": "user"|"model"|"assistant", "text": ...},
+    avec "content" ou "parts" (liste de str ou de {"text": ...}) à la place de "text".
+    Les messages illisibles sont ignorés.
+    """
+    from google.genai import types
+
+    contents = []
+    for message in history or []:
+        if not isinstance(message, dict):
+            continue
+        role = "model" if message.get("role") in ("model", "assistant") else "user"
+        if "parts" in message and isinstance(message["parts"], list):
+            texts = [p.get("text", "") if isinstance(p, dict) else str(p) for p in message["parts"]]
+        else:
+            texts = [str(message.get("text", message.get("content", "")))]
+        texts = [t for t in texts if t]
+        if texts:
+            contents.append(types.Content(role=role, parts=[types.Part(text=t) for t in texts]))
+    return contents
+
+
+def _content_text(message: Any) -> str:
+    return "".join(part.text or "" for part in message.parts or [])
+
+
+def _history_chars(chat: Any) -> int:
+    """Taille approximative (en caractères) de l'historique d'une session de chat."""
+    try:
+        return sum(len(part.text or "") for message in chat.get_history() for part in (message.parts or []))
+    except Exception:
+        return 0
+
+
+class ChatSessionStore:
+    """
+    Sessions de chat Gemini en mémoire, indexées par un identifiant renvoyé au client.
+
+    - LRU : au-delà de max_sessions ou de max_chars (texte cumulé des historiques),
+      les sessions les moins récemment utilisées sont évincées.
+    - TTL : une session inactive depuis plus de ttl_seconds est considérée perdue.
+    - Une session perdue est reconstruite sans appel au modèle (l'historique est simplement
+      réinjecté dans le chat) : depuis le stockage durable `conversations` s'il est configuré
+      (session d'un autre worker ou d'avant un redémarrage), sinon depuis l'historique fourni par le client.
+    - Une session vivante est rafraîchie depuis le stockage durable quand un autre worker y a ajouté
+      des tours (une lecture par clé primaire à chaque requête, voir aget_or_create).
+    """
+
+    def __init__(self, create_chat: Callable[[list], Any], max_sessions: int = 1000,
+                 ttl_seconds: float = 1800, max_chars: int = 20_000_000,
+                 conversations: Optional["ConversationStore"] = None):
+        self._create_chat = create_chat
+        self.conversations = conversations
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_chars = max_chars
+        self._sessions: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._total_chars = 0
+        self.hits = 0
+        self.rebuilds = 0
+        self.resumes = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_or_create(self, session_id: Optional[str], history: Optional[list] = None,
+                      stored: Optional[tuple[list, int]] = None) -> tuple[str, SessionEntry]:
+        """
+        Retourne la session vivante, ou en crée une (reconstruite depuis `history` si fourni).
+        `stored` : (fenêtre, nombre de messages) déjà lus dans la conversation durable (voir aget_or_create), sinon lus ici.
+        """
+        now = time.monotonic()
+        self.purge_expired(now)
+
+        entry = self._sessions.get(session_id) if session_id else None
+        if entry is not None:
+            self._sessions.move_to_end(session_id)
+            entry.last_used = now
+            self.hits += 1
+            return session_id, entry
+
+        # Fenêtre récente de la conversation durable (une lecture indexée), à défaut l'historique du client
+        if stored is None and session_id and self.conversations is not None:
+            stored = self.conversations.snapshot(session_id)
+        messages, stored_messages = stored if stored is not None else ([], 0)
+        contents = history_to_contents(messages)
+        from_client = not contents
+        if contents:
+            self.resumes += 1
+        else:
+            contents = history_to_contents(history)
+            self.rebuilds += bool(contents)
+        session_id = session_id or uuid.uuid4().hex
+        if from_client and contents and self.conversations is not None:
+            stored_messages += self.conversations.append(
+                session_id, [(message.role, _content_text(message)) for message in contents])
+        chat = self._create_chat(contents)
+        entry = SessionEntry(chat=chat, last_used=now, size_chars=_history_chars(chat), stored_messages=stored_messages)
+        self._sessions[session_id] = entry
+        self._total_chars += entry.size_chars
+        self._evict()
+        return session_id, entry
+
+    async def aget_or_create(self, session_id: Optional[str], history: Optional[list] = None) -> tuple[str, SessionEntry]:
+        """
+        Comme get_or_create, les lectures de la conversation durable se faisant hors de la boucle d'événements.
+        Une session vivante dont la conversation a changé ailleurs (tours servis par un autre worker,
+        suppression) est reconstruite depuis sa fenêtre récente.
+        """
+        self.purge_expired()
+        if not session_id or self.conversations is None:
+            return self.get_or_create(session_id, history)
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            stored = await asyncio.to_thread(self.conversations.snapshot, session_id)
+            return self.get_or_create(session_id, history, stored=stored)
+        if await asyncio.to_thread(self.conversations.message_count, session_id) != entry.stored_messages:
+            # Sous le verrou de la session : un tour en cours sur ce worker est d'abord inscrit
+            async with entry.lock:
+                messages, total = await asyncio.to_thread(self.conversations.snapshot, session_id)
+                if total != entry.stored_messages:
+                    self._refresh(entry, messages, total)
+        return self.get_or_create(session_id, history)
+
+    def _refresh(self, entry: SessionEntry, messages: list, total: int) -> None:
+        entry.chat = self._create_chat(history_to_contents(messages))
+        new_size = _history_chars(entry.chat)
+        self._total_chars += new_size - entry.size_chars
+        entry.size_chars = new_size
+        entry.stored_messages = total
+        self.refreshes += 1
+
+    def update(self, session_id: str, turn: Optional[tuple[str, str]] = None) -> None:
+        """
+        À appeler après chaque tour : met à jour la taille de la session et applique les limites.
+        `turn` (question, réponse) est ajouté à la conversation durable (écriture différée).
+        """
+        queued = 0
+        if turn is not None and self.conversations is not None:
+            queued = self.conversations.append(session_id, [("user", turn[0]), ("model", turn[1])])
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return
+        entry.stored_messages += queued
+        new_size = _history_chars(entry.chat)
+        self._total_chars += new_size - entry.size_chars
+        entry.size_chars = new_size
+        entry.last_used = time.monotonic()
+        self._evict()
+
+    def record_turn(self, session_id: str, user_text: str, model_text: str) -> None:
+        """
+        Ajoute un tour servi sans appel au modèle (ex. réponse du cache de similarité) :
+        la session est reconstruite avec ce tour dans son historique, pour que la suite de la conversation en tienne compte.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return
+        turn = history_to_contents([{"role": "user", "text": user_text}, {"role": "model", "text": model_text}])
+        entry.chat = self._create_chat(list(entry.chat.get_history()) + turn)
+        self.update(session_id, turn=(user_text, model_text))
+
+    def drop(self, session_id: str) -> bool:
+        """Retire la session de la mémoire (éviction) ; la conversation durable est conservée."""
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self._total_chars -= entry.size_chars
+        return True
+
+    def forget(self, session_id: str) -> bool:
+        """Supprime la session de la mémoire et de la conversation durable (« nouvelle conversation »)."""
+        dropped = self.drop(session_id)
+        stored = self.conversations.delete(session_id) if self.conversations is not None else False
+        return dropped or stored
+
+    async def aforget(self, session_id: str) -> bool:
+        """Comme forget, la suppression dans la conversation durable se faisant hors de la boucle d'événements."""
+        dropped = self.drop(session_id)
+        stored = await asyncio.to_thread(self.conversations.delete, session_id) if self.conversations is not None else False
+        return dropped or stored
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        expired = [sid for sid, entry in self._sessions.items() if now - entry.last_used > self.ttl_seconds]
+        for sid in expired:
+            self.drop(sid)
+        self.evictions += len(expired)
+        return len(expired)
+
+    def _evict(self) -> None:
+        # On conserve toujours au moins la session la plus récente
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._total_chars > self.max_chars):
+            _, entry = self._sessions.popitem(last=False)
+            self._total_chars -= entry.size_chars
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "total_chars": self._total_chars,
+            "max_sessions": self.max_sessions,
+            "max_chars": self.max_chars,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "rebuilds": self.rebuilds,
+            "resumes": self.resumes,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,238 @@
+# modules/similarity.py
+"""
+Cache lexical des prompts quasi identiques (« écris un post LinkedIn sur X » et ses variantes),
+que le cache exact (modules/cache.py) ne reconnaît pas.
+
+- Chaque prompt est normalisé et découpé en mots avec nltk (minuscules, racinisation Snowball,
+  mots vides retirés si le corpus nltk « stopwords » est installé, sauf les négations : « ne ... pas »
+  distingue deux prompts par ailleurs identiques), puis réduit à ses n-grammes de mots.
+- Une signature MinHash (`num_perm` valeurs uint32) estime la similarité de Jaccard entre deux
+  ensembles de n-grammes ; les signatures sont rangées dans une matrice NumPy comparée d'un bloc.
+- Une réponse n'est réutilisée qu'à l'intérieur d'un même périmètre (endpoint, modèle, ton,
+  prompt système) et au-delà de `threshold`. La similarité est purement lexicale : changer un seul
+  mot du sujet (« ... sur le télétravail » / « ... sur le management ») donne déjà environ 0,7 ;
+  le seuil par défaut (0,85) ne réunit que les variantes de casse, d'accents, de ponctuation
+  et les retouches mineures des prompts assez longs.
+
+Tout est local : aucun service d'embeddings. nltk n'est importé qu'au premier prompt traité
+(voir warm(), appelé au démarrage selon FREY_STARTUP).
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from modules import metrics
+
+_WORD = re.compile(r"\w", re.UNICODE)
+
+# Mots vides conservés : sans eux, « ne pas mentionner le prix » et « mentionner le prix » se confondent
+NEGATIONS = {
+    "french": frozenset({"ne", "n", "pas", "ni", "non", "jamais", "rien", "aucun", "aucune", "sans", "plus", "guère"}),
+    "english": frozenset({"not", "no", "nor", "never", "without", "don", "t"}),
+}
+
+
+@lru_cache(maxsize=None)
+def _text_tools(language: str):
+    """(tokenizer, stemmer, mots vides) nltk pour `language` ; import de nltk au premier appel."""
+    from nltk.stem.snowball import SnowballStemmer
+    from nltk.tokenize import wordpunct_tokenize
+
+    try:
+        from nltk.corpus import stopwords
+        stop_words = frozenset(stopwords.words(language)) - NEGATIONS.get(language, frozenset())
+    except LookupError:  # Corpus non téléchargé : pas de filtrage des mots vides
+        stop_words = frozenset()
+    return wordpunct_tokenize, SnowballStemmer(language), stop_words
+
+
+def _fold_accents(word: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+
+
+def normalize_tokens(text: str, language: str = "french") -> list[str]:
+    """Mots du prompt en minuscules, racinisés puis sans accents (« Écrivez », « ecrivez » : même racine)."""
+    tokenize, stemmer, stop_words = _text_tools(language)
+    tokens = [token for token in tokenize(text.lower()) if _WORD.search(token)]
+    return [_fold_accents(stemmer.stem(token)) for token in tokens if token not in stop_words]
+
+
+def shingles(tokens: list[str], ngram: int = 2) -> set[str]:
+    """n-grammes de mots de longueur 1 à `ngram` (les unigrammes gardent les prompts courts comparables)."""
+    return {" ".join(tokens[i:i + n]) for n in range(1, ngram + 1) for i in range(len(tokens) - n + 1)}
+
+
+def scope_id(*parts) -> int:
+    """Identifiant 64 bits d'un périmètre (endpoint, modèle, ton, prompt système...)."""
+    digest = hashlib.blake2b("\x00".join(str(part) for part in parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class SimilarityCache:
+    """
+    Index MinHash borné en mémoire : `max_entries` signatures (les plus anciennes sont remplacées),
+    entrées expirées après `ttl_seconds`. Sûr entre threads.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, ngram: int = 2, min_tokens: int = 3,
+                 max_entries: int = 10_000, ttl_seconds: float = 3600, language: str = "french", seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.language = language
+
+        # Fonctions de hachage multiply-shift : ((a·x + b) mod 2^64) >> 32, a impair
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False)
+
+        capacity = min(max_entries, 256)
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._scopes = np.zeros(capacity, dtype=np.uint64)
+        self._expires = np.zeros(capacity, dtype=np.float64)  # 0 : emplacement libre
+        self._answers: list[Optional[str]] = [None] * capacity
+        self._size = 0   # Emplacements utilisés
+        self._next = 0   # Prochain emplacement remplacé quand l'index est plein
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0  # Prompts trop courts pour une comparaison fiable
+        self._lookup_seconds: deque = deque(maxlen=1024)
+
+    @classmethod
+    def from_env(cls) -> Optional["SimilarityCache"]:
+        """
+        Désactivé par défaut : FREY_SIMILARITY_CACHE=1 pour l'activer.
+        FREY_SIMILARITY_THRESHOLD (0-1), FREY_SIMILARITY_NUM_PERM, FREY_SIMILARITY_NGRAM,
+        FREY_SIMILARITY_MIN_TOKENS, FREY_SIMILARITY_MAX_ENTRIES, FREY_SIMILARITY_TTL (s), FREY_SIMILARITY_LANGUAGE.
+        """
+        if os.environ.get("FREY_SIMILARITY_CACHE", "0") != "1":
+            return None
+        return cls(
+            threshold=float(os.environ.get("FREY_SIMILARITY_THRESHOLD", 0.85)),
+            num_perm=int(os.environ.get("FREY_SIMILARITY_NUM_PERM", 128)),
+            ngram=int(os.environ.get("FREY_SIMILARITY_NGRAM", 2)),
+            min_tokens=int(os.environ.get("FREY_SIMILARITY_MIN_TOKENS", 3)),
+            max_entries=int(os.environ.get("FREY_SIMILARITY_MAX_ENTRIES", 10_000)),
+            ttl_seconds=float(os.environ.get("FREY_SIMILARITY_TTL", 3600)),
+            language=os.environ.get("FREY_SIMILARITY_LANGUAGE", "french"),
+        )
+
+    def warm(self) -> "SimilarityCache":
+        """Charge nltk (tokenizer, racinisation) avant le premier prompt."""
+        _text_tools(self.language)
+        return self
+
+    def scope(self, *parts) -> int:
+        return scope_id(*parts)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Signature MinHash du prompt ; None s'il a moins de `min_tokens` mots."""
+        tokens = normalize_tokens(text, self.language)
+        if len(tokens) < self.min_tokens:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(tokens, self.ngram)), dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)  # Débordement voulu (modulo 2^64)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _best_match(self, signature: np.ndarray, scope: int, now: float) -> tuple[int, float]:
+        """(emplacement, similarité estimée) de l'entrée vivante la plus proche dans le périmètre ; (-1, 0) sinon."""
+        candidates = np.flatnonzero((self._scopes[:self._size] == scope) & (self._expires[:self._size] > now))
+        if not len(candidates):
+            return -1, 0.0
+        similarities = (self._signatures[candidates] == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        return int(candidates[best]), float(similarities[best])
+
+    def get(self, text: str, scope: int) -> Optional[tuple[str, float]]:
+        """(réponse, similarité) d'un prompt quasi identique déjà servi dans ce périmètre, sinon None."""
+        start = time.perf_counter()
+        signature = self.signature(text)
+        if signature is None:
+            self.skipped += 1
+            return None
+        with self._lock:
+            slot, similarity = self._best_match(signature, scope, time.time())
+            answer = self._answers[slot] if slot >= 0 and similarity >= self.threshold else None
+            self.lookups += 1
+            self.hits += answer is not None
+        seconds = time.perf_counter() - start
+        self._lookup_seconds.append(seconds)
+        metrics.record_stage("similarity_lookup", seconds)
+        return (answer, similarity) if answer is not None else None
+
+    def set(self, text: str, scope: int, answer: str) -> None:
+        """Enregistre la réponse ; remplace celle d'un prompt quasi identique déjà indexé plutôt que d'ajouter une entrée."""
+        signature = self.signature(text)
+        if signature is None or not answer:
+            return
+        now = time.time()
+        with self._lock:
+            slot, similarity = self._best_match(signature, scope, now)
+            if slot < 0 or similarity < self.threshold:
+                slot = self._allocate()
+            self._signatures[slot] = signature
+            self._scopes[slot] = scope
+            self._expires[slot] = now + self.ttl_seconds
+            self._answers[slot] = answer
+
+    def _allocate(self) -> int:
+        if self._size < len(self._answers):
+            self._size += 1
+            return self._size - 1
+        if self._size < self.max_entries:
+            # Croissance par doublement, jusqu'à max_entries
+            capacity = min(self.max_entries, 2 * len(self._answers))
+            extra = capacity - len(self._answers)
+            self._signatures = np.vstack([self._signatures, np.zeros((extra, self.num_perm), dtype=np.uint32)])
+            self._scopes = np.concatenate([self._scopes, np.zeros(extra, dtype=np.uint64)])
+            self._expires = np.concatenate([self._expires, np.zeros(extra, dtype=np.float64)])
+            self._answers.extend([None] * extra)
+            self._size += 1
+            return self._size - 1
+        # Index plein : remplace l'entrée expirée la plus ancienne, ou à défaut la plus ancienne insérée
+        expired = np.flatnonzero(self._expires[:self._size] <= time.time())
+        if len(expired):
+            return int(expired[0])
+        slot, self._next = self._next, (self._next + 1) % self.max_entries
+        return slot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires[:] = 0
+            self._answers = [None] * len(self._answers)
+            self._size = self._next = 0
+
+    def stats(self) -> dict:
+        seconds = sorted(self._lookup_seconds)
+        with self._lock:
+            live = int((self._expires[:self._size] > time.time()).sum())
+            index_bytes = self._signatures.nbytes + self._scopes.nbytes + self._expires.nbytes
+        return {
+            "entries": live,
+            "capacity": len(self._answers),
+            "index_bytes": index_bytes,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.lookups - self.hits,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "lookup_ms_avg": round(1000 * sum(seconds) / len(seconds), 3) if seconds else 0.0,
+            "lookup_ms_p95": round(1000 * seconds[int(0.95 * (len(seconds) - 1))], 3) if seconds else 0.0,
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+        }
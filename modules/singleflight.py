@@ -0,0 +1,70 @@
+# modules/singleflight.py
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Regroupement des appels identiques en vol : le premier appelant (meneur) exécute l'appel,
+    les appelants suivants avec la même clé attendent son résultat au lieu de relancer l'appel.
+    Une erreur du meneur est propagée à tous les appelants. Rien n'est conservé après l'appel :
+    ce n'est pas un cache, seulement une déduplication des appels simultanés.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Variante synchrone (threads, ex. Streamlit)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Variante asynchrone : l'appel tourne dans une tâche partagée, protégée par shield,
+        si bien que l'annulation d'un appelant (client déconnecté) n'interrompt pas les autres.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Marque l'erreur comme lue si tous les appelants sont partis
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls) + len(self._tasks)}
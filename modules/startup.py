@@ -0,0 +1,132 @@
+# modules/startup.py
+"""
+Démarrage rapide de l'API : les composants coûteux (google.genai, client Gemini, pandas/numpy
+via modules.data_analyst) sont construits au premier besoin plutôt qu'à l'import.
+
+FREY_STARTUP choisit le mode :
+- eager (défaut) : tout est construit au démarrage, avant la première requête ;
+- lazy : chaque composant est construit par la première requête qui en a besoin ;
+- prewarm : comme lazy, mais un thread construit les composants en arrière-plan dès le démarrage
+  (une requête arrivée avant la fin attend seulement le composant dont elle a besoin).
+
+startup_report() donne la durée de construction de chaque composant, pour suivre le coût
+du démarrage (voir aussi benchmarks/bench_startup.py pour le détail par module importé).
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+MODES = ("eager", "lazy", "prewarm")
+MODE = os.environ.get("FREY_STARTUP", "eager")
+if MODE not in MODES:
+    print(f"FREY_STARTUP={MODE} inconnu, mode 'eager' utilisé (valeurs possibles : {', '.join(MODES)}).")
+    MODE = "eager"
+
+_PROCESS_START = time.perf_counter()
+
+
+class Deferred:
+    """
+    Valeur construite une seule fois, au premier get() (sûr entre threads).
+    Une erreur de construction est propagée et le prochain get() réessaie.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.loaded = False
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self.loaded:
+            return self._value
+        with self._lock:
+            if not self.loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.seconds = time.perf_counter() - start
+                self.error = None
+                self.loaded = True
+        return self._value
+
+    async def aget(self) -> Any:
+        """get() pour la boucle d'événements : la première construction (imports compris) se fait dans un thread."""
+        if self.loaded:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def set(self, value: Any) -> None:
+        """Remplace la valeur (ex. faux client des benchmarks)."""
+        with self._lock:
+            self._value = value
+            self.loaded = True
+
+    def stats(self) -> dict:
+        return {"loaded": self.loaded, "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+                "error": self.error}
+
+
+_components: dict[str, Deferred] = {}
+
+
+def deferred(name: str, factory: Callable[[], Any]) -> Deferred:
+    component = _components[name] = Deferred(name, factory)
+    return component
+
+
+def deferred_import(module_name: str) -> Deferred:
+    """Module importé au premier get() (ex. modules.data_analyst et ses dépendances pandas/numpy)."""
+    return deferred(module_name, lambda: importlib.import_module(module_name))
+
+
+# --- 🔥 Préchauffage ---
+_imported_seconds: Optional[float] = None
+_ready_seconds: Optional[float] = None
+_prewarm_thread: Optional[threading.Thread] = None
+
+
+def mark_imported() -> None:
+    """À appeler à la fin de l'import de l'application : durée d'import mesurée depuis l'import de ce module."""
+    global _imported_seconds
+    _imported_seconds = time.perf_counter() - _PROCESS_START
+
+
+def prewarm() -> None:
+    """Construit tous les composants enregistrés, dans l'ordre ; une erreur n'empêche pas les suivants."""
+    global _ready_seconds
+    for component in list(_components.values()):
+        try:
+            component.get()
+        except Exception as e:
+            print(f"Préchauffage de {component.name} impossible : {e}")
+    _ready_seconds = time.perf_counter() - _PROCESS_START
+
+
+def start() -> None:
+    """À appeler au démarrage du serveur (lifespan) : applique le mode FREY_STARTUP."""
+    global _prewarm_thread
+    if MODE == "eager":
+        prewarm()
+    elif MODE == "prewarm" and _prewarm_thread is None:
+        _prewarm_thread = threading.Thread(target=prewarm, name="frey-prewarm", daemon=True)
+        _prewarm_thread.start()
+
+
+def startup_report() -> dict:
+    return {
+        "mode": MODE,
+        "import_seconds": round(_imported_seconds, 4) if _imported_seconds is not None else None,
+        "ready_seconds": round(_ready_seconds, 4) if _ready_seconds is not None else None,
+        "components": {name: component.stats() for name, component in _components.items()},
+    }
@@ -0,0 +1,309 @@
+# modules/table_profile.py
+"""
+Profil complet d'un DataFrame en mémoire, calculé par passes vectorisées plutôt que colonne par
+colonne avec des appels pandas :
+- top-k de chaque colonne texte : codes pd.factorize (ou codes des colonnes `category`) comptés
+  par np.bincount, puis tri stable (ex æquo dans l'ordre d'apparition, comme value_counts) ;
+- cardinalité (valeurs distinctes) de chaque colonne, tirée des mêmes comptages ;
+- valeurs aberrantes des colonnes numériques, règle IQR (1,5 × écart interquartile) et |z| > z_threshold :
+  quantiles, moyennes et écarts-types d'un bloc de colonnes en un appel NumPy ;
+- matrice de corrélation de Pearson (paires complètes, comme DataFrame.corr) : quatre produits
+  matriciels accumulés par blocs de lignes.
+La mémoire de travail est bornée par `block_bytes` (blocs de colonnes ou de lignes converties en float64).
+
+Mode approché (`mode="approx"`) : tout est calculé sur `sample_rows` lignes tirées au hasard, les
+effectifs sont extrapolés et le rapport indique les bornes d'erreur (voir ErrorBounds).
+Mode automatique (`mode="auto"`) : le profil de l'échantillon mesure le coût de chaque colonne ;
+dans la limite de `time_budget` secondes, les colonnes les moins coûteuses (et la matrice de
+corrélation) sont recalculées exactement sur toutes les lignes, les autres gardent l'estimation.
+"""
+
+import math
+import os
+import time
+import warnings
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+MODES = ("exact", "approx", "auto")
+# Mode de profile_from_env, validé une fois à l'import ("off" : profil complet désactivé, voir data_analyst)
+PROFILE_MODE = os.environ.get("FREY_PROFILE_MODE", "auto")
+if PROFILE_MODE not in MODES + ("off",):
+    print(f"FREY_PROFILE_MODE={PROFILE_MODE} inconnu, mode 'auto' utilisé (valeurs possibles : {', '.join(MODES)}, off).")
+    PROFILE_MODE = "auto"
+CORRELATIONS = "__correlations__"  # Clé de la matrice de corrélation dans les coûts et les estimations
+
+
+@dataclass
+class ErrorBounds:
+    """
+    Bornes d'erreur d'un profil estimé sur `rows` lignes parmi `total_rows`, au niveau `confidence` :
+    - frequency : demi-largeur (en lignes) de tout effectif extrapolé, top-k ou valeurs aberrantes
+      (inégalité de Hoeffding sur une proportion) ;
+    - correlation : demi-largeur maximale d'une corrélation, valable simultanément pour les `pairs` paires
+      (transformation de Fisher, z/√(n−3), niveau corrigé par Bonferroni ; approximation normale) ;
+    - cardinality : facteur d'erreur de l'estimateur GEE (Charikar et al.) : vraie valeur entre
+      estimation / facteur et estimation × facteur.
+    """
+    rows: int
+    total_rows: int
+    confidence: float
+    frequency: float
+    correlation: float
+    cardinality: float
+
+    @classmethod
+    def for_sample(cls, rows: int, total_rows: int, confidence: float, pairs: int = 1) -> "ErrorBounds":
+        delta = 1 - confidence
+        frequency = math.sqrt(math.log(2 / delta) / (2 * rows)) * total_rows
+        z = NormalDist().inv_cdf(1 - delta / (2 * max(pairs, 1)))
+        correlation = min(1.0, z / math.sqrt(rows - 3)) if rows > 3 else 1.0
+        return cls(rows, total_rows, confidence, frequency, correlation, math.sqrt(total_rows / rows))
+
+
+@dataclass
+class TableProfile:
+    rows: int
+    top: dict                              # colonne texte -> pd.Series (valeur -> effectif), comme value_counts
+    cardinality: pd.Series                 # colonne -> valeurs distinctes
+    outliers: Optional[pd.DataFrame]       # colonne numérique -> effectifs "iqr" et "zscore"
+    correlations: Optional[pd.DataFrame]
+    estimated: set = field(default_factory=set)  # Colonnes (et CORRELATIONS) calculées sur l'échantillon
+    bounds: Optional[ErrorBounds] = None
+    top_k: int = 5
+    z_threshold: float = 3.0
+    seconds: float = 0.0
+
+    def strongest_correlations(self, limit: int = 10, min_abs: float = 0.5) -> list[tuple]:
+        """Paires (a, b, r) de corrélation |r| >= min_abs, des plus fortes aux plus faibles."""
+        if self.correlations is None:
+            return []
+        values = self.correlations.to_numpy()
+        rows, cols = np.triu_indices(len(values), k=1)
+        r = values[rows, cols]
+        keep = np.flatnonzero(np.abs(np.nan_to_num(r)) >= min_abs)
+        keep = keep[np.argsort(-np.abs(r[keep]), kind="stable")][:limit]
+        names = self.correlations.columns
+        return [(names[rows[i]], names[cols[i]], float(r[i])) for i in keep]
+
+    def sections(self) -> list[str]:
+        """Sections du rapport brut (même présentation que les autres insights de data_analyst)."""
+        sections = []
+        for name, values in self.top.items():
+            mark = " (estimé)" if name in self.estimated else ""
+            sections.append(f"\nTop {self.top_k} des valeurs pour la colonne '{name}'{mark}:\n{values.to_string()}")
+
+        pairs = self.strongest_correlations()
+        if pairs:
+            mark = " (estimé)" if CORRELATIONS in self.estimated else ""
+            lines = "\n".join(f"{a} ~ {b} : {r:.3f}" for a, b, r in pairs)
+            sections.append(f"\nCorrélations les plus fortes (Pearson, |r| >= 0.5){mark}:\n{lines}")
+
+        if self.outliers is not None and self.outliers.to_numpy().any():
+            flagged = self.outliers[(self.outliers > 0).any(axis=1)]
+            sections.append(f"\nAnomalies: Valeurs aberrantes (règle IQR 1,5 / |z| > {self.z_threshold:g}) :\n{flagged.to_string()}")
+
+        sections.append(f"\nCardinalité (valeurs distinctes par colonne):\n{self.cardinality.to_string()}")
+
+        if self.bounds is not None and self.estimated:
+            b = self.bounds
+            columns = ", ".join(str(name) for name in self.cardinality.index if name in self.estimated)
+            sections.append(
+                f"\nNote: estimations sur un échantillon de {b.rows} lignes sur {b.total_rows} "
+                f"(confiance {b.confidence:.0%}) : effectifs ±{b.frequency:.0f} lignes, corrélations ±{b.correlation:.3f}, "
+                f"cardinalités à un facteur {b.cardinality:.1f} près. Colonnes estimées : {columns or 'aucune'}."
+            )
+        return sections
+
+
+# --- Passes vectorisées ---
+
+def _value_counts(column: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Effectifs par valeur (ordre d'apparition) sans passer par value_counts."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, values = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, values = pd.factorize(column, use_na_sentinel=True)
+        values = pd.Index(values)
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+    return counts, values
+
+
+def _top(name, counts: np.ndarray, values: pd.Index, k: int, scale: float = 1.0) -> pd.Series:
+    order = np.argsort(-counts, kind="stable")[:k]
+    order = order[counts[order] > 0]
+    top = np.rint(counts[order] * scale).astype("int64") if scale != 1.0 else counts[order].astype("int64")
+    return pd.Series(top, index=pd.Index(values[order], name=name), name="count")
+
+
+def _gee(counts: np.ndarray, rows: int, total_rows: int) -> int:
+    """Estimateur GEE du nombre de valeurs distinctes : √(N/n)·f1 + Σ f_j (j >= 2)."""
+    seen = counts[counts > 0]
+    singletons = int((seen == 1).sum())
+    estimate = math.sqrt(total_rows / rows) * singletons + (len(seen) - singletons)
+    return int(round(min(max(estimate, len(seen)), total_rows)))
+
+
+def _block_width(rows: int, block_bytes: int) -> int:
+    return max(1, block_bytes // (8 * max(rows, 1)))
+
+
+def _numeric_pass(df: pd.DataFrame, columns: list, z_threshold: float, block_bytes: int,
+                  scale: float, timings: Optional[dict]) -> tuple[pd.DataFrame, np.ndarray]:
+    """Valeurs aberrantes (IQR, z) par blocs de colonnes ; retourne aussi les moyennes (pour les corrélations)."""
+    iqr_counts, z_counts, means = [], [], []
+    width = _block_width(len(df), block_bytes)
+    for start in range(0, len(columns), width):
+        begin = time.perf_counter()
+        block = columns[start:start + width]
+        values = df[block].to_numpy(dtype=np.float64, na_value=np.nan)
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)  # Colonnes entièrement manquantes
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0, ddof=1)
+            spread = 1.5 * (q3 - q1)
+            iqr_counts.append(((values < q1 - spread) | (values > q3 + spread)).sum(axis=0))
+            z_counts.append((np.abs(values - mean) > z_threshold * np.where(std > 0, std, np.inf)).sum(axis=0))
+        means.append(mean)
+        if timings is not None:
+            share = (time.perf_counter() - begin) / len(block)
+            for name in block:
+                timings[name] = timings.get(name, 0.0) + share
+    outliers = pd.DataFrame({"iqr": np.concatenate(iqr_counts), "zscore": np.concatenate(z_counts)}, index=columns)
+    if scale != 1.0:
+        outliers = np.rint(outliers * scale).astype("int64")
+    return outliers.astype("int64"), np.concatenate(means)
+
+
+def _correlations(df: pd.DataFrame, columns: list, means: np.ndarray, block_bytes: int) -> pd.DataFrame:
+    """
+    Pearson sur les paires complètes, accumulé par blocs de lignes (valeurs centrées, zéros pour les manquants) :
+    effectifs Mᵀ·M, sommes Zᵀ·M et Z²ᵀ·M, produits Zᵀ·Z.
+    """
+    p = len(columns)
+    pairs, sums, squares, products = (np.zeros((p, p)) for _ in range(4))
+    step = _block_width(p * 4, block_bytes)
+    for start in range(0, len(df), step):
+        values = df[columns].iloc[start:start + step].to_numpy(dtype=np.float64, na_value=np.nan) - means
+        present = ~np.isnan(values)
+        mask = present.astype(np.float64)
+        values = np.where(present, values, 0.0)
+        pairs += mask.T @ mask
+        sums += values.T @ mask
+        squares += (values * values).T @ mask
+        products += values.T @ values
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = products - sums * sums.T / pairs
+        variance = squares - sums * sums / pairs
+        corr = covariance / np.sqrt(variance * variance.T)
+    corr = np.clip(corr, -1.0, 1.0)
+    diagonal = np.diag(variance) > 0
+    corr[np.diag_indices(p)] = np.where(diagonal, 1.0, np.nan)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def _profile(df: pd.DataFrame, numeric: list, text: list, columns: list, correlations: bool, top_k: int,
+             z_threshold: float, block_bytes: int, total_rows: int, timings: Optional[dict] = None) -> TableProfile:
+    """Profil de `df` ; si df est un échantillon (total_rows > len(df)), les effectifs sont extrapolés."""
+    rows = len(df)
+    scale = total_rows / rows if rows else 1.0
+    top, cardinality = {}, {}
+    text_set = set(text)
+    for name in columns:
+        begin = time.perf_counter()
+        counts, values = _value_counts(df[name])
+        if name in text_set:
+            top[name] = _top(name, counts, values, top_k, scale)
+        cardinality[name] = _gee(counts, rows, total_rows) if scale != 1.0 else int((counts > 0).sum())
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - begin
+
+    outliers, corr = None, None
+    if numeric:
+        outliers, means = _numeric_pass(df, numeric, z_threshold, block_bytes, scale, timings)
+        if correlations and len(numeric) > 1:
+            begin = time.perf_counter()
+            corr = _correlations(df, numeric, means, block_bytes)
+            if timings is not None:
+                timings[CORRELATIONS] = time.perf_counter() - begin
+    return TableProfile(total_rows, top, pd.Series(cardinality, dtype="int64"), outliers, corr,
+                        top_k=top_k, z_threshold=z_threshold)
+
+
+def profile_table(df: pd.DataFrame, numeric_columns: Optional[list] = None, text_columns: Optional[list] = None,
+                  top_k: int = 5, mode: str = "exact", sample_rows: int = 100_000, time_budget: float = 2.0,
+                  confidence: float = 0.95, z_threshold: float = 3.0, block_bytes: int = 64 * 1024 * 1024,
+                  seed: int = 0) -> TableProfile:
+    """
+    Profil de toutes les colonnes de `df`. Par défaut, colonnes numériques : types numériques hors booléens ;
+    colonnes texte : objets, chaînes et `category`. Voir le docstring du module pour `mode`.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode de profilage inconnu : {mode!r} (attendu : {', '.join(MODES)})")
+    start = time.perf_counter()
+    if numeric_columns is None:
+        numeric_columns = list(df.select_dtypes(include=[np.number]).columns)
+    if text_columns is None:
+        text_columns = [name for name, dtype in df.dtypes.items()
+                        if dtype == object or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)]
+    numeric, text, columns = list(numeric_columns), list(text_columns), list(df.columns)
+    settings = dict(top_k=top_k, z_threshold=z_threshold, block_bytes=block_bytes)
+
+    if mode == "exact" or len(df) <= sample_rows:
+        profile = _profile(df, numeric, text, columns, True, total_rows=len(df), **settings)
+        profile.seconds = time.perf_counter() - start
+        return profile
+
+    sample = df.sample(n=sample_rows, random_state=seed)
+    timings: dict = {}
+    profile = _profile(sample, numeric, text, columns, True, total_rows=len(df), timings=timings, **settings)
+    profile.bounds = ErrorBounds.for_sample(sample_rows, len(df), confidence, pairs=len(numeric) * (len(numeric) - 1) // 2)
+    profile.estimated = set(columns) | ({CORRELATIONS} if profile.correlations is not None else set())
+
+    if mode == "auto":
+        # Coût du calcul exact estimé par extrapolation linéaire du temps mesuré sur l'échantillon
+        remaining = time_budget - (time.perf_counter() - start)
+        ratio = len(df) / sample_rows
+        chosen = []
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1]):
+            if seconds * ratio > remaining:
+                break
+            chosen.append(name)
+            remaining -= seconds * ratio
+        if chosen:
+            chosen_set = set(chosen)
+            exact = _profile(df, [c for c in numeric if c in chosen_set], [c for c in text if c in chosen_set],
+                             [c for c in columns if c in chosen_set], False, total_rows=len(df), **settings)
+            profile.top.update(exact.top)
+            profile.cardinality.update(exact.cardinality)
+            if exact.outliers is not None:
+                profile.outliers.update(exact.outliers)
+                profile.outliers = profile.outliers.astype("int64")
+            if CORRELATIONS in chosen_set:
+                # Le centrage n'affecte pas le résultat : les moyennes de l'échantillon suffisent
+                means = sample[numeric].mean().to_numpy(dtype=np.float64)
+                profile.correlations = _correlations(df, numeric, means, block_bytes)
+            profile.estimated -= chosen_set
+    profile.seconds = time.perf_counter() - start
+    return profile
+
+
+def profile_from_env(df: pd.DataFrame, numeric_columns: Optional[list] = None,
+                     text_columns: Optional[list] = None) -> TableProfile:
+    """
+    FREY_PROFILE_MODE (exact, approx, auto ; auto par défaut), FREY_PROFILE_SAMPLE_ROWS,
+    FREY_PROFILE_TIME_BUDGET (s), FREY_PROFILE_TOP_K, FREY_PROFILE_CONFIDENCE (0-1).
+    """
+    return profile_table(
+        df, numeric_columns, text_columns,
+        top_k=int(os.environ.get("FREY_PROFILE_TOP_K", 5)),
+        mode=PROFILE_MODE,
+        sample_rows=int(os.environ.get("FREY_PROFILE_SAMPLE_ROWS", 100_000)),
+        time_budget=float(os.environ.get("FREY_PROFILE_TIME_BUDGET", 2.0)),
+        confidence=float(os.environ.get("FREY_PROFILE_CONFIDENCE", 0.95)),
+    )
@@ -0,0 +1,57 @@
+# modules/tokens.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from google import genai
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation hors ligne (~4 caractères par token), utilisée quand l'API de comptage est indisponible."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class TokenCounter:
+    """
+    Comptage de tokens via client.models.count_tokens, mémorisé par texte (empreinte SHA-1) :
+    un même message n'est compté qu'une fois, quel que soit le nombre de tours où il est renvoyé.
+    Sans client (ou en cas d'erreur), on se rabat sur estimate_tokens.
+    """
+
+    def __init__(self, client: Optional["genai.Client"], model: str, max_entries: int = 4096):
+        self.client = client
+        self.model = model
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.api_calls = 0
+        self.estimated = 0
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+
+        tokens = None
+        if self.client is not None:
+            try:
+                tokens = self.client.models.count_tokens(model=self.model, contents=text).total_tokens
+                self.api_calls += 1
+            except Exception:
+                tokens = None
+        if tokens is None:
+            tokens = estimate_tokens(text)
+            self.estimated += 1
+
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
@@ -0,0 +1,208 @@
+# modules/uploads.py
+
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import zlib
+from typing import Optional
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Enveloppe d'un corps multipart/form-data (délimiteurs, en-têtes des parties), en plus du fichier
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Le corps de la requête dépasse la taille maximale autorisée."""
+
+
+class UploadSpool:
+    """
+    Tampon de réception d'un fichier téléversé : en mémoire jusqu'à `memory_bytes`,
+    puis dans un fichier temporaire sur disque, relu par pandas avec memory_map=True.
+
+    Les octets reçus ne sont jamais décodés en str : pandas lit directement le tampon
+    binaire (ou la projection mémoire du fichier), sans copie intermédiaire.
+    """
+
+    def __init__(self, max_bytes: int, memory_bytes: int, directory: Optional[str] = None, digest: bool = False):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self.size = 0
+        # Empreinte calculée au fil de la réception (déduplication des travaux d'analyse)
+        self._hash = hashlib.sha256() if digest else None
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: bytes) -> None:
+        if self.size + len(chunk) > self.max_bytes:
+            raise UploadTooLarge(f"Fichier trop volumineux (limite : {self.max_bytes} octets).")
+        self.size += len(chunk)
+        if self._hash is not None:
+            self._hash.update(chunk)
+        if self._file is None and self.size > self.memory_bytes:
+            # Bascule sur disque : le contenu déjà reçu est transféré une seule fois
+            self._file = tempfile.NamedTemporaryFile(prefix="frey-upload-", dir=self.directory, delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def hexdigest(self) -> Optional[str]:
+        return self._hash.hexdigest() if self._hash is not None else None
+
+    def source(self):
+        """Source pour pd.read_csv : le tampon binaire en mémoire, ou le chemin du fichier sur disque."""
+        if self._file is None:
+            self._buffer.seek(0)
+            return self._buffer
+        self._file.flush()
+        return self.path
+
+    def head(self, size: int = 65536) -> bytes:
+        if self._file is None:
+            return bytes(self._buffer.getbuffer()[:size])
+        self._file.flush()
+        with open(self.path, "rb") as f:
+            return f.read(size)
+
+    def tail(self, size: int) -> bytes:
+        if self._file is None:
+            return bytes(self._buffer.getbuffer()[-size:])
+        self._file.flush()
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self.size - size))
+            return f.read(size)
+
+    @property
+    def is_gzip(self) -> bool:
+        return self.head(2) == GZIP_MAGIC
+
+    def data_size(self) -> int:
+        """Taille des données décompressées (champ ISIZE du gzip, modulo 4 Go) ou taille brute."""
+        if self.is_gzip and self.size >= 18:
+            return max(self.size, struct.unpack("<I", self.tail(4))[0])
+        return self.size
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self.path)
+            self._file = None
+        self._buffer = None
+
+    def __enter__(self) -> "UploadSpool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+async def spool_multipart(chunks, content_type: str, spool: UploadSpool, field: str = "file",
+                          max_body_bytes: Optional[int] = None) -> Optional[tuple[str, str]]:
+    """
+    Analyse au fil de la réception un corps multipart/form-data (`chunks` : itérateur asynchrone d'octets) :
+    seul le contenu de la partie fichier `field` est écrit dans le tampon, à mesure qu'il arrive, sans
+    passer par un fichier intermédiaire. Le corps entier est limité à `max_body_bytes` (UploadTooLarge).
+    Retourne (type MIME, nom de fichier) de la partie, None si elle est absente ; ValueError si le corps est invalide.
+    """
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Délimiteur (boundary) absent de l'en-tête multipart/form-data.")
+
+    headers: dict[bytes, bytes] = {}
+    header = [b"", b""]  # (nom, valeur) de l'en-tête en cours
+    state = {"target": False, "found": None}
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header[0] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header[1] += data[start:end]
+
+    def on_header_end():
+        headers[header[0].lower()] = header[1]
+        header[0] = header[1] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        is_target = (state["found"] is None and b"filename" in options
+                     and options.get(b"name", b"").decode("utf-8", "replace") == field)
+        if is_target:
+            state["found"] = (headers.get(b"content-type", b"").decode("latin-1"),
+                              options[b"filename"].decode("utf-8", "replace"))
+        state["target"] = is_target
+
+    def on_part_data(data, start, end):
+        if state["target"]:
+            spool.write(data[start:end])
+
+    def on_part_end():
+        state["target"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data, "on_part_end": on_part_end,
+    })
+    received = 0
+    try:
+        async for chunk in chunks:
+            received += len(chunk)
+            if max_body_bytes is not None and received > max_body_bytes:
+                raise UploadTooLarge(f"Requête trop volumineuse (limite : {max_body_bytes} octets).")
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise ValueError(f"Corps multipart/form-data invalide : {e}") from e
+    return state["found"]
+
+
+def _decoded_sample(spool: UploadSpool, size: int = 65536) -> str:
+    sample = spool.head(size)
+    if spool.is_gzip:
+        # Décompresse seulement le début du flux pour détecter le séparateur
+        sample = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(sample, size)
+    # On coupe à la dernière ligne complète pour ne pas fausser la détection
+    sample = sample[:sample.rfind(b"\n") + 1] or sample
+    return sample.decode("utf-8", errors="replace")
+
+
+def upload_read_options(spool: UploadSpool, content_type: str = "", filename: str = "",
+                        sep: Optional[str] = None) -> dict:
+    """
+    Options pd.read_csv d'un fichier téléversé : compression gzip (octets magiques), projection
+    mémoire des fichiers non compressés sur disque, et séparateur (paramètre explicite,
+    type MIME / extension TSV, sinon détection sur le début du fichier).
+    """
+    options = {"compression": "gzip" if spool.is_gzip else None}
+    if spool.on_disk and not spool.is_gzip:
+        options["memory_map"] = True
+    name = filename.lower().removesuffix(".gz")
+    if sep:
+        options["sep"] = "\t" if sep in ("\\t", "tab") else sep
+    elif "tab-separated" in content_type or name.endswith((".tsv", ".tab")):
+        options["sep"] = "\t"
+    else:
+        # Import différé : modules.data_analyst charge pandas (démarrage rapide de l'API)
+        from modules.data_analyst import sniff_delimiter
+
+        options["sep"] = sniff_delimiter(_decoded_sample(spool)) or ","
+    return options
@@ -0,0 +1,169 @@
+# modules/workers.py
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class JobQueueFull(Exception):
+    """Trop de travaux en attente : la requête doit être retentée plus tard."""
+
+
+class JobTimeout(Exception):
+    """Le travail a dépassé son délai d'exécution."""
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout("Délai d'analyse dépassé.")
+
+
+def _run_with_alarm(timeout: Optional[float], fn: Callable, args: tuple, kwargs: dict) -> Any:
+    """
+    Exécuté dans le processus de travail : un SIGALRM interrompt le travail à l'échéance,
+    sans tuer le processus (ni les autres travaux du pool).
+    """
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class AnalysisPool:
+    """
+    Pool de processus pour les analyses Pandas (CPU) : la boucle d'événements reste libre.
+
+    - max_workers : nombre de processus (0 = exécution dans un thread, sans pool) ;
+    - timeout : délai par travail, appliqué dans le processus (SIGALRM) ; si le processus ne
+      rend pas la main après un délai de grâce, le pool est recyclé (processus tués) ;
+    - max_queued : travaux en attente au-delà des processus occupés, puis JobQueueFull.
+    Un travail n'est confié au pool qu'une fois un processus libre (sémaphore) : son délai ne court
+    qu'à partir de là, et seul un travail réellement en cours peut déclencher un recyclage. Il est
+    compté (pending) jusqu'à la fin de son exécution, même si la requête qui l'attendait est partie.
+    Les arguments et résultats traversent les processus : ils doivent être picklables.
+    """
+
+    def __init__(self, max_workers: int, timeout: Optional[float] = 120, max_queued: int = 32,
+                 grace_seconds: float = 5, mp_context: str = "spawn"):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.grace_seconds = grace_seconds
+        self.mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()  # Création et remplacement du pool
+        self._slots = asyncio.Semaphore(max(max_workers, 1))  # Processus libres
+        self.pending = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.recycled = 0
+
+    @classmethod
+    def from_env(cls) -> "AnalysisPool":
+        return cls(
+            max_workers=int(os.environ.get("FREY_ANALYSIS_WORKERS", min(4, os.cpu_count() or 1))),
+            timeout=float(os.environ.get("FREY_ANALYSIS_TIMEOUT", 120)) or None,
+            max_queued=int(os.environ.get("FREY_ANALYSIS_MAX_QUEUED", 32)),
+            mp_context=os.environ.get("FREY_ANALYSIS_MP_CONTEXT", "spawn"),
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.mp_context),
+                )
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Abandonne `executor` (processus bloqués tués) ; un nouveau pool sera créé à la demande.
+        Sans effet si ce pool a déjà été remplacé : plusieurs travaux en échec sur un même pool
+        ne tuent pas le pool neuf où tournent d'autres travaux.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.recycled += 1
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self) -> None:
+        """Fin d'exécution d'un travail confié au pool (terminé, en échec ou tué) : sa place est libérée."""
+        self.pending -= 1
+        self._slots.release()
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Exécute fn(*args, **kwargs) dans le pool ; lève JobQueueFull ou JobTimeout."""
+        capacity = max(self.max_workers, 1) + self.max_queued
+        if self.pending >= capacity:
+            self.rejected += 1
+            raise JobQueueFull("File d'analyse pleine, veuillez réessayer dans quelques instants.")
+
+        timeout = self.timeout if timeout is None else timeout
+        self.pending += 1
+        submitted = False
+        try:
+            if self.max_workers <= 0:
+                result = await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                job = functools.partial(_run_with_alarm, timeout, fn, args, kwargs)
+                # En cas d'annulation (client parti) pendant l'attente d'un processus, rien n'a été soumis
+                await self._slots.acquire()
+                try:
+                    executor = self._get_executor()
+                    future = executor.submit(job)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                submitted = True
+                # La place n'est rendue qu'à la fin de l'exécution, pas quand la requête abandonne
+                future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finished))
+                hard_timeout = timeout + self.grace_seconds if timeout else None
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), hard_timeout)
+                except (asyncio.TimeoutError, BrokenProcessPool):
+                    self._recycle(executor)
+                    raise
+            self.completed += 1
+            return result
+        except (asyncio.TimeoutError, JobTimeout):
+            self.timeouts += 1
+            raise JobTimeout(f"L'analyse a dépassé le délai de {timeout:g} s.")
+        finally:
+            if not submitted:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.max_workers),
+            "max_queued": self.max_queued,
+            "timeout": self.timeout,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "recycled": self.recycled,
+        }